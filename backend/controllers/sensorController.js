@@ -1,10 +1,14 @@
 const { query } = require('../config/db');
+const mlService = require('../services/mlService');
+
+// Feed readings to the ML engine's per-device trend state (the engine needs ML_DEVICE_STATE set too)
+const ML_DEVICE_UPDATES = process.env.ML_DEVICE_UPDATES === '1';
 
 // @desc    Upload sensor data
 // @route   POST /api/sensor/upload
 // @access  Public (Device)
 const uploadData = async (req, res) => {
-  const { device_id, moisture, temperature, humidity, sunlight, zone } = req.body;
+  const { device_id, moisture, temperature, humidity, sunlight, zone, crop_name } = req.body;
 
   if (!device_id || moisture === undefined) {
     return res.status(400).json({ message: 'Missing required fields' });
@@ -40,6 +44,12 @@ const uploadData = async (req, res) => {
       await query('INSERT INTO irrigation_logs (device_id, command, trigger_source) VALUES ($1, $2, $3)', [device_id, 'OFF', 'AUTO']);
     }
 
+    // 4. Trend & Forecast (optional; fire-and-forget, the upload never waits on the ML engine)
+    if (ML_DEVICE_UPDATES) {
+      mlService.updateDeviceState({ device_id, moisture: Number(moisture), crop_name })
+        .catch(error => console.error(`Device state update failed: ${error.message}`));
+    }
+
     res.status(201).json({
       message: 'Data uploaded successfully',
       data: newData.rows[0],
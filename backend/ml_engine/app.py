@@ -1,10 +1,23 @@
 import os
+import hmac
 import json
+import time
 import pickle
-import pandas as pd
+import random
+import cProfile
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, stream_with_context
 from flask_cors import CORS
+from artifacts import activate, current_version, list_versions, load_artifacts
+from microbatch import MicroBatcher
+from edge_model import EdgeModel
+from device_state import DeviceStore, DeviceTableFull, ID_BYTES, trend, forecast
+from profiling import StackSampler, GCTimer, ProfileStore, cprofile_stats, folded
+import metrics
+import wire
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -16,190 +29,1472 @@ MODEL_PATH = os.path.join(BASE_PATH, 'crop_model.pkl')
 SCALER_PATH = os.path.join(BASE_PATH, 'scaler.pkl')
 DATA_PATH = os.path.join(BASE_PATH, 'crop_data.json')
 SOIL_ENCODER_PATH = os.path.join(BASE_PATH, 'soil_encoder.pkl')
+ENSEMBLE_PATH = os.path.join(BASE_PATH, 'ensemble_model.pkl')
+EDGE_MODEL_PATH = os.path.join(BASE_PATH, 'edge_model.json')
+# 'native' serves the memory-mapped artifact store (see artifacts.py) when it has an
+# active version; 'sklearn' (or an empty store) falls back to the pickles above
+INFERENCE_ENGINE = os.environ.get('ML_INFERENCE_ENGINE', 'native')
+
+# Hot reload: every worker polls the artifact files every ML_RELOAD_INTERVAL
+# seconds (0 disables) and reloads when they change. ML_ADMIN_TOKEN enables the
+# /admin routes (sent as the X-Admin-Token header); without it they answer 403.
+RELOAD_INTERVAL = float(os.environ.get('ML_RELOAD_INTERVAL', 5))
+ADMIN_TOKEN = os.environ.get('ML_ADMIN_TOKEN')
 
 # Global State
-model = None
-scaler = None
-crop_db = None
-soil_encoder = None
-crop_info_map = {}
+active_bundle = None    # ModelBundle serving new requests
+previous_bundle = None  # the one it replaced, kept for rollback
+watched_source = None   # source_fingerprint() seen by the last load attempt
+reload_lock = threading.Lock()
 
-def load_models():
-    """Load all ML artifacts into memory on startup."""
-    global model, scaler, crop_db, soil_encoder, crop_info_map
-    
-    print(" [ML Engine] Loading models...")
-    try:
+# --- Metrics ---
+# Exposed at /metrics in the Prometheus text format (see metrics.py)
+REQUESTS = metrics.Counter('ml_requests_total', 'Requests by route and HTTP status.', ['route', 'status'])
+REQUEST_ERRORS = metrics.Counter('ml_request_errors_total', 'Requests answered with a 4xx/5xx status, by route.', ['route'])
+REQUEST_SECONDS = metrics.Histogram('ml_request_seconds', 'End-to-end request latency by route.', ['route'])
+PREDICT_STAGE_SECONDS = metrics.Histogram('ml_predict_stage_seconds', 'Latency of each /predict stage.', ['stage'])
+INFERENCE_STAGE_SECONDS = metrics.Histogram('ml_inference_stage_seconds', 'Latency of scaling and predict_proba per scoring call (all routes).', ['stage'])
+MODEL_LOAD_SECONDS = metrics.Gauge('ml_model_load_seconds', 'Duration of the last artifact set load.')
+MODEL_INFO = metrics.Gauge('ml_model_info', 'Active artifact version and inference engine.', ['version', 'engine'])
+MODEL_RELOADS = metrics.Counter('ml_model_reloads_total', 'Artifact set swaps by result (success, failed, rollback).', ['result'])
+# Read at scrape time: a value set at import would be the pre-fork master's pid
+metrics.Callback('ml_worker_info', 'Process serving this scrape.', 'gauge', lambda: {(os.getpid(),): 1}, ['pid'])
+
+def artifact_version(paths):
+    """Short fingerprint of the artifact files' names, sizes and modification times."""
+    digest = hashlib.sha1()
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
+
+# --- Model Bundles ---
+# Everything a request is scored against (model, scaler, soil codes and the
+# crop_data.json tables) lives in one ModelBundle. A reload builds and
+# smoke-tests a new bundle on the side, then swaps the active_bundle reference.
+# Each request pins the bundle that was active when it started (g.bundle), so
+# in-flight requests finish on the old version while new ones get the new one.
+
+class ModelBundle:
+    """One loaded artifact set. Treated as immutable once built."""
+
+    def __init__(self, model, forest, scaler_mean, scaler_scale, soil_types, crop_db, version, source, ensemble=None, edge=None):
+        self.model = model
+        self.forest = forest
+        # StandardScaler.transform as plain array math, without a named-column DataFrame per call
+        self.scaler_mean = scaler_mean
+        self.scaler_scale = scaler_scale
+        self.version = version
+        self.source = source
+        self.engine = 'native' if forest else 'sklearn'
+        self.loaded_at = time.time()
+        # Same codes LabelEncoder.transform assigns (index into its sorted classes_)
+        self.soil_codes = {str(soil_type): code for code, soil_type in enumerate(soil_types)}
+        self.crop_db = crop_db
+        self.crop_info_map = {crop['label'].lower(): crop for crop in crop_db}
+        self.crop_index = {crop['label'].lower(): i for i, crop in enumerate(crop_db)}
+        self.crop_ranges = compile_crop_ranges(model.classes_, self.crop_info_map)
+        self.crop_db_ranges = compile_crop_ranges([crop['label'] for crop in crop_db], self.crop_info_map)
+        # Codes of the columnar wire format (GET /wire/dictionary), tied to this bundle's classes
+        self.wire_dictionary = wire.dictionary(self.crop_ranges['display_name'], soil_types)
+        # Cascade tier: the ensemble and, per model class, its column in ensemble.predict_proba
+        self.ensemble, self.ensemble_columns = ensemble or (None, None)
+        # Edge tier: the distilled model and its columns, likewise
+        self.edge, self.edge_columns = edge or (None, None)
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "engine": self.engine,
+            "cascade": self.ensemble is not None,
+            "edge": self.edge is not None,
+            "loaded_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.loaded_at))
+        }
+
+def source_fingerprint():
+    """Identifies the artifact set on disk: the active store version (or the pickles' stats) plus crop_data.json."""
+    if INFERENCE_ENGINE == 'native' and current_version():
+        model_source = current_version()
+    else:
+        model_source = artifact_version([MODEL_PATH, SCALER_PATH, SOIL_ENCODER_PATH])
+    data_paths = [DATA_PATH] + ([ENSEMBLE_PATH] if CASCADE_ENABLED else []) + ([EDGE_MODEL_PATH] if EDGE_ENABLED else [])
+    return f"{model_source}:{artifact_version(data_paths)}"
+
+def load_bundle(version=None):
+    """Load an artifact set into a new ModelBundle: the given store version, else whatever load_models() serves."""
+    started = time.perf_counter()
+    source = source_fingerprint()
+    if version or (INFERENCE_ENGINE == 'native' and current_version()):
+        # Memory-mapped arrays: nothing to unpickle, pages are shared by all workers
+        artifacts = load_artifacts(version=version)
+        model = forest = artifacts['forest']
+        scaler_mean, scaler_scale = artifacts['scaler_mean'], artifacts['scaler_scale']
+        soil_types = artifacts['soil_types']
+        version = artifacts['version']
+    else:
         if not os.path.exists(MODEL_PATH):
             raise FileNotFoundError(f"Model file missing: {MODEL_PATH}")
 
         with open(MODEL_PATH, 'rb') as f: model = pickle.load(f)
         with open(SCALER_PATH, 'rb') as f: scaler = pickle.load(f)
-        with open(DATA_PATH, 'r') as f:
-            crop_db = json.load(f)
-            crop_info_map = {crop['label'].lower(): crop for crop in crop_db}
-            
+        soil_types = []
         if os.path.exists(SOIL_ENCODER_PATH):
-            with open(SOIL_ENCODER_PATH, 'rb') as f: soil_encoder = pickle.load(f)
-            
-        print(" [ML Engine] ✅ Models loaded successfully!")
+            with open(SOIL_ENCODER_PATH, 'rb') as f: soil_types = list(pickle.load(f).classes_)
+        forest = None
+        version = artifact_version([MODEL_PATH, SCALER_PATH, SOIL_ENCODER_PATH])
+        n_features = len(FEATURE_COLUMNS)
+        scaler_mean = np.asarray(scaler.mean_, dtype=np.float64) if scaler.with_mean else np.zeros(n_features)
+        scaler_scale = np.asarray(scaler.scale_, dtype=np.float64) if scaler.with_std else np.ones(n_features)
+
+    with open(DATA_PATH, 'r') as f:
+        crop_db = json.load(f)
+    ensemble = load_ensemble(model.classes_) if CASCADE_ENABLED else None
+    edge = load_edge_model(model.classes_, soil_types) if EDGE_ENABLED else None
+    bundle = ModelBundle(model, forest, scaler_mean, scaler_scale, soil_types, crop_db, version, source, ensemble, edge)
+    MODEL_LOAD_SECONDS.set(round(time.perf_counter() - started, 6))
+    return bundle
+
+SMOKE_INPUT = {'N': 90, 'P': 42, 'K': 43, 'temperature': 21, 'humidity': 82, 'ph': 6.5, 'rainfall': 203, 'soil_type': 'Loam'}
+
+def validate_bundle(bundle):
+    """Run one prediction and one monitor reading through a bundle before it serves traffic. Raises on failure."""
+    input_matrix = np.empty((1, len(FEATURE_COLUMNS)))
+    moisture = parse_input(SMOKE_INPUT, input_matrix[0])
+    input_matrix[0, -1] = encode_soil_type(bundle, SMOKE_INPUT['soil_type'])
+    probabilities = score_inputs(bundle, input_matrix)
+    if probabilities.shape != (1, len(bundle.model.classes_)) or not np.isfinite(probabilities).all() \
+            or abs(probabilities.sum() - 1) > 1e-6:
+        raise ValueError(f"Smoke prediction returned invalid probabilities (shape {probabilities.shape})")
+    if bundle.ensemble is not None:
+        ensemble_probabilities = score_ensemble(bundle, input_matrix)
+        if ensemble_probabilities.shape != probabilities.shape or not np.isfinite(ensemble_probabilities).all():
+            raise ValueError("Smoke prediction through the cascade ensemble failed")
+    if bundle.edge is not None:
+        edge_probabilities = score_edge(bundle, input_matrix)
+        if edge_probabilities.shape != probabilities.shape or abs(edge_probabilities.sum() - 1) > 1e-6:
+            raise ValueError("Smoke prediction through the edge model failed")
+    format_predictions(bundle, [SMOKE_INPUT], input_matrix, np.array([moisture]), probabilities)
+    if bundle.crop_db:
+        classify_readings(bundle, [parse_reading(bundle, {'crop_name': bundle.crop_db[0]['label']})])
+
+def swap_bundle(bundle):
+    """Make bundle the active one. Requests already running keep the bundle they started with."""
+    global active_bundle, previous_bundle
+    if active_bundle is not None and (bundle.version, bundle.source) == (active_bundle.version, active_bundle.source):
+        # A reload with nothing changed: keep the real rollback target, and the cache still applies
+        active_bundle = bundle
+    else:
+        if bundle is not active_bundle:
+            previous_bundle, active_bundle = active_bundle, bundle
+        # Cache keys include the version, but entries for the old one would only crowd the LRU
+        prediction_cache.clear()
+    MODEL_INFO.clear()
+    MODEL_INFO.set(1, bundle.version, bundle.engine)
+
+def reload_models(version=None):
+    """Load, validate and swap in an artifact set. Returns the new bundle.
+
+    version picks a stored artifact version and also makes it CURRENT, so the
+    other workers' watchers follow. On any failure the active bundle keeps
+    serving and the error is raised.
+    """
+    global watched_source
+    with reload_lock:
+        try:
+            bundle = load_bundle(version)
+            validate_bundle(bundle)
+            if version:
+                activate(bundle.version)
+                bundle.source = source_fingerprint()
+        except Exception:
+            MODEL_RELOADS.inc('failed')
+            raise
+        finally:
+            # A broken set is not retried by the watcher until the files change again
+            watched_source = source_fingerprint()
+        swap_bundle(bundle)
+        MODEL_RELOADS.inc('success')
+    print(f" [ML Engine] ✅ Models loaded successfully! (version {bundle.version}, {bundle.engine} inference)")
+    return bundle
+
+def rollback_models():
+    """Swap the previous bundle back in. Returns it; raises LookupError if there is none.
+
+    Store versions are re-activated on disk, so every worker rolls back. A
+    pickle-served bundle only rolls back in the worker that handles the call.
+    """
+    global watched_source
+    with reload_lock:
+        bundle = previous_bundle
+        if bundle is None:
+            raise LookupError("No previous model version to roll back to")
+        if bundle.forest is not None:
+            activate(bundle.version)
+        swap_bundle(bundle)
+        watched_source = source_fingerprint()
+        MODEL_RELOADS.inc('rollback')
+    print(f" [ML Engine] ⏪ Rolled back to version {bundle.version}")
+    return bundle
+
+def load_models():
+    """Load all ML artifacts into memory on startup."""
+    print(" [ML Engine] Loading models...")
+    try:
+        reload_models()
     except Exception as e:
         print(f" [ML Engine] ❌ Critical Error: {e}")
         # We don't exit here so the server can still start and report health=unhealthy
 
-load_models()
+def watch_artifacts():
+    """Reload whenever the artifact files change (see RELOAD_INTERVAL)."""
+    while True:
+        time.sleep(RELOAD_INTERVAL)
+        try:
+            if source_fingerprint() == watched_source:
+                continue
+            print(" [ML Engine] 🔄 Artifact change detected, reloading...")
+            reload_models()
+        except Exception as e:
+            serving = active_bundle.version if active_bundle else None
+            print(f" [ML Engine] ❌ Reload failed, still serving version {serving}: {e}")
+
+watcher_pid = None
+watcher_lock = threading.Lock()
+
+def ensure_watcher():
+    # Started lazily, once per process, like the micro-batcher: a thread started
+    # in the pre-fork master would not exist in the workers
+    global watcher_pid
+    if RELOAD_INTERVAL <= 0 or watcher_pid == os.getpid():
+        return
+    with watcher_lock:
+        if watcher_pid != os.getpid():
+            watcher_pid = os.getpid()
+            threading.Thread(target=watch_artifacts, name='artifact-watcher', daemon=True).start()
 
 # --- Heuristics ---
-def calculate_yield_potential(crop_name, input_params, confidence):
-    crop_info = crop_info_map.get(crop_name.lower(), {})
-    base_yield = confidence
-    npk_score = 0
-    if crop_info:
-        # Simple rule-based yield adjustment
-        n_optimal = crop_info.get('min_n', 0) <= input_params['N'] <= crop_info.get('max_n', 999)
-        p_optimal = crop_info.get('min_p', 0) <= input_params['P'] <= crop_info.get('max_p', 999)
-        k_optimal = crop_info.get('min_k', 0) <= input_params['K'] <= crop_info.get('max_k', 999)
-        npk_score = sum([n_optimal, p_optimal, k_optimal]) / 3 * 15
-    return min(100, base_yield + npk_score)
-
-def assess_risk_factors(crop_name, input_params):
-    risks = []
-    crop_info = crop_info_map.get(crop_name.lower(), {})
-    if not crop_info: return []
-    
-    temp = input_params['temperature']
-    if temp < crop_info.get('min_temp', -100): risks.append(f"❄️ FROST RISK: Temp {temp}°C")
-    elif temp > crop_info.get('max_temp', 100): risks.append(f"🔥 HEAT STRESS: Temp {temp}°C")
-    
-    moisture = input_params.get('moisture', 50)
-    if moisture < 30: risks.append(f"💧 DROUGHT RISK")
-    elif moisture > 90: risks.append(f"🌊 WATERLOG RISK")
-    
-    return risks
+# Per-crop bounds from crop_data.json are compiled once at load time into arrays
+# aligned to model.classes_, so the heuristics score every class of every row in
+# a batch with array operations. Defaults apply when a crop entry lacks a key.
+RANGE_DEFAULTS = {
+    'min_n': 0, 'max_n': 999, 'min_p': 0, 'max_p': 999, 'min_k': 0, 'max_k': 999,
+    'min_temp': -100, 'max_temp': 100, 'min_moisture': 30, 'max_moisture': 80,
+}
+MIN_CONFIDENCE = 5  # Percent; classes at or below this are not recommended
+TOP_K = 5
+
+def compile_crop_ranges(classes, crop_info_map):
+    """Build {bound: array} over the model's classes, plus has_info and display names."""
+    ranges = {key: np.full(len(classes), default, dtype=float) for key, default in RANGE_DEFAULTS.items()}
+    ranges['has_info'] = np.zeros(len(classes), dtype=bool)
+    ranges['display_name'] = [crop.capitalize() for crop in classes]
+    for i, crop in enumerate(classes):
+        crop_info = crop_info_map.get(crop.lower())
+        if not crop_info: continue
+        ranges['has_info'][i] = True
+        for key, default in RANGE_DEFAULTS.items():
+            ranges[key][i] = crop_info.get(key, default)
+    return ranges
+
+def calculate_yield_potential(input_matrix, confidence, crop_ranges):
+    """Confidence plus up to 15 points for N, P and K inside the crop's range, per (row, class)."""
+    npk = input_matrix[:, :3, None]
+    low = np.stack([crop_ranges['min_n'], crop_ranges['min_p'], crop_ranges['min_k']])
+    high = np.stack([crop_ranges['max_n'], crop_ranges['max_p'], crop_ranges['max_k']])
+    npk_score = ((low <= npk) & (npk <= high)).sum(axis=1) / 3 * 15
+    npk_score[:, ~crop_ranges['has_info']] = 0
+    return np.minimum(100, confidence + npk_score)
+
+def assess_risk_factors(input_matrix, moisture, crop_ranges):
+    """Boolean (row, class) flags for frost, heat stress, drought and waterlogging."""
+    has_info = crop_ranges['has_info']
+    temp = input_matrix[:, TEMPERATURE_INDEX, None]
+    frost = (temp < crop_ranges['min_temp']) & has_info
+    heat = ~frost & (temp > crop_ranges['max_temp']) & has_info
+    drought = (moisture < 30)[:, None] & has_info
+    waterlog = (moisture > 90)[:, None] & has_info
+    return frost, heat, drought, waterlog
+
+def select_top_k(scores, k):
+    """Per row, indices of the k highest scores ordered by score descending, ties by class order.
+
+    A partial partition finds each row's k-th best score, so only the classes at
+    or above it are sorted. Scores of -inf are never selected.
+    """
+    kth = min(k, scores.shape[1]) - 1
+    thresholds = -np.partition(-scores, kth, axis=1)[:, kth]
+    top = []
+    for row, threshold in zip(scores, thresholds):
+        idx = np.flatnonzero((row >= threshold) & (row > -np.inf))
+        top.append(idx[np.lexsort((idx, -row[idx]))][:k])
+    return top
+
+# --- Inference Pipeline ---
+REQUIRED_FIELDS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+FEATURE_COLUMNS = REQUIRED_FIELDS + ['soil_type_encoded']
+TEMPERATURE_INDEX = FEATURE_COLUMNS.index('temperature')
+MAX_BATCH_SIZE = int(os.environ.get('PREDICT_BATCH_MAX', 1000))
+
+class InputError(ValueError):
+    """Raised when a request payload is missing required fields."""
+
+def encode_soil_type(bundle, soil_type):
+    """Encoded soil type, or 0 for unknown values (as the training-time encoder fallback did)."""
+    return bundle.soil_codes.get(soil_type, 0) if isinstance(soil_type, str) else 0
+
+def parse_input(data, row):
+    """Validate one payload and write its feature values into row[:len(REQUIRED_FIELDS)]. Returns soil moisture."""
+    if not isinstance(data, dict):
+        raise InputError("Input must be a JSON object")
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            raise InputError(f"Missing field: {field}")
+    for i, field in enumerate(REQUIRED_FIELDS):
+        row[i] = parse_number(data[field], field)
+    return parse_number(data.get('moisture', 50), 'moisture')
+
+def parse_number(value, field):
+    """float(value), or InputError for non-numbers and for inf/nan (which the models can't score)."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise InputError(f"Invalid {field}: {value!r} is not a number")
+    if not np.isfinite(number):
+        raise InputError(f"Invalid {field}: must be finite")
+    return number
+
+_row_buffers = threading.local()
+
+def row_buffer():
+    """This thread's reusable (1, n_features) float64 input row.
+
+    A thread serves one request at a time, and nothing keeps a reference to the
+    row past its request (the micro-batcher and the cache copy what they keep).
+    """
+    row = getattr(_row_buffers, 'row', None)
+    if row is None:
+        row = _row_buffers.row = np.empty((1, len(FEATURE_COLUMNS)))
+    return row
+
+def score_inputs(bundle, input_matrix):
+    """Scale and score a (n_rows, n_features) matrix in one pass. Returns class probabilities."""
+    stages = INFERENCE_STAGE_SECONDS.timer()
+    if bundle.forest:
+        # Scaler is folded into the exported thresholds, so raw features go straight in
+        probabilities = bundle.forest.predict_proba(input_matrix)
+    else:
+        input_scaled = (input_matrix - bundle.scaler_mean) / bundle.scaler_scale
+        stages.mark('scale')
+        probabilities = bundle.model.predict_proba(input_scaled)
+    stages.mark('predict_proba')
+    return probabilities
+
+def prediction_columns(bundle, input_matrix, moisture, probabilities):
+    """The numbers behind the /predict bodies of a scored batch.
+
+    Returns {"top": class indices per row, "model_confidence" and "best" per row,
+    "scores", "yields" and "risk" (wire.FROST/HEAT/DROUGHT/WATERLOG flags) per (row, class)}.
+    """
+    crop_ranges = bundle.crop_ranges
+    confidence = probabilities * 100
+    scores = np.round(confidence, 1)
+    frost, heat, drought, waterlog = assess_risk_factors(input_matrix, moisture, crop_ranges)
+    return {
+        "top": select_top_k(np.where(confidence > MIN_CONFIDENCE, scores, -np.inf), TOP_K),
+        "model_confidence": np.round(probabilities.max(axis=1) * 100, 2),
+        "best": probabilities.argmax(axis=1),
+        "scores": scores,
+        "yields": calculate_yield_potential(input_matrix, confidence, crop_ranges),
+        # Frost/heat and drought/waterlog are each mutually exclusive, so one flag set per (row, class)
+        "risk": (frost * wire.FROST) | (heat * wire.HEAT) | (drought * wire.DROUGHT) | (waterlog * wire.WATERLOG)
+    }
+
+def format_predictions(bundle, rows, input_matrix, moisture, probabilities, tiers=None):
+    """Build the /predict response body for each row of a scored batch (tiers: cascade tier per row)."""
+    columns = prediction_columns(bundle, input_matrix, moisture, probabilities)
+    top, scores, yields, risk = columns["top"], columns["scores"], columns["yields"], columns["risk"]
+    model_confidence, best = columns["model_confidence"], columns["best"]
+    display_name = bundle.crop_ranges['display_name']
+
+    responses = []
+    for r, data in enumerate(rows):
+        temp = data['temperature']
+        recommended = []
+        for c in top[r]:
+            flags = risk[r, c]
+            risks = [message.format(temperature=temp) for flag, message in wire.RISK_MESSAGES.items()
+                     if flags & flag] if flags else []
+            recommended.append({
+                "crop": display_name[c],
+                "score": scores[r, c],
+                "yield_potential": yields[r, c] if yields[r, c] < 100 else 100,
+                "risk_factors": risks
+            })
+        response = {
+            "top_prediction": display_name[best[r]],
+            "model_confidence": model_confidence[r],
+            "recommended": recommended
+        }
+        if tiers is not None:
+            response["model_tier"] = str(tiers[r])
+        responses.append(response)
+    return responses
+
+# --- Prediction Cache ---
+# Opt-in (PREDICT_CACHE_SIZE > 0, e.g. 4096). Sensor payloads from the same zone
+# barely change between uploads, so model probabilities are cached under the
+# input quantized to a per-feature precision (plus soil code and model version).
+# Trade-off: with the cache on, the model scores the bucket's representative
+# (the quantized input), not the exact input, so probabilities can differ from
+# an uncached answer by up to a bucket's width; they never depend on which
+# request filled the bucket. Yield and risk heuristics still run on the exact
+# input. PREDICT_CACHE_PRECISION overrides precisions, e.g. "ph=0.05,rainfall=10";
+# a precision of 0 keys on (and scores) the exact value.
+CACHE_PRECISION_DEFAULTS = {'N': 1, 'P': 1, 'K': 1, 'temperature': 1, 'humidity': 1, 'ph': 0.1, 'rainfall': 5}
+CACHE_SIZE = int(os.environ.get('PREDICT_CACHE_SIZE', 0))
+CACHE_TTL = float(os.environ.get('PREDICT_CACHE_TTL', 600))  # seconds
+
+def parse_cache_precision(spec):
+    precision = dict(CACHE_PRECISION_DEFAULTS)
+    for item in filter(None, spec.split(',')):
+        field, value = item.split('=')
+        if field.strip() not in precision:
+            raise ValueError(f"Unknown cache precision field: {field}")
+        precision[field.strip()] = float(value)
+    return np.array([precision[field] for field in REQUIRED_FIELDS])
+
+CACHE_PRECISION = parse_cache_precision(os.environ.get('PREDICT_CACHE_PRECISION', ''))
+
+class PredictionCache:
+    """Thread-safe LRU cache with a TTL, bounded to max_size entries."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0: return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+prediction_cache = PredictionCache(CACHE_SIZE, CACHE_TTL)
+
+def quantize(input_matrix):
+    """(bucket index per feature, the buckets' representative rows): features rounded to CACHE_PRECISION."""
+    features = input_matrix[:, :len(REQUIRED_FIELDS)]
+    step = np.where(CACHE_PRECISION > 0, CACHE_PRECISION, 1)
+    quantized = np.where(CACHE_PRECISION > 0, np.round(features / step), features)
+    representative = input_matrix.copy()
+    representative[:, :len(REQUIRED_FIELDS)] = np.where(CACHE_PRECISION > 0, quantized * step, features)
+    return quantized, representative
+
+def cache_keys(bundle, input_matrix, tier='fast'):
+    """One hashable key per row: model version (and cascade tier), soil code and quantized feature values."""
+    quantized, _ = quantize(input_matrix)
+    version = bundle.version if tier == 'fast' else f"{bundle.version}/{tier}"
+    return [(version, int(soil), *row) for soil, row in zip(input_matrix[:, -1], quantized.tolist())]
+
+def score_inputs_cached(bundle, input_matrix, tier='fast'):
+    """score_inputs() (or score_ensemble() for the 'ensemble' tier) that serves repeat inputs
+    from the prediction cache and scores the rest in one pass.
+
+    With the cache on, every row is answered from its bucket's representative,
+    so the result is the same whichever request reached the bucket first.
+    """
+    score = score_ensemble if tier == 'ensemble' else score_inputs
+    if prediction_cache.max_size <= 0:
+        return score(bundle, input_matrix)
+
+    keys = cache_keys(bundle, input_matrix, tier)
+    probabilities = np.empty((len(keys), len(bundle.model.classes_)))
+    misses = []
+    for i, key in enumerate(keys):
+        cached = prediction_cache.get(key)
+        if cached is None: misses.append(i)
+        else: probabilities[i] = cached
+
+    if misses:
+        _, representative = quantize(input_matrix[misses])
+        scored = score(bundle, representative)
+        probabilities[misses] = scored
+        for i, row in zip(misses, scored):
+            prediction_cache.put(keys[i], row.copy())
+    return probabilities
+
+# --- Model Cascade ---
+# Opt-in (PREDICT_CASCADE=1): the fast model answers by default, and a row is
+# escalated to ensemble_model.pkl (RF+GB+SVC soft voting) only when the fast
+# model is unsure: top-class probability below CASCADE_MIN_CONFIDENCE, or a lead
+# over the runner-up below CASCADE_MIN_MARGIN. ?accuracy=high escalates every
+# row. Responses then carry "model_tier". The ensemble is fed the features scaled
+# by the bundle's scaler, so it must come from the same training run (train_model.py).
+CASCADE_ENABLED = os.environ.get('PREDICT_CASCADE', '0') == '1'
+CASCADE_MIN_CONFIDENCE = float(os.environ.get('CASCADE_MIN_CONFIDENCE', 0.5))
+CASCADE_MIN_MARGIN = float(os.environ.get('CASCADE_MIN_MARGIN', 0.2))
+CASCADE_ROWS = metrics.Counter('ml_cascade_rows_total', 'Rows answered per cascade tier, by escalation reason.', ['tier', 'reason'])
+
+def load_ensemble(classes):
+    """Unpickle the ensemble and map each of the model's classes to its predict_proba column.
+
+    Returns (ensemble, columns), or None (cascade off for this bundle) if the file is missing.
+    """
+    if not os.path.exists(ENSEMBLE_PATH):
+        print(f" [ML Engine] ⚠️  Cascade enabled but {ENSEMBLE_PATH} is missing; serving the fast model only")
+        return None
+    with open(ENSEMBLE_PATH, 'rb') as f:
+        ensemble = pickle.load(f)
+    return ensemble, class_columns(ensemble.classes_, classes, 'Ensemble')
+
+def class_columns(tier_classes, classes, name):
+    """Index of each of the model's classes among another tier's classes. Raises ValueError if the sets differ."""
+    column = {str(c): i for i, c in enumerate(tier_classes)}
+    if len(column) != len(classes) or any(str(c) not in column for c in classes):
+        raise ValueError(f"{name} classes don't match the model's classes")
+    return np.array([column[str(c)] for c in classes])
+
+def score_ensemble(bundle, input_matrix):
+    """Ensemble probabilities for a (n_rows, n_features) matrix, in the model's class order."""
+    stages = INFERENCE_STAGE_SECONDS.timer()
+    input_scaled = (input_matrix - bundle.scaler_mean) / bundle.scaler_scale
+    probabilities = bundle.ensemble.predict_proba(input_scaled)[:, bundle.ensemble_columns]
+    stages.mark('ensemble_predict_proba')
+    return probabilities
+
+def cascade(bundle, input_matrix, probabilities, high_accuracy=False):
+    """Re-score the rows the fast model is unsure about with the ensemble.
+
+    Returns (probabilities, tier per row), or (probabilities, None) when the bundle has no ensemble.
+    """
+    if bundle.ensemble is None:
+        return probabilities, None
+    if high_accuracy:
+        reasons = np.full(len(probabilities), 'requested')
+    else:
+        top_two = np.partition(probabilities, -2, axis=1)[:, -2:] if probabilities.shape[1] > 1 \
+            else np.hstack([np.zeros_like(probabilities), probabilities])
+        confidence, margin = top_two[:, 1], top_two[:, 1] - top_two[:, 0]
+        reasons = np.where(confidence < CASCADE_MIN_CONFIDENCE, 'low_confidence',
+                           np.where(margin < CASCADE_MIN_MARGIN, 'low_margin', 'confident'))
+    escalate = reasons != 'confident'
+    if escalate.any():
+        probabilities = probabilities.copy()
+        probabilities[escalate] = score_inputs_cached(bundle, input_matrix[escalate], 'ensemble')
+    for reason, count in zip(*np.unique(reasons, return_counts=True)):
+        CASCADE_ROWS.inc('fast' if reason == 'confident' else 'ensemble', str(reason), amount=int(count))
+    return probabilities, np.where(escalate, 'ensemble', 'fast')
+
+# --- Edge Tier ---
+# Opt-in (PREDICT_EDGE=1): ?tier=edge answers from edge_model.json, the shallow
+# tree train_model.py distills from the ensemble for field gateways (see
+# edge_model.py). It reads raw sensor units (no scaler), costs a few comparisons
+# per row, and gives the same answer the device would. Responses carry
+# "model_tier": "edge"; rows are counted in ml_cascade_rows_total{tier="edge"}.
+EDGE_ENABLED = os.environ.get('PREDICT_EDGE', '0') == '1'
+
+def load_edge_model(classes, soil_types):
+    """Load the edge model and map the model's classes to its columns, or None if the file is missing."""
+    if not os.path.exists(EDGE_MODEL_PATH):
+        print(f" [ML Engine] ⚠️  Edge tier enabled but {EDGE_MODEL_PATH} is missing; ?tier=edge disabled")
+        return None
+    edge = EdgeModel.load(EDGE_MODEL_PATH)
+    if edge.soil_types != [str(s) for s in soil_types]:
+        raise ValueError("Edge model soil codes don't match the model's soil encoder")
+    return edge, class_columns(edge.classes, classes, 'Edge model')
+
+def score_edge(bundle, input_matrix):
+    """Edge model probabilities for a (n_rows, n_features) matrix, in the model's class order."""
+    stages = INFERENCE_STAGE_SECONDS.timer()
+    probabilities = bundle.edge.predict_proba_matrix(input_matrix)[:, bundle.edge_columns]
+    stages.mark('edge_predict_proba')
+    CASCADE_ROWS.inc('edge', 'requested', amount=len(input_matrix))
+    return probabilities
+
+def score_tier(bundle, input_matrix, tier=None):
+    """Probabilities and tier per row (or None) for a requested tier: None (fast model plus cascade), 'ensemble' or 'edge'."""
+    if tier == 'edge':
+        return score_edge(bundle, input_matrix), np.full(len(input_matrix), 'edge')
+    return cascade(bundle, input_matrix, score_inputs_cached(bundle, input_matrix), tier == 'ensemble')
+
+# --- Micro-Batching ---
+# Opt-in (PREDICT_MICROBATCH=1): concurrent /predict calls are coalesced into one
+# vectorized scoring call, up to PREDICT_BATCH_WINDOW_MS or PREDICT_BATCH_MAX_ROWS.
+# Needs a threaded server (the Flask dev server, or gunicorn with ML_THREADS > 1).
+# Rows are submitted with their request's bundle, so a batch never mixes versions.
+MICROBATCH_ENABLED = os.environ.get('PREDICT_MICROBATCH', '0') == '1'
+predict_batcher = MicroBatcher(
+    lambda input_matrix, bundle: score_inputs_cached(bundle, input_matrix),
+    window_ms=float(os.environ.get('PREDICT_BATCH_WINDOW_MS', 2)),
+    max_batch=int(os.environ.get('PREDICT_BATCH_MAX_ROWS', 64))
+) if MICROBATCH_ENABLED else None
+
+# --- Monitoring ---
+class CropNotFoundError(LookupError):
+    """Raised when a monitor reading names a crop missing from crop_data.json."""
+
+def parse_reading(bundle, data):
+    """Validate one /monitor reading. Returns (crop name, crop_db index, temperature, moisture)."""
+    crop_name = data.get('crop_name')
+    if not crop_name:
+        raise InputError("Crop name is required")
+
+    idx = bundle.crop_index.get(crop_name.lower())
+    if idx is None:
+        raise CropNotFoundError("Crop not found")
+
+    try:
+        temp = float(data.get('temperature', 25))
+        moisture = float(data.get('moisture', 50))
+    except:
+        raise InputError("Invalid sensor numbers")
+    return crop_name, idx, temp, moisture
+
+def classify_readings(bundle, readings):
+    """Classify parsed readings against their crops' thresholds in one vectorized pass.
+
+    Returns one /monitor response body per reading.
+    """
+    crop_db_ranges = bundle.crop_db_ranges
+    idx = np.array([r[1] for r in readings], dtype=int)
+    temp = np.array([r[2] for r in readings], dtype=float)
+    moisture = np.array([r[3] for r in readings], dtype=float)
+
+    min_moisture = crop_db_ranges['min_moisture'][idx]
+    cold = temp < crop_db_ranges['min_temp'][idx]
+    hot = ~cold & (temp > crop_db_ranges['max_temp'][idx])
+    dry = moisture < min_moisture
+    critical = moisture < min_moisture - 10
+    wet = ~dry & (moisture > crop_db_ranges['max_moisture'][idx])
+
+    responses = []
+    for r, (crop_name, i, t, m) in enumerate(readings):
+        crop_info = bundle.crop_db[i]
+        alerts = []
+        status = "Healthy"
+
+        # Analyze Temperature
+        if cold[r]:
+            alerts.append(f"Temperature ({t}C) is too low. Risk of cold stress. Ideal min: {crop_info.get('min_temp')}C")
+            status = "Warning"
+        elif hot[r]:
+            alerts.append(f"Temperature ({t}C) is too high. Risk of heat stress. Ideal max: {crop_info.get('max_temp')}C")
+            status = "Warning"
+
+        # Analyze Moisture
+        if dry[r]:
+            alerts.append(f"Soil moisture ({m}%) is critically low. Immediate irrigation required.")
+            status = "Critical" if critical[r] else "Warning"
+        elif wet[r]:
+            alerts.append(f"Soil moisture ({m}%) is too high. Stop irrigation.")
+            status = "Warning"
+
+        responses.append({
+            "crop": crop_name,
+            "status": status,
+            "parameters": {
+                "temperature": {"value": t, "status": "Alert" if cold[r] or hot[r] else "OK"},
+                "moisture": {"value": m, "status": "Alert" if dry[r] or wet[r] else "OK"}
+            },
+            "alerts": alerts,
+            "recommendation": "Maintain current conditions." if status == "Healthy" else "Correct environmental factors immediately."
+        })
+    return responses
+
+# --- Device State ---
+# Opt-in (ML_DEVICE_STATE=<path>.npy): /device_state keeps each device's last
+# ML_DEVICE_WINDOW moisture readings and its EWMA, variance and trend, shared by
+# all workers through one memory-mapped file (see device_state.py), and
+# forecasts when moisture will leave the crop's min_moisture..max_moisture band.
+DEVICE_STATE_PATH = os.environ.get('ML_DEVICE_STATE')
+device_store = DeviceStore(
+    DEVICE_STATE_PATH,
+    capacity=int(os.environ.get('ML_DEVICE_CAPACITY', 1 << 18)),
+    window=int(os.environ.get('ML_DEVICE_WINDOW', 32)),
+    alpha=float(os.environ.get('ML_DEVICE_ALPHA', 0.2))
+) if DEVICE_STATE_PATH else None
+DEVICE_READINGS = metrics.Counter('ml_device_readings_total', 'Device readings by result (accepted, stale, invalid, full).', ['result'])
+
+def parse_device_reading(bundle, data):
+    """Validate one /device_state reading. Returns (device_id, unix time or None for now, moisture, crop name or None)."""
+    if not isinstance(data, dict):
+        raise InputError("Reading must be a JSON object")
+    device_id = data.get('device_id')
+    if not isinstance(device_id, str) or not 0 < len(device_id.encode()) <= ID_BYTES:
+        raise InputError(f"device_id must be a string of 1-{ID_BYTES} bytes")
+    if 'moisture' not in data:
+        raise InputError("Missing field: moisture")
+    try:
+        moisture = float(data['moisture'])
+        timestamp = float(data['timestamp']) if data.get('timestamp') is not None else None
+    except (TypeError, ValueError):
+        raise InputError("Invalid sensor numbers")
+    if not (np.isfinite(moisture) and (timestamp is None or 0 <= timestamp < 2 ** 32)):
+        raise InputError("Invalid sensor numbers")
+    crop_name = data.get('crop_name')
+    if crop_name is not None and (not isinstance(crop_name, str) or crop_name.lower() not in bundle.crop_index):
+        raise CropNotFoundError("Crop not found")
+    return device_id, timestamp, moisture, crop_name
+
+def describe_device(bundle, device_id, record, crop_name=None, recent=False):
+    """/device_state response body for a device record. The forecast uses crop_name, else the device's last crop."""
+    crop = (crop_name or record['crop'].decode()).lower()
+    idx = bundle.crop_index.get(crop)
+    level, slope = trend(record)
+    response = {
+        "device_id": device_id,
+        "crop": bundle.crop_db[idx]['label'] if idx is not None else None,
+        "readings": int(record['count']),
+        "last_reading": {"moisture": float(record['last_value']), "timestamp": float(record['last_time'])},
+        "ewma": round(float(record['mean_value']), 2),
+        "std": round(float(np.sqrt(record['var_value'])), 2),
+        "slope_per_hour": None if slope is None else round(slope, 4),
+        "forecast": forecast(record, float(bundle.crop_db_ranges['min_moisture'][idx]),
+                             float(bundle.crop_db_ranges['max_moisture'][idx])) if idx is not None else None
+    }
+    if recent:
+        response["recent"] = [{"timestamp": t, "moisture": m} for t, m in device_store.recent(record)]
+    return response
+
+def device_rows(bundle, rows):
+    """Apply many readings in one vectorized pass. Each result is the device's state after the whole batch."""
+    results = [None] * len(rows)
+    parsed, valid_rows = [], []
+    for i, row in enumerate(rows):
+        try:
+            parsed.append(parse_device_reading(bundle, row))
+            valid_rows.append(i)
+        except (InputError, CropNotFoundError) as e:
+            results[i] = {"error": str(e)}
+    DEVICE_READINGS.inc('invalid', amount=len(rows) - len(valid_rows))
+    # A device with no free record fails its own rows, not the batch (the single-reading route answers 507)
+    full = device_store.claim(dict.fromkeys(device_id for device_id, _, _, _ in parsed)) if parsed else {}
+    if full:
+        kept = [k for k, reading in enumerate(parsed) if reading[0] not in full]
+        for k, reading in enumerate(parsed):
+            if reading[0] in full:
+                results[valid_rows[k]] = {"error": full[reading[0]]}
+        DEVICE_READINGS.inc('full', amount=len(parsed) - len(kept))
+        parsed, valid_rows = [parsed[k] for k in kept], [valid_rows[k] for k in kept]
+    if not parsed:
+        return results
+
+    device_ids, times, moisture, crops = zip(*parsed)
+    accepted = device_store.ingest(device_ids, times, moisture, crops)
+    DEVICE_READINGS.inc('accepted', amount=int(accepted.sum()))
+    DEVICE_READINGS.inc('stale', amount=int(len(accepted) - accepted.sum()))
+    described = {}
+    for i, (device_id, _, _, crop_name), ok in zip(valid_rows, parsed, accepted):
+        if not ok:
+            results[i] = {"error": "Reading is older than the device's last reading"}
+            continue
+        if device_id not in described:
+            described[device_id] = describe_device(bundle, device_id, device_store.get(device_id), crop_name)
+        results[i] = described[device_id]
+    return results
+
+# --- Batch Processing ---
+# Shared by the _batch and _stream routes. Each result is exactly what the
+# single-row route returns for that payload, with per-row errors as {"error": ...}.
+
+def parse_rows(bundle, rows):
+    """Parse /predict payloads. Returns (feature matrix and moisture of the valid rows, their indices, {index: error result})."""
+    errors = {}
+    # Valid rows are packed to the front; a row that fails halfway is overwritten by the next
+    input_matrix = np.empty((len(rows), len(FEATURE_COLUMNS)))
+    valid_rows, moisture = [], []
+    for i, row in enumerate(rows):
+        try:
+            moisture.append(parse_input(row, input_matrix[len(valid_rows)]))
+        except Exception as e:
+            errors[i] = {"error": str(e)}
+            continue
+        input_matrix[len(valid_rows), -1] = encode_soil_type(bundle, row.get('soil_type', 'Loam'))
+        valid_rows.append(i)
+    return input_matrix[:len(valid_rows)], np.array(moisture), valid_rows, errors
+
+def parse_frame(bundle, values, soil):
+    """parse_rows() for the columns of a wire input frame (unknown soil codes become 0; inf/nan rows are errors, as in parse_input)."""
+    finite = np.isfinite(values)
+    valid = finite.all(axis=1)
+    errors = {int(i): {"error": f"Invalid {wire.INPUT_COLUMNS[int(np.argmin(finite[i]))]}: must be finite"}
+              for i in np.flatnonzero(~valid)}
+    values, soil = values[valid], soil[valid]
+    input_matrix = np.empty((len(values), len(FEATURE_COLUMNS)))
+    input_matrix[:, :len(REQUIRED_FIELDS)] = values[:, :len(REQUIRED_FIELDS)]
+    input_matrix[:, -1] = np.where(soil < len(bundle.soil_codes), soil, 0)
+    return input_matrix, values[:, wire.INPUT_COLUMNS.index('moisture')].copy(), np.flatnonzero(valid).tolist(), errors
+
+def predict_parsed(bundle, payloads, parsed, tier=None):
+    """/predict results in row order (errors in place) for parse_rows() output; payloads are the valid rows'."""
+    input_matrix, moisture, valid_rows, errors = parsed
+    results = [errors.get(i) for i in range(len(valid_rows) + len(errors))]
+    if valid_rows:
+        probabilities, tiers = score_tier(bundle, input_matrix, tier)
+        for i, response in zip(valid_rows, format_predictions(bundle, payloads, input_matrix, moisture, probabilities, tiers)):
+            results[i] = response
+    return results
+
+def predict_frame(bundle, parsed, tier=None):
+    """A wire result frame for parse_rows() / parse_frame() output. No per-row objects are built."""
+    input_matrix, moisture, valid_rows, errors = parsed
+    if valid_rows:
+        probabilities, tiers = score_tier(bundle, input_matrix, tier)
+        columns = prediction_columns(bundle, input_matrix, moisture, probabilities)
+    else:
+        empty = np.zeros((0, 0))
+        tiers, columns = None, {"top": [], "model_confidence": np.zeros(0), "best": np.zeros(0, dtype=int),
+                                "scores": empty, "yields": empty, "risk": empty.astype(np.uint8)}
+    return wire.encode_results(bundle.wire_dictionary["id"], len(valid_rows) + len(errors), valid_rows,
+                               tiers=tiers, errors=errors, **columns)
+
+def predict_rows(bundle, rows, tier=None):
+    """/predict results for a list of payloads, scored in one vectorized pass."""
+    parsed = parse_rows(bundle, rows)
+    return predict_parsed(bundle, [rows[i] for i in parsed[2]], parsed, tier)
+
+def monitor_rows(bundle, rows):
+    """/monitor results for a list of readings, classified in one vectorized pass."""
+    results = [None] * len(rows)
+    valid_rows, readings = [], []
+    for i, row in enumerate(rows):
+        try:
+            readings.append(parse_reading(bundle, row))
+            valid_rows.append(i)
+        except CropNotFoundError as e:
+            results[i] = {"error": str(e), "status": "Unknown"}
+        except Exception as e:
+            results[i] = {"error": str(e)}
+
+    if readings:
+        for i, response in zip(valid_rows, classify_readings(bundle, readings)):
+            results[i] = response
+    return results
+
+# --- NDJSON Streaming ---
+# Gateways upload bursts of readings as newline-delimited JSON. The body is read
+# line by line and processed STREAM_CHUNK_ROWS at a time, and results are
+# written back as NDJSON while the upload continues, so memory stays bounded by
+# the chunk size however large the upload is. One result line per non-empty
+# input line, in order; each is byte-for-byte the single-row route's body.
+# Clients must read the response while they upload (any streaming HTTP client
+# does); one that sends the whole body first can stall once socket buffers fill.
+# Under gunicorn's sync workers a whole upload must also finish within ML_TIMEOUT.
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', 256))
+STREAM_MAX_LINE_BYTES = int(os.environ.get('STREAM_MAX_LINE_BYTES', 64 * 1024))
+STREAM_ROWS = metrics.Counter('ml_stream_rows_total', 'Lines processed by the NDJSON streaming routes.', ['route'])
+
+def read_ndjson(stream, max_line_bytes=STREAM_MAX_LINE_BYTES):
+    """Yield (payload, error) per non-empty line of a binary stream; error is a result dict for bad lines."""
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        if len(line) > max_line_bytes and not line.endswith(b'\n'):
+            while line and not line.endswith(b'\n'):  # skip the rest of the line
+                line = stream.readline(max_line_bytes + 1)
+            yield None, {"error": f"Line exceeds {max_line_bytes} bytes"}
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line), None
+        except ValueError as e:
+            yield None, {"error": f"Invalid JSON: {e}"}
+
+def process_single(process_rows, bundle, payload):
+    """process_rows() for one payload, with an exception turned into its {"error": ...} result."""
+    try:
+        return process_rows(bundle, [payload])[0]
+    except Exception as e:
+        return {"error": str(e)}
+
+def stream_results(process_rows, bundle, stream, route):
+    """Run process_rows(bundle, payloads) over chunks of an NDJSON stream, yielding NDJSON result lines."""
+    lines = read_ndjson(stream)
+    while True:
+        chunk = [entry for _, entry in zip(range(STREAM_CHUNK_ROWS), lines)]
+        if not chunk:
+            return
+        payloads = [payload for payload, error in chunk if error is None]
+        try:
+            processed = iter(process_rows(bundle, payloads))
+        except Exception as e:
+            # Retry row by row, so one row that breaks the vectorized pass fails alone
+            print(f"Stream Error: {e}; retrying the chunk row by row")
+            processed = (process_single(process_rows, bundle, payload) for payload in payloads)
+        # Same compact separators as jsonify, so each line matches the single-row body
+        yield ''.join(app.json.dumps(next(processed) if error is None else error, separators=(',', ':')) + '\n'
+                      for _, error in chunk)
+        STREAM_ROWS.inc(route, amount=len(chunk))
+
+metrics.Callback('ml_prediction_cache_size', 'Entries in the prediction cache.', 'gauge', lambda: len(prediction_cache._entries))
+for _field in ('hits', 'misses', 'evictions', 'expirations'):
+    metrics.Callback(f'ml_prediction_cache_{_field}_total', f'Prediction cache {_field}.', 'counter',
+                     lambda field=_field: getattr(prediction_cache, field))
+if predict_batcher:
+    metrics.Callback('ml_microbatch_batches_total', 'Micro-batches scored.', 'counter', lambda: predict_batcher.batches)
+    metrics.Callback('ml_microbatch_rows_total', 'Rows scored through the micro-batcher.', 'counter', lambda: predict_batcher.rows)
+    metrics.Callback('ml_microbatch_queue_depth', 'Rows waiting in the micro-batch queue.', 'gauge', lambda: len(predict_batcher._queue))
+
+# --- Profiling ---
+# Opt-in (ML_PROFILE=1); when off, no hook, thread or gc callback is installed.
+# On the profiled routes:
+#  - X-Profile: 1 (with the admin token), or a random ML_PROFILE_SAMPLE_RATE share of
+#    requests, runs the request under cProfile
+#  - every request is stack-sampled every ML_PROFILE_INTERVAL_MS, and one that takes
+#    ML_PROFILE_SLOW_MS or longer is kept with its payload and folded stacks
+# Captures go to a per-worker ring buffer (ML_PROFILE_KEEP), served by /admin/profiles.
+PROFILE_ENABLED = os.environ.get('ML_PROFILE', '0') == '1'
+PROFILE_SAMPLE_RATE = float(os.environ.get('ML_PROFILE_SAMPLE_RATE', 0))
+PROFILE_SLOW_MS = float(os.environ.get('ML_PROFILE_SLOW_MS', 500))
+PROFILE_MAX_PAYLOAD = int(os.environ.get('ML_PROFILE_MAX_PAYLOAD', 64 * 1024))
+PROFILED_ROUTES = {'/predict', '/predict_batch', '/monitor', '/monitor_batch'}
+PROFILES_CAPTURED = metrics.Counter('ml_profiles_captured_total', 'Requests captured by the profiler, by trigger (header, sampled, slow).', ['trigger'])
+stack_sampler = StackSampler(float(os.environ.get('ML_PROFILE_INTERVAL_MS', 5))) if PROFILE_ENABLED else None
+gc_timer = GCTimer() if PROFILE_ENABLED else None
+profile_store = ProfileStore(int(os.environ.get('ML_PROFILE_KEEP', 50))) if PROFILE_ENABLED else None
+cprofile_lock = threading.Lock()  # one cProfile at a time (Python 3.12+ allows a single active profiler)
+
+def start_profile():
+    if not request.url_rule or request.url_rule.rule not in PROFILED_ROUTES:
+        return None
+    trigger = None
+    if request.headers.get('X-Profile') == '1':
+        denied = admin_denied()
+        if denied: return denied
+        trigger = 'header'
+    elif PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        trigger = 'sampled'
+    g.profile_gc = gc_timer.snapshot()
+    stack_sampler.register()
+    # A request that finds cProfile busy is still stack-sampled
+    if trigger and cprofile_lock.acquire(blocking=False):
+        g.profile_trigger = trigger
+        g.cprofile = cProfile.Profile()
+        g.cprofile.enable()
+    return None
+
+def stop_profile():
+    """Stop this request's profilers. Returns (cProfile or None, stack Counter, gc snapshot at start)."""
+    profile = g.pop('cprofile', None)
+    if profile is not None:
+        profile.disable()
+        cprofile_lock.release()
+    return profile, stack_sampler.unregister(), g.pop('profile_gc')
+
+def finish_profile(response):
+    if 'profile_gc' not in g:
+        return response
+    profile, stacks, (gc_start_count, gc_start_seconds) = stop_profile()
+    duration_ms = (time.perf_counter() - g.request_started) * 1000
+    slow = duration_ms >= PROFILE_SLOW_MS
+    if profile is None and not slow:
+        return response
+
+    gc_count, gc_seconds = gc_timer.snapshot()
+    payload = request.get_data()
+    record = {
+        "route": request.url_rule.rule,
+        "trigger": g.profile_trigger if profile is not None else 'slow',
+        "slow": slow,
+        "status": response.status_code,
+        "started_at": round(time.time() - duration_ms / 1000, 3),
+        "duration_ms": round(duration_ms, 2),
+        "model_version": g.bundle.version if g.get('bundle') else None,
+        "worker": os.getpid(),
+        # Process-wide, so under a threaded server this includes other requests' collections
+        "gc": {"collections": gc_count - gc_start_count, "ms": round((gc_seconds - gc_start_seconds) * 1000, 2)},
+        "stack_samples": sum(stacks.values()),
+        "payload": payload[:PROFILE_MAX_PAYLOAD].decode('utf-8', 'replace'),
+        "payload_truncated": len(payload) > PROFILE_MAX_PAYLOAD,
+        "stacks": folded(stacks)
+    }
+    if profile is not None:
+        record["pstats_text"], record["pstats"] = cprofile_stats(profile)
+    profile_id = profile_store.add(record)
+    PROFILES_CAPTURED.inc(record["trigger"])
+    response.headers['X-Profile-Id'] = profile_id
+    return response
+
+def abandon_profile(error=None):
+    # After-request hooks are skipped when a view raises, so release the profilers here
+    if 'profile_gc' in g:
+        stop_profile()
+
+load_models()
 
 # --- Routes ---
 
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    # Pinned for the whole request, so a concurrent reload can't change the model mid-request
+    g.bundle = active_bundle
+    ensure_watcher()
+
+@app.after_request
+def record_request(response):
+    # Route templates, not raw paths, so unknown URLs can't create new series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUESTS.inc(route, response.status_code)
+    if response.status_code >= 400:
+        REQUEST_ERRORS.inc(route)
+    if 'request_started' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, route)
+    if g.get('bundle') is not None:
+        response.headers['X-Model-Version'] = g.bundle.version
+    return response
+
+if PROFILE_ENABLED:
+    # Registered after the timer hooks: starts after start_timer, finishes before record_request
+    app.before_request(start_profile)
+    app.after_request(finish_profile)
+    app.teardown_request(abandon_profile)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint (values are per worker process)."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/', methods=['GET'])
 def health():
     """Health check endpoint."""
-    status = "healthy" if model else "unhealthy"
-    return jsonify({"status": status, "service": "ML Engine"}), 200 if model else 503
+    bundle = g.bundle
+    status = "healthy" if bundle else "unhealthy"
+    return jsonify({
+        "status": status,
+        "service": "ML Engine",
+        "model_version": bundle.version if bundle else None,
+        "worker": os.getpid()
+    }), 200 if bundle else 503
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Runtime counters for the serving caches."""
+    return jsonify({
+        "model_version": g.bundle.version if g.bundle else None,
+        "worker": os.getpid(),
+        "cache": prediction_cache.stats(),
+        "batcher": predict_batcher.stats() if predict_batcher else None,
+        "cascade": {
+            "ensemble_loaded": bool(g.bundle and g.bundle.ensemble is not None),
+            "min_confidence": CASCADE_MIN_CONFIDENCE,
+            "min_margin": CASCADE_MIN_MARGIN
+        } if CASCADE_ENABLED else None,
+        "edge_loaded": bool(g.bundle and g.bundle.edge is not None) if EDGE_ENABLED else None,
+        "devices": device_store.stats() if device_store else None,
+        "profiling": {
+            "captured": profile_store.captured,
+            "stack_samples": stack_sampler.samples,
+            "slow_ms": PROFILE_SLOW_MS,
+            "sample_rate": PROFILE_SAMPLE_RATE
+        } if PROFILE_ENABLED else None
+    })
+
+@app.route('/wire/dictionary', methods=['GET'])
+def wire_dictionary():
+    """Codes of the columnar wire format for the active model (see wire.py); clients cache it by "id"."""
+    if not g.bundle:
+        return jsonify({"error": "Model not loaded"}), 503
+    return jsonify(g.bundle.wire_dictionary)
+
+def requested_tier(bundle):
+    """The tier a request asks for: ?tier=edge, ?tier=ensemble (or ?accuracy=high), else None.
+
+    Raises InputError for an unknown tier, or the edge tier when it isn't loaded.
+    """
+    tier = request.args.get('tier') or ('ensemble' if request.args.get('accuracy') == 'high' else None)
+    if tier not in (None, 'ensemble', 'edge'):
+        raise InputError(f"Unknown tier: {tier}")
+    if tier == 'edge' and bundle.edge is None:
+        raise InputError("Edge tier not available (PREDICT_EDGE=1 and edge_model.json are needed)")
+    return tier
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    if not model:
+    bundle = g.bundle
+    if not bundle:
         return jsonify({"error": "Model not loaded"}), 503
 
     try:
+        stages = PREDICT_STAGE_SECONDS.timer()
         data = request.json
+        stages.mark('parse')
         # Input Validation & Parsing
-        required_fields = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"Missing field: {field}"}), 400
-        
+        input_matrix = row_buffer()
+        try:
+            tier = requested_tier(bundle)
+            moisture = parse_input(data, input_matrix[0])
+        except InputError as e:
+            return jsonify({"error": str(e)}), 400
+        stages.mark('validate')
+
         # Prepare Input
-        soil_type = data.get('soil_type', 'Loam')
-        soil_encoded = 0
-        if soil_encoder:
-            try: soil_encoded = soil_encoder.transform([soil_type])[0]
-            except: soil_encoded = 0
-            
-        input_vector = [[
-            float(data['N']), float(data['P']), float(data['K']),
-            float(data['temperature']), float(data['humidity']), float(data['ph']),
-            float(data['rainfall']), soil_encoded
-        ]]
-        
-        # Predict
-        input_scaled = scaler.transform(pd.DataFrame(input_vector, columns=['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall', 'soil_type_encoded']))
-        prediction = model.predict(input_scaled)[0]
-        probabilities = model.predict_proba(input_scaled)[0]
-        
-        # Format Results
-        results = []
-        classes = model.classes_
-        
-        for crop, prob in zip(classes, probabilities):
-            confidence = prob * 100
-            if confidence > 5: # Threshold
-                results.append({
-                    "crop": crop.capitalize(),
-                    "score": round(confidence, 1),
-                    "yield_potential": calculate_yield_potential(crop, data, confidence),
-                    "risk_factors": assess_risk_factors(crop, data)
-                })
-        
-        results.sort(key=lambda x: x['score'], reverse=True)
-        
+        input_matrix[0, -1] = encode_soil_type(bundle, data.get('soil_type', 'Loam'))
+        stages.mark('encode')
+
+        # Predict (cache lookup / batch wait included; scale and predict_proba are
+        # broken out in ml_inference_stage_seconds)
+        if predict_batcher and tier != 'edge':
+            probabilities = predict_batcher.submit(input_matrix[0], bundle)[None, :]
+            probabilities, tiers = cascade(bundle, input_matrix, probabilities, tier == 'ensemble')
+        else:
+            probabilities, tiers = score_tier(bundle, input_matrix, tier)
+        stages.mark('inference')
+        result = format_predictions(bundle, [data], input_matrix, np.array([moisture]), probabilities, tiers)[0]
+        stages.mark('heuristics')
+        response = jsonify(result)
+        stages.mark('serialize')
+        return response
+
+    except Exception as e:
+        print(f"Prediction Error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """Score many inputs in one vectorized pass.
+
+    Accepts {"inputs": [...]} (or a bare list) of /predict payloads and returns
+    {"results": [...]} in the same order. Rows that fail validation get an
+    {"error": ...} entry instead of failing the whole batch.
+
+    Either side can use the columnar wire format instead (wire.py): a request
+    body of that Content-Type is an input frame, and an Accept of it gets a
+    result frame back. Decoded, both carry exactly the JSON results.
+    """
+    bundle = g.bundle
+    if not bundle:
+        return jsonify({"error": "Model not loaded"}), 503
+
+    try:
+        if request.mimetype == wire.CONTENT_TYPE:
+            try: dictionary_id, values, soil = wire.decode_inputs(request.get_data())
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if dictionary_id != bundle.wire_dictionary["id"]:
+                return jsonify({"error": "Input frame uses another wire dictionary; fetch /wire/dictionary again",
+                                "dictionary": bundle.wire_dictionary["id"]}), 409
+            n_rows = len(values)
+        else:
+            data = request.json
+            rows = data.get('inputs') if isinstance(data, dict) else data
+            if not isinstance(rows, list):
+                return jsonify({"error": "Expected a list of inputs"}), 400
+            n_rows, values = len(rows), None
+        if n_rows > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Batch too large: {n_rows} > {MAX_BATCH_SIZE}"}), 413
+
+        try: tier = requested_tier(bundle)
+        except InputError as e:
+            return jsonify({"error": str(e)}), 400
+
+        parsed = parse_rows(bundle, rows) if values is None else parse_frame(bundle, values, soil)
+        if request.accept_mimetypes.best_match(['application/json', wire.CONTENT_TYPE]) == wire.CONTENT_TYPE:
+            return Response(predict_frame(bundle, parsed, tier), mimetype=wire.CONTENT_TYPE)
+        if values is None:
+            payloads = [rows[i] for i in parsed[2]]
+        else:
+            # Risk messages quote the temperature; a JSON client would have sent 21, not 21.0
+            payloads = [{'temperature': int(t) if t.is_integer() else t}
+                        for t in values[parsed[2], TEMPERATURE_INDEX].tolist()]
+        results = predict_parsed(bundle, payloads, parsed, tier)
         return jsonify({
-            "top_prediction": prediction.capitalize(),
-            "model_confidence": round(max(probabilities) * 100, 2),
-            "recommended": results[:5]
+            "results": results,
+            "count": len(results),
+            "errors": sum(1 for r in results if "error" in r)
         })
 
     except Exception as e:
-        print(f"Prediction Error: {e}")
+        print(f"Batch Prediction Error: {e}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/monitor', methods=['POST'])
 def monitor():
+    bundle = g.bundle
+    if not bundle:
+        return jsonify({"error": "Model not loaded"}), 503
+
     try:
         data = request.json
-        crop_name = data.get('crop_name')
-        if not crop_name:
-            return jsonify({"error": "Crop name is required"}), 400
+        try: reading = parse_reading(bundle, data)
+        except InputError as e:
+            return jsonify({"error": str(e)}), 400
+        except CropNotFoundError as e:
+            return jsonify({"error": str(e), "status": "Unknown"}), 404
 
-        # Find crop in DB
-        crop_info = next((c for c in crop_db if c['label'].lower() == crop_name.lower()), None)
-        
-        if not crop_info:
-            return jsonify({"error": "Crop not found", "status": "Unknown"}), 404
+        return jsonify(classify_readings(bundle, [reading])[0])
 
-        # Input Data
-        try:
-            temp = float(data.get('temperature', 25))
-            moisture = float(data.get('moisture', 50))
-        except:
-            return jsonify({"error": "Invalid sensor numbers"}), 400
+    except Exception as e:
+        print(f"Monitor Error: {e}")
+        return jsonify({"error": str(e)}), 500
 
-        alerts = []
-        status = "Healthy"
+@app.route('/monitor_batch', methods=['POST'])
+def monitor_batch():
+    """Classify many (crop, temperature, moisture) readings in one pass.
 
-        # Analyze Temperature
-        if temp < crop_info.get('min_temp', -100):
-            alerts.append(f"Temperature ({temp}C) is too low. Risk of cold stress. Ideal min: {crop_info.get('min_temp')}C")
-            status = "Warning"
-        elif temp > crop_info.get('max_temp', 100):
-            alerts.append(f"Temperature ({temp}C) is too high. Risk of heat stress. Ideal max: {crop_info.get('max_temp')}C")
-            status = "Warning"
+    Accepts {"readings": [...]} (or a bare list) of /monitor payloads and returns
+    {"results": [...]} in the same order. Invalid readings get an {"error": ...}
+    entry (with "status": "Unknown" for unknown crops) instead of failing the batch.
+    """
+    bundle = g.bundle
+    if not bundle:
+        return jsonify({"error": "Model not loaded"}), 503
 
-        # Analyze Moisture
-        min_moisture = crop_info.get('min_moisture', 30)
-        max_moisture = crop_info.get('max_moisture', 80)
-        
-        if moisture < min_moisture:
-            alerts.append(f"Soil moisture ({moisture}%) is critically low. Immediate irrigation required.")
-            status = "Critical" if moisture < min_moisture - 10 else "Warning"
-        elif moisture > max_moisture:
-            alerts.append(f"Soil moisture ({moisture}%) is too high. Stop irrigation.")
-            status = "Warning"
+    try:
+        data = request.json
+        rows = data.get('readings') if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            return jsonify({"error": "Expected a list of readings"}), 400
+        if len(rows) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Batch too large: {len(rows)} > {MAX_BATCH_SIZE}"}), 413
 
+        results = monitor_rows(bundle, rows)
         return jsonify({
-            "crop": crop_name,
-            "status": status,
-            "parameters": {
-                "temperature": {"value": temp, "status": "OK" if not any("Temperature" in a for a in alerts) else "Alert"},
-                "moisture": {"value": moisture, "status": "OK" if not any("moisture" in a for a in alerts) else "Alert"}
-            },
-            "alerts": alerts,
-            "recommendation": "Maintain current conditions." if status == "Healthy" else "Correct environmental factors immediately."
+            "results": results,
+            "count": len(results),
+            "errors": sum(1 for r in results if "error" in r)
         })
 
     except Exception as e:
-        print(f"Monitor Error: {e}")
+        print(f"Batch Monitor Error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/predict_stream', methods=['POST'])
+def predict_stream():
+    """Score an NDJSON upload of /predict payloads, streaming back one NDJSON result per line."""
+    bundle = g.bundle
+    if not bundle:
+        return jsonify({"error": "Model not loaded"}), 503
+    try: tier = requested_tier(bundle)
+    except InputError as e:
+        return jsonify({"error": str(e)}), 400
+    process_rows = lambda bundle, rows: predict_rows(bundle, rows, tier)
+    return Response(stream_with_context(stream_results(process_rows, bundle, request.stream, 'predict_stream')),
+                    mimetype='application/x-ndjson')
+
+@app.route('/monitor_stream', methods=['POST'])
+def monitor_stream():
+    """Classify an NDJSON upload of /monitor readings, streaming back one NDJSON result per line."""
+    bundle = g.bundle
+    if not bundle:
+        return jsonify({"error": "Model not loaded"}), 503
+    return Response(stream_with_context(stream_results(monitor_rows, bundle, request.stream, 'monitor_stream')),
+                    mimetype='application/x-ndjson')
+
+@app.route('/device_state', methods=['POST'])
+def device_state():
+    """Record one moisture reading ({device_id, moisture, timestamp?, crop_name?}) and return the device's trend and forecast."""
+    bundle = g.bundle
+    if not bundle:
+        return jsonify({"error": "Model not loaded"}), 503
+    if not device_store:
+        return jsonify({"error": "Device state is disabled (set ML_DEVICE_STATE)"}), 503
+
+    try:
+        try: device_id, timestamp, moisture, crop_name = parse_device_reading(bundle, request.json)
+        except InputError as e:
+            return jsonify({"error": str(e)}), 400
+        except CropNotFoundError as e:
+            return jsonify({"error": str(e)}), 404
+
+        if not device_store.ingest([device_id], [timestamp], [moisture], [crop_name])[0]:
+            DEVICE_READINGS.inc('stale')
+            return jsonify({"error": "Reading is older than the device's last reading"}), 409
+        DEVICE_READINGS.inc('accepted')
+        return jsonify(describe_device(bundle, device_id, device_store.get(device_id), crop_name))
+
+    except DeviceTableFull as e:
+        return jsonify({"error": str(e)}), 507
+    except Exception as e:
+        print(f"Device State Error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/device_state_batch', methods=['POST'])
+def device_state_batch():
+    """Record many readings ({"readings": [...]} or a bare list) and return each device's state, in input order."""
+    bundle = g.bundle
+    if not bundle:
+        return jsonify({"error": "Model not loaded"}), 503
+    if not device_store:
+        return jsonify({"error": "Device state is disabled (set ML_DEVICE_STATE)"}), 503
+
+    try:
+        data = request.json
+        rows = data.get('readings') if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            return jsonify({"error": "Expected a list of readings"}), 400
+        if len(rows) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Batch too large: {len(rows)} > {MAX_BATCH_SIZE}"}), 413
+
+        results = device_rows(bundle, rows)
+        return jsonify({
+            "results": results,
+            "count": len(results),
+            "errors": sum(1 for r in results if "error" in r)
+        })
+
+    except Exception as e:
+        print(f"Batch Device State Error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/device_state/<device_id>', methods=['GET'])
+def device_state_get(device_id):
+    """A device's trend and forecast (?crop_name= overrides its last crop), with its recent readings."""
+    bundle = g.bundle
+    if not bundle:
+        return jsonify({"error": "Model not loaded"}), 503
+    if not device_store:
+        return jsonify({"error": "Device state is disabled (set ML_DEVICE_STATE)"}), 503
+
+    crop_name = request.args.get('crop_name')
+    if crop_name and crop_name.lower() not in bundle.crop_index:
+        return jsonify({"error": "Crop not found"}), 404
+    record = device_store.get(device_id) if 0 < len(device_id.encode()) <= ID_BYTES else None
+    if record is None:
+        return jsonify({"error": "Unknown device"}), 404
+    return jsonify(describe_device(bundle, device_id, record, crop_name, recent=True))
+
+# --- Admin ---
+
+def admin_denied():
+    """Error response unless the request carries the admin token, else None."""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled (set ML_ADMIN_TOKEN)"}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({"error": "Invalid admin token"}), 401
+    return None
+
+@app.route('/admin/models', methods=['GET'])
+def admin_models():
+    """Active and rollback bundles of this worker, plus the versions in the artifact store."""
+    denied = admin_denied()
+    if denied: return denied
+    return jsonify({
+        "worker": os.getpid(),
+        "active": active_bundle.describe() if active_bundle else None,
+        "previous": previous_bundle.describe() if previous_bundle else None,
+        "current": current_version(),
+        "versions": list_versions()
+    })
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Load, smoke-test and swap in the artifacts on disk, or {"version": ...} from the store.
+
+    The other workers pick the change up through their artifact watchers.
+    """
+    denied = admin_denied()
+    if denied: return denied
+
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    elif not isinstance(data, dict):
+        return jsonify({"error": "body must be a JSON object"}), 400
+    version = data.get('version')
+    if version is not None and (not isinstance(version, str) or os.path.basename(version) != version):
+        return jsonify({"error": "version must be an artifact version name"}), 400
+    previous = active_bundle.version if active_bundle else None
+    try:
+        bundle = reload_models(version)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e), "model_version": previous}), 404
+    except Exception as e:
+        print(f" [ML Engine] ❌ Reload failed: {e}")
+        return jsonify({"error": f"Reload failed: {e}", "model_version": previous}), 500
+    return jsonify({"status": "reloaded", "model_version": bundle.version, "previous_version": previous})
+
+@app.route('/admin/rollback', methods=['POST'])
+def admin_rollback():
+    """Swap the previously active bundle back in."""
+    denied = admin_denied()
+    if denied: return denied
+
+    previous = active_bundle.version if active_bundle else None
+    try:
+        bundle = rollback_models()
+    except LookupError as e:
+        return jsonify({"error": str(e), "model_version": previous}), 409
+    return jsonify({"status": "rolled_back", "model_version": bundle.version, "previous_version": previous})
+
+def profiling_unavailable():
+    """Error response for the profile routes: admin token missing, or profiling off. Else None."""
+    denied = admin_denied()
+    if denied: return denied
+    if not PROFILE_ENABLED:
+        return jsonify({"error": "Profiling is disabled (set ML_PROFILE=1)"}), 404
+    return None
+
+@app.route('/admin/profiles', methods=['GET'])
+def admin_profiles():
+    """Profiles captured by this worker, newest first (payloads and profiles omitted)."""
+    unavailable = profiling_unavailable()
+    if unavailable: return unavailable
+    return jsonify({"worker": os.getpid(), "profiles": profile_store.summaries()})
+
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+def admin_profile(profile_id):
+    """One captured profile: JSON (default), ?format=folded stacks, or ?format=pstats (cProfile dump)."""
+    unavailable = profiling_unavailable()
+    if unavailable: return unavailable
+
+    record = profile_store.get(profile_id)
+    if record is None:
+        return jsonify({"error": f"No profile {profile_id} on worker {os.getpid()}"}), 404
+    fmt = request.args.get('format', 'json')
+    if fmt == 'folded':
+        return Response(record["stacks"], mimetype='text/plain')
+    if fmt == 'pstats':
+        if "pstats" not in record:
+            return jsonify({"error": "This request was only stack-sampled, not run under cProfile"}), 404
+        return Response(record["pstats"], mimetype='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename=profile-{profile_id}.prof'})
+    if fmt != 'json':
+        return jsonify({"error": f"Unknown format: {fmt}"}), 400
+    return jsonify({key: value for key, value in record.items() if key != 'pstats'})
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
     print(f" [ML Engine] Starting on port {port}...")
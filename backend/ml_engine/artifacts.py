@@ -0,0 +1,197 @@
+"""
+Memory-Mapped Model Artifacts
+=============================
+Versioned on-disk format for everything the ML engine serves, so load_models()
+opens raw arrays with np.load(mmap_mode='r') instead of unpickling. Startup
+takes milliseconds, and every worker process shares the same page-cache pages.
+
+  artifacts/
+    CURRENT                  name of the active version
+    <version>/
+      manifest.json          format, classes, soil types, array dtypes/shapes/checksums
+      forest.<name>.npy      flattened forest (see forest_engine.py), scaler folded in
+      scaler.mean.npy        StandardScaler statistics, for paths that need scaled input
+      scaler.scale.npy
+
+A version is the content hash of its arrays and labels, so re-exporting the same
+model is a no-op. Version directories are written to a temp dir and renamed
+into place, and CURRENT is swapped atomically.
+
+Usage:
+  python artifacts.py            # convert crop_model.pkl/scaler.pkl/soil_encoder.pkl and activate
+  python artifacts.py verify     # re-check the active version's checksums
+  python artifacts.py list       # stored versions
+  python artifacts.py activate <version>   # serving workers hot-reload it (see app.py)
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from forest_engine import ForestEngine, ARRAY_NAMES
+
+FORMAT = 'krishisense-artifacts'
+FORMAT_VERSION = 1
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+ARTIFACT_DIR = os.environ.get('ML_ARTIFACT_DIR', os.path.join(BASE_PATH, 'artifacts'))
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def current_version(root=ARTIFACT_DIR):
+    """Name of the active version, or None if the store is empty."""
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def activate(version, root=ARTIFACT_DIR):
+    """Atomically point CURRENT at an existing version."""
+    if not os.path.exists(os.path.join(root, version, 'manifest.json')):
+        raise FileNotFoundError(f"Unknown artifact version: {version}")
+    fd, tmp_path = tempfile.mkstemp(dir=root, prefix='.CURRENT.')
+    with os.fdopen(fd, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp_path, os.path.join(root, 'CURRENT'))
+
+def list_versions(root=ARTIFACT_DIR):
+    """Stored versions, oldest first: [{"version", "created_at", "source", "active"}]."""
+    active = current_version(root)
+    versions = []
+    if os.path.isdir(root):
+        for name in os.listdir(root):
+            manifest_path = os.path.join(root, name, 'manifest.json')
+            if name.startswith('.') or not os.path.exists(manifest_path):
+                continue
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            versions.append({
+                "version": name,
+                "created_at": manifest.get('created_at'),
+                "source": manifest.get('source'),
+                "active": name == active
+            })
+    return sorted(versions, key=lambda v: (v['created_at'] or '', v['version']))
+
+def write_artifacts(model, scaler, soil_encoder, root=ARTIFACT_DIR, make_current=True, source=None):
+    """Export a trained RandomForest, scaler and soil encoder as a new artifact version.
+
+    Returns the version name.
+    """
+    forest = ForestEngine.from_sklearn(model, scaler)
+    arrays = {f'forest.{name}': array for name, array in forest.arrays().items()}
+    arrays['scaler.mean'] = np.asarray(scaler.mean_, dtype=np.float64)
+    arrays['scaler.scale'] = np.asarray(scaler.scale_, dtype=np.float64)
+    classes = [str(c) for c in model.classes_]
+    soil_types = [str(s) for s in soil_encoder.classes_] if soil_encoder is not None else []
+
+    digest = hashlib.sha256(json.dumps([classes, soil_types]).encode())
+    for name in sorted(arrays):
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    version = digest.hexdigest()[:12]
+
+    os.makedirs(root, exist_ok=True)
+    version_dir = os.path.join(root, version)
+    if not os.path.exists(version_dir):
+        tmp_dir = tempfile.mkdtemp(dir=root, prefix=f'.{version}.')
+        try:
+            manifest_arrays = {}
+            for name, array in arrays.items():
+                file_name = f'{name}.npy'
+                np.save(os.path.join(tmp_dir, file_name), np.ascontiguousarray(array))
+                manifest_arrays[name] = {
+                    "file": file_name,
+                    "dtype": str(array.dtype),
+                    "shape": list(array.shape),
+                    "sha256": _sha256(os.path.join(tmp_dir, file_name))
+                }
+            manifest = {
+                "format": FORMAT,
+                "format_version": FORMAT_VERSION,
+                "version": version,
+                "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                "source": source,
+                "features": [str(f) for f in getattr(scaler, 'feature_names_in_', [])],
+                "classes": classes,
+                "soil_types": soil_types,
+                "arrays": manifest_arrays
+            }
+            with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.rename(tmp_dir, version_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    if make_current:
+        activate(version, root)
+    return version
+
+def load_artifacts(root=ARTIFACT_DIR, version=None, verify=False):
+    """Open an artifact version (default: CURRENT) with every array memory-mapped read-only.
+
+    Returns {"version", "manifest", "forest", "scaler_mean", "scaler_scale", "soil_types"}.
+    Shapes and dtypes are always checked; verify=True also re-hashes every file.
+    """
+    version = version or current_version(root)
+    if not version:
+        raise FileNotFoundError(f"No active artifact version in {root}")
+    version_dir = os.path.join(root, version)
+    with open(os.path.join(version_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT or manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format: {manifest.get('format')} v{manifest.get('format_version')}")
+
+    arrays = {}
+    for name, meta in manifest['arrays'].items():
+        path = os.path.join(version_dir, meta['file'])
+        if verify and _sha256(path) != meta['sha256']:
+            raise ValueError(f"Checksum mismatch: {meta['file']}")
+        array = np.load(path, mmap_mode='r', allow_pickle=False)
+        if str(array.dtype) != meta['dtype'] or list(array.shape) != meta['shape']:
+            raise ValueError(f"Corrupt artifact array: {meta['file']}")
+        arrays[name] = array
+
+    forest_arrays = {name: arrays[f'forest.{name}'] for name in ARRAY_NAMES}
+    return {
+        "version": manifest['version'],
+        "manifest": manifest,
+        "forest": ForestEngine.from_arrays(forest_arrays, np.array(manifest['classes'])),
+        "scaler_mean": arrays['scaler.mean'],
+        "scaler_scale": arrays['scaler.scale'],
+        "soil_types": manifest['soil_types']
+    }
+
+def convert_pickles(base_path=BASE_PATH, root=ARTIFACT_DIR):
+    """Convert the legacy crop_model.pkl / scaler.pkl / soil_encoder.pkl into an artifact version."""
+    import pickle
+    with open(os.path.join(base_path, 'crop_model.pkl'), 'rb') as f: model = pickle.load(f)
+    with open(os.path.join(base_path, 'scaler.pkl'), 'rb') as f: scaler = pickle.load(f)
+    soil_encoder = None
+    if os.path.exists(os.path.join(base_path, 'soil_encoder.pkl')):
+        with open(os.path.join(base_path, 'soil_encoder.pkl'), 'rb') as f: soil_encoder = pickle.load(f)
+    return write_artifacts(model, scaler, soil_encoder, root, source='convert_pickles')
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['verify']:
+        artifacts = load_artifacts(verify=True)
+        print(f"✓ Artifact version {artifacts['version']} verified")
+    elif sys.argv[1:] == ['list']:
+        for v in list_versions():
+            print(f"{'*' if v['active'] else ' '} {v['version']}  {v['created_at']}  {v['source']}")
+    elif len(sys.argv) == 3 and sys.argv[1] == 'activate':
+        activate(sys.argv[2])
+        print(f"✓ Artifact version {sys.argv[2]} activated")
+    else:
+        version = convert_pickles()
+        print(f"✓ Converted pickles to artifact version {version} (active)")
@@ -0,0 +1,239 @@
+"""
+ML Engine Benchmark Suite
+=========================
+Reproducible, offline performance numbers for inference and training, using
+synthetic inputs drawn from crop_parameters with a fixed seed:
+
+  cold_start.*        import app + load_models() in a fresh interpreter (median of runs)
+  predict.*           single-row /predict latency through the Flask test client (p50/p95/p99)
+  monitor.*           single-row /monitor latency
+  predict_batch.<n>.* /predict_batch throughput at several batch sizes
+  monitor_batch.<n>.* /monitor_batch throughput
+  train.*             wall time per phase of train_model.py (only with --train)
+
+Usage:
+  python benchmark.py                            # run, print, write benchmark_results.json
+  python benchmark.py --quick                    # fewer iterations, for a smoke run
+  python benchmark.py --train                    # also time train_model.py (quick grid, temp dir)
+  python benchmark.py --save-baseline            # record this run as the baseline
+  python benchmark.py --baseline benchmark_baseline.json --tolerance 0.25
+                                                 # exit 1 if any metric regressed by more than 25%
+
+The prediction cache is disabled while benchmarking (it would turn repeated
+inputs into cache hits) unless --cache is given, which enables it at 4096
+entries if PREDICT_CACHE_SIZE is unset.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from crop_parameters import crop_parameters
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(BASE_PATH, 'benchmark_results.json')
+BASELINE_PATH = os.path.join(BASE_PATH, 'benchmark_baseline.json')
+BATCH_SIZES = (1, 10, 100, 1000)
+
+COLD_START_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app
+print(json.dumps({"import_s": time.perf_counter() - started, "load_models_s": app.MODEL_LOAD_SECONDS.get()}))
+"""
+
+# --- Synthetic Inputs ---
+
+def synthetic_inputs(n, seed):
+    """n /predict payloads drawn uniformly from the crop parameter ranges."""
+    rng = np.random.default_rng(seed)
+    crops = list(crop_parameters)
+    rows = []
+    for crop in rng.choice(crops, n):
+        params = crop_parameters[crop]
+        draw = lambda key, digits: round(float(rng.uniform(*params[key])), digits)
+        rows.append({
+            "N": draw('N', 1), "P": draw('P', 1), "K": draw('K', 1),
+            "temperature": draw('temp', 1), "humidity": draw('humidity', 1),
+            "ph": draw('ph', 2), "rainfall": draw('rainfall', 0),
+            "soil_type": str(rng.choice(params['soil_types']))
+        })
+    return rows
+
+def synthetic_readings(n, seed, known_crops):
+    """n /monitor payloads for crops present in crop_data.json."""
+    rng = np.random.default_rng(seed)
+    crops = [crop for crop in crop_parameters if crop in known_crops]
+    return [{
+        "crop_name": str(crop),
+        "temperature": round(float(rng.uniform(0, 45)), 1),
+        "moisture": round(float(rng.uniform(0, 100)), 1)
+    } for crop in rng.choice(crops, n)]
+
+# --- Measurements ---
+
+def latency_summary(seconds):
+    ms = np.array(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "mean_ms": round(float(ms.mean()), 4)
+    }
+
+def bench_cold_start(runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT], cwd=BASE_PATH, env=os.environ.copy(),
+                             capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {key: round(float(np.median([s[key] for s in samples])), 4) for key in samples[0]}
+
+def bench_latency(client, route, payloads, warmup):
+    for payload in payloads[:warmup]:
+        client.post(route, json=payload)
+    timings = []
+    for payload in payloads:
+        started = time.perf_counter()
+        response = client.post(route, json=payload)
+        timings.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"{route} returned {response.status_code}: {response.get_data(as_text=True)}")
+    return latency_summary(timings)
+
+def bench_throughput(client, route, key, payloads, size, min_rows):
+    batch = {key: payloads[:size]}
+    client.post(route, json=batch)  # warmup
+    repeats = max(3, min_rows // size)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        response = client.post(route, json=batch)
+        if response.status_code != 200:
+            raise RuntimeError(f"{route} returned {response.status_code}")
+    elapsed = time.perf_counter() - started
+    return {"rows_per_s": round(size * repeats / elapsed, 1)}
+
+def bench_training(samples_per_crop):
+    with tempfile.TemporaryDirectory() as tmp:
+        timings_path = os.path.join(tmp, 'timings.json')
+        env = dict(os.environ, ML_MODEL_DIR=tmp, ML_ARTIFACT_DIR=os.path.join(tmp, 'artifacts'),
+                   TRAIN_SAMPLES_PER_CROP=str(samples_per_crop), TRAIN_GRID='quick',
+                   TRAIN_TIMINGS_PATH=timings_path)
+        started = time.perf_counter()
+        subprocess.run([sys.executable, 'train_model.py'], cwd=BASE_PATH, env=env,
+                       stdout=subprocess.DEVNULL, check=True)
+        total = time.perf_counter() - started
+        with open(timings_path) as f:
+            phases = json.load(f)
+    return {**{f"{phase}_s": seconds for phase, seconds in phases.items()}, "total_s": round(total, 3)}
+
+def run(args):
+    if not args.cache:
+        os.environ['PREDICT_CACHE_SIZE'] = '0'
+    else:
+        os.environ.setdefault('PREDICT_CACHE_SIZE', '4096')
+    results = {"cold_start": bench_cold_start(args.cold_runs)}
+
+    sys.path.insert(0, BASE_PATH)
+    import app
+    if not app.active_bundle:
+        raise RuntimeError("Model failed to load; train or convert the models first")
+    client = app.app.test_client()
+
+    payloads = synthetic_inputs(max(args.requests, max(BATCH_SIZES)), args.seed)
+    readings = synthetic_readings(max(args.requests, max(BATCH_SIZES)), args.seed, app.active_bundle.crop_index)
+    results["predict"] = bench_latency(client, '/predict', payloads[:args.requests], args.warmup)
+    results["monitor"] = bench_latency(client, '/monitor', readings[:args.requests], args.warmup)
+    for size in BATCH_SIZES:
+        results[f"predict_batch.{size}"] = bench_throughput(client, '/predict_batch', 'inputs', payloads, size, args.batch_rows)
+    for size in BATCH_SIZES:
+        results[f"monitor_batch.{size}"] = bench_throughput(client, '/monitor_batch', 'readings', readings, size, args.batch_rows)
+
+    if args.train:
+        results["train"] = bench_training(args.train_samples)
+
+    import sklearn
+    return {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sklearn": sklearn.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "model_version": app.active_bundle.version,
+            "inference_engine": app.active_bundle.engine,
+            "seed": args.seed,
+            "cache": args.cache
+        },
+        "metrics": {f"{group}.{name}": value for group, values in results.items() for name, value in values.items()}
+    }
+
+# --- Baseline Comparison ---
+
+def compare(metrics, baseline, tolerance):
+    """Rows of (metric, baseline, current, relative change, regressed) for metrics present in both runs.
+
+    Throughput (*_per_s) should go up; every other metric is a duration and should go down.
+    """
+    rows = []
+    for name, old in baseline.items():
+        new = metrics.get(name)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if name.endswith('_per_s') else change
+        rows.append((name, old, new, change, worse > tolerance))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ML engine")
+    parser.add_argument('--quick', action='store_true', help="fewer iterations (smoke run)")
+    parser.add_argument('--requests', type=int, default=1000, help="single-row requests per route")
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--batch-rows', type=int, default=5000, help="rows scored per batch size")
+    parser.add_argument('--cold-runs', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cache', action='store_true', help="leave the prediction cache enabled")
+    parser.add_argument('--train', action='store_true', help="also time train_model.py phases")
+    parser.add_argument('--train-samples', type=int, default=30, help="samples per crop for --train")
+    parser.add_argument('--output', default=RESULTS_PATH)
+    parser.add_argument('--baseline', default=None, help=f"compare against this results file (e.g. {os.path.basename(BASELINE_PATH)})")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument('--save-baseline', action='store_true', help=f"also write the results to {os.path.basename(BASELINE_PATH)}")
+    args = parser.parse_args()
+    if args.quick:
+        args.requests, args.warmup, args.batch_rows, args.cold_runs = 200, 20, 1000, 1
+
+    report = run(args)
+    print(f"\n{'=' * 72}\nBENCHMARK RESULTS (model {report['meta']['model_version']}, {report['meta']['inference_engine']})\n{'=' * 72}")
+    for name, value in report['metrics'].items():
+        print(f"  {name:40s} {value:>14}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Results written to {args.output}")
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Baseline saved to {BASELINE_PATH}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(report['metrics'], baseline['metrics'], args.tolerance)
+        print(f"\nCompared with {args.baseline} ({baseline['meta']['timestamp']}, tolerance {args.tolerance:.0%}):")
+        for name, old, new, change, regressed in rows:
+            print(f"  {'❌' if regressed else '✓'} {name:40s} {old:>12} → {new:>12} ({change:+.1%})")
+        regressions = [row for row in rows if row[4]]
+        if regressions:
+            print(f"\n❌ {len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Agronomic parameter ranges per crop, shared by train_model.py and benchmark.py.
+
+Each entry maps a feature to its (min, max) range; soil_types lists the soils
+the crop is grown on.
+"""
+
+crop_parameters = {
+    'rice': {'N': (80, 120), 'P': (35, 60), 'K': (35, 60), 'temp': (20, 35), 
+             'humidity': (70, 90), 'ph': (5.5, 7.0), 'rainfall': (1000, 2500),
+             'soil_types': ['Clay', 'Loam', 'Clay Loam']},
+    'wheat': {'N': (100, 150), 'P': (30, 50), 'K': (30, 50), 'temp': (10, 25), 
+              'humidity': (50, 70), 'ph': (6.0, 7.5), 'rainfall': (400, 800),
+              'soil_types': ['Loam', 'Clay Loam', 'Silt Loam']},
+    'maize': {'N': (120, 180), 'P': (40, 60), 'K': (40, 60), 'temp': (18, 27), 
+              'humidity': (60, 80), 'ph': (5.5, 7.5), 'rainfall': (500, 900),
+              'soil_types': ['Loam', 'Sandy Loam', 'Clay Loam']},
+    'cotton': {'N': (60, 100), 'P': (30, 50), 'K': (40, 60), 'temp': (21, 30), 
+               'humidity': (50, 70), 'ph': (5.8, 8.0), 'rainfall': (600, 1200),
+               'soil_types': ['Black Soil', 'Clay', 'Loam']},
+    'sugarcane': {'N': (150, 250), 'P': (50, 80), 'K': (100, 150), 'temp': (20, 35), 
+                  'humidity': (70, 90), 'ph': (6.5, 7.5), 'rainfall': (1200, 1800),
+                  'soil_types': ['Loam', 'Clay Loam', 'Red Soil']},
+    'soybean': {'N': (20, 40), 'P': (30, 50), 'K': (30, 50), 'temp': (20, 30), 
+                'humidity': (60, 80), 'ph': (6.0, 7.0), 'rainfall': (450, 700),
+                'soil_types': ['Loam', 'Sandy Loam', 'Clay Loam']},
+    'chickpea': {'N': (20, 30), 'P': (30, 50), 'K': (20, 40), 'temp': (15, 25), 
+                 'humidity': (55, 75), 'ph': (6.0, 7.5), 'rainfall': (400, 650),
+                 'soil_types': ['Loam', 'Clay Loam', 'Black Soil']},
+    'potato': {'N': (80, 120), 'P': (40, 60), 'K': (80, 120), 'temp': (15, 25), 
+               'humidity': (65, 85), 'ph': (4.8, 6.5), 'rainfall': (500, 750),
+               'soil_types': ['Sandy Loam', 'Loam', 'Silt Loam']},
+    'groundnut': {'N': (20, 40), 'P': (40, 60), 'K': (60, 80), 'temp': (20, 30), 
+                  'humidity': (60, 80), 'ph': (5.5, 6.5), 'rainfall': (500, 900),
+                  'soil_types': ['Sandy Loam', 'Red Soil', 'Loam']},
+    'tomato': {'N': (50, 80), 'P': (25, 40), 'K': (40, 60), 'temp': (18, 27), 
+               'humidity': (60, 80), 'ph': (6.0, 6.8), 'rainfall': (500, 800),
+               'soil_types': ['Loam', 'Sandy Loam', 'Clay Loam']},
+    'onion': {'N': (100, 150), 'P': (50, 75), 'K': (50, 75), 'temp': (15, 25), 
+              'humidity': (65, 85), 'ph': (6.0, 7.0), 'rainfall': (350, 500),
+              'soil_types': ['Loam', 'Sandy Loam', 'Silt Loam']},
+    'banana': {'N': (200, 300), 'P': (100, 150), 'K': (300, 500), 'temp': (25, 35), 
+               'humidity': (75, 95), 'ph': (6.0, 7.5), 'rainfall': (1500, 3000),
+               'soil_types': ['Loam', 'Clay Loam', 'Alluvial']},
+    'mango': {'N': (100, 150), 'P': (50, 80), 'K': (100, 150), 'temp': (24, 35), 
+              'humidity': (50, 70), 'ph': (5.5, 7.5), 'rainfall': (750, 2500),
+              'soil_types': ['Loam', 'Sandy Loam', 'Alluvial']},
+    'grapes': {'N': (100, 150), 'P': (60, 90), 'K': (120, 180), 'temp': (15, 30), 
+               'humidity': (50, 70), 'ph': (6.0, 7.5), 'rainfall': (650, 900),
+               'soil_types': ['Sandy Loam', 'Loam', 'Black Soil']},
+    'papaya': {'N': (100, 150), 'P': (60, 90), 'K': (120, 180), 'temp': (22, 32), 
+               'humidity': (60, 85), 'ph': (6.0, 7.0), 'rainfall': (1000, 2000),
+               'soil_types': ['Loam', 'Sandy Loam', 'Alluvial']},
+    'coffee': {'N': (100, 150), 'P': (40, 60), 'K': (80, 120), 'temp': (15, 28), 
+               'humidity': (70, 90), 'ph': (5.0, 6.5), 'rainfall': (1500, 2500),
+               'soil_types': ['Loam', 'Red Soil', 'Laterite']},
+    'tea': {'N': (150, 250), 'P': (50, 80), 'K': (100, 150), 'temp': (20, 30), 
+            'humidity': (75, 95), 'ph': (4.5, 6.0), 'rainfall': (1500, 3000),
+            'soil_types': ['Loam', 'Red Soil', 'Laterite']},
+    'mustard': {'N': (80, 120), 'P': (30, 50), 'K': (30, 50), 'temp': (10, 20), 
+                'humidity': (55, 75), 'ph': (6.0, 7.5), 'rainfall': (250, 500),
+                'soil_types': ['Loam', 'Sandy Loam', 'Clay Loam']},
+    'barley': {'N': (60, 100), 'P': (25, 40), 'K': (25, 40), 'temp': (12, 22), 
+               'humidity': (50, 70), 'ph': (6.5, 7.5), 'rainfall': (300, 600),
+               'soil_types': ['Loam', 'Clay Loam', 'Sandy Loam']},
+    'cabbage': {'N': (120, 180), 'P': (50, 70), 'K': (80, 120), 'temp': (15, 20), 
+                'humidity': (65, 85), 'ph': (6.0, 7.0), 'rainfall': (400, 600),
+                'soil_types': ['Loam', 'Clay Loam', 'Silt Loam']},
+    'cauliflower': {'N': (150, 200), 'P': (60, 80), 'K': (100, 140), 'temp': (15, 22), 
+                    'humidity': (70, 90), 'ph': (6.0, 7.0), 'rainfall': (400, 600),
+                    'soil_types': ['Loam', 'Clay Loam', 'Silt Loam']},
+    'carrot': {'N': (60, 100), 'P': (40, 60), 'K': (80, 120), 'temp': (15, 20), 
+               'humidity': (60, 80), 'ph': (5.5, 6.5), 'rainfall': (300, 500),
+               'soil_types': ['Sandy Loam', 'Loam', 'Silt Loam']},
+    'chilli': {'N': (80, 120), 'P': (40, 60), 'K': (60, 90), 'temp': (20, 30), 
+               'humidity': (60, 80), 'ph': (6.0, 7.0), 'rainfall': (600, 1200),
+               'soil_types': ['Loam', 'Sandy Loam', 'Red Soil']},
+    'garlic': {'N': (80, 120), 'P': (50, 75), 'K': (50, 75), 'temp': (12, 25), 
+               'humidity': (55, 75), 'ph': (6.0, 7.0), 'rainfall': (300, 450),
+               'soil_types': ['Loam', 'Sandy Loam', 'Clay Loam']},
+    'ginger': {'N': (120, 180), 'P': (60, 90), 'K': (120, 180), 'temp': (20, 30), 
+               'humidity': (70, 90), 'ph': (5.5, 6.5), 'rainfall': (1500, 3000),
+               'soil_types': ['Loam', 'Sandy Loam', 'Red Soil']},
+    'turmeric': {'N': (100, 150), 'P': (50, 75), 'K': (100, 150), 'temp': (20, 30), 
+                 'humidity': (65, 85), 'ph': (5.0, 7.5), 'rainfall': (1500, 2500),
+                 'soil_types': ['Loam', 'Clay Loam', 'Red Soil']},
+    'millets': {'N': (40, 60), 'P': (20, 30), 'K': (20, 30), 'temp': (25, 35), 
+                'humidity': (40, 60), 'ph': (6.0, 8.0), 'rainfall': (400, 600),
+                'soil_types': ['Sandy Loam', 'Red Soil', 'Black Soil']},
+    'sorghum': {'N': (60, 90), 'P': (30, 40), 'K': (30, 40), 'temp': (25, 35), 
+                'humidity': (45, 65), 'ph': (6.0, 8.0), 'rainfall': (450, 650),
+                'soil_types': ['Loam', 'Clay Loam', 'Black Soil']},
+    'sunflower': {'N': (60, 80), 'P': (40, 60), 'K': (40, 60), 'temp': (20, 27), 
+                  'humidity': (55, 75), 'ph': (6.0, 7.5), 'rainfall': (400, 600),
+                  'soil_types': ['Loam', 'Sandy Loam', 'Black Soil']},
+    'cucumber': {'N': (100, 150), 'P': (50, 75), 'K': (80, 120), 'temp': (20, 30), 
+                 'humidity': (65, 85), 'ph': (6.0, 7.0), 'rainfall': (500, 800),
+                 'soil_types': ['Loam', 'Sandy Loam', 'Clay Loam']},
+}
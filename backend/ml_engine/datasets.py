@@ -0,0 +1,265 @@
+"""
+Chunked Training Datasets
+=========================
+On-disk, memory-mapped dataset store for training on more data than fits in
+RAM. Rows are appended in chunks, each column of each chunk is one .npy file,
+and readers memory-map one chunk at a time:
+
+  <dataset>/
+    manifest.json              rows, columns, soil/label vocabularies, per-chunk row and label counts
+    00000.N.npy ... 00000.label.npy
+    00001.N.npy ...
+
+soil_type and label are stored as integer codes into the manifest vocabularies.
+
+Datasets come from synthetic_data.py, or from CSV exports of real field data.
+Rows of a sensor_data export only carry temperature and humidity, so they are
+completed from a per-device profile (soil test results, soil type and the crop
+grown on that plot):
+
+  psql "$DATABASE_URL" -c "\\copy (SELECT device_id, temperature, humidity, created_at FROM sensor_data) TO 'sensor_data.csv' CSV HEADER"
+  python datasets.py import sensor_data.csv data/field --profiles device_profiles.json
+
+device_profiles.json: {"KS-001": {"N": 90, "P": 42, "K": 43, "ph": 6.5, "rainfall": 1200,
+                                  "soil_type": "Loam", "label": "rice"}, ...}
+
+Usage:
+  python synthetic_data.py data/crops_100k --samples-per-crop 100000
+  python datasets.py import <file.csv> <dataset> [--profiles device_profiles.json]
+  python datasets.py info <dataset>
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+FORMAT = 'krishisense-dataset'
+FORMAT_VERSION = 2
+
+FEATURE_COLUMNS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+MODEL_COLUMNS = FEATURE_COLUMNS + ['soil_type_encoded']
+CODE_DTYPE = np.int16
+CHUNK_ROWS = 1 << 20
+
+# Leading seed words that keep the split and sampling streams independent:
+# SeedSequence ignores trailing zeros, so [seed, 0] alone would replay seed's stream
+SPLIT_STREAM, SAMPLE_STREAM = 1, 2
+
+# CSV header aliases -> dataset column
+COLUMN_ALIASES = {'temp': 'temperature', 'crop': 'label', 'crop_name': 'label', 'soil': 'soil_type'}
+
+class DatasetWriter:
+    """Appends rows to a new chunked dataset; the directory appears atomically on close()."""
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS, source=None):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.source = source
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._tmp_dir = tempfile.mkdtemp(dir=parent, prefix=f'.{os.path.basename(path)}.')
+        self._soil_types, self._labels = {}, {}
+        self._buffer, self._buffered = [], 0
+        self._chunks = []
+
+    def _codes(self, values, vocabulary):
+        categories, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+        lookup = np.array([vocabulary.setdefault(c, len(vocabulary)) for c in categories], dtype=CODE_DTYPE)
+        return lookup[inverse]
+
+    def append(self, features, soil_type, label):
+        """Add rows: features is {column: array} (or a DataFrame) for FEATURE_COLUMNS."""
+        columns = {column: np.asarray(features[column], dtype=np.float64) for column in FEATURE_COLUMNS}
+        columns['soil_type'] = self._codes(soil_type, self._soil_types)
+        columns['label'] = self._codes(label, self._labels)
+        self._buffer.append(columns)
+        self._buffered += len(columns['label'])
+        while self._buffered >= self.chunk_rows:
+            self._flush(self.chunk_rows)
+
+    def _flush(self, n_rows):
+        merged = {column: np.concatenate([b[column] for b in self._buffer]) for column in self._buffer[0]}
+        chunk_id = f"{len(self._chunks):05d}"
+        for column, values in merged.items():
+            np.save(os.path.join(self._tmp_dir, f"{chunk_id}.{column}.npy"), values[:n_rows])
+        label_counts = np.bincount(merged['label'][:n_rows], minlength=len(self._labels))
+        self._chunks.append({"id": chunk_id, "rows": int(n_rows), "label_counts": label_counts.tolist()})
+        rest = {column: values[n_rows:] for column, values in merged.items()}
+        self._buffered = len(rest['label'])
+        self._buffer = [rest] if self._buffered else []
+
+    def close(self):
+        if self._buffered:
+            self._flush(self._buffered)
+        n_labels = len(self._labels)
+        for chunk in self._chunks:  # pad counts of chunks written before later labels appeared
+            chunk['label_counts'] += [0] * (n_labels - len(chunk['label_counts']))
+        manifest = {
+            "format": FORMAT,
+            "format_version": FORMAT_VERSION,
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "source": self.source,
+            "rows": sum(chunk['rows'] for chunk in self._chunks),
+            "features": FEATURE_COLUMNS,
+            "soil_types": list(self._soil_types),
+            "labels": list(self._labels),
+            "chunks": self._chunks
+        }
+        with open(os.path.join(self._tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.rename(self._tmp_dir, self.path)
+        return manifest['rows']
+
+    def abort(self):
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None: self.close()
+        else: self.abort()
+
+class Dataset:
+    """Read side of a chunked dataset. Every chunk is memory-mapped on access."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != FORMAT or self.manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dataset format: {self.manifest.get('format')} v{self.manifest.get('format_version')}")
+        self.rows = self.manifest['rows']
+        self.chunks = self.manifest['chunks']
+        self.soil_types = self.manifest['soil_types']
+        self.labels = np.array(self.manifest['labels'], dtype=object)
+        # Stored soil codes follow first appearance; models use LabelEncoder codes (sorted order)
+        self.soil_classes = np.array(sorted(self.soil_types), dtype=object)
+        self._soil_encoded = np.searchsorted(self.soil_classes, self.soil_types).astype(np.float64)
+
+    def column(self, i, column, mmap=True):
+        return np.load(os.path.join(self.path, f"{self.chunks[i]['id']}.{column}.npy"), mmap_mode='r' if mmap else None)
+
+    def label_counts(self):
+        return np.sum([chunk['label_counts'] for chunk in self.chunks], axis=0)
+
+    def test_mask(self, i, test_size=0.2, seed=42):
+        """Deterministic per-row train/test assignment for chunk i (True = test)."""
+        return np.random.default_rng([SPLIT_STREAM, seed, i]).random(self.chunks[i]['rows']) < test_size
+
+    def matrix(self, i, rows=None):
+        """Model input (n, 8) for chunk i: FEATURE_COLUMNS + soil_type_encoded, plus label codes."""
+        rows = slice(None) if rows is None else rows
+        soil = self.column(i, 'soil_type')[rows]
+        X = np.empty((len(soil), len(MODEL_COLUMNS)))
+        for j, column in enumerate(FEATURE_COLUMNS):
+            X[:, j] = self.column(i, column)[rows]
+        X[:, -1] = self._soil_encoded[soil]
+        return X, np.asarray(self.column(i, 'label')[rows])
+
+    def iter_split(self, split, test_size=0.2, seed=42):
+        """Yield (X, label codes) per chunk for the 'train' or 'test' rows."""
+        for i in range(len(self.chunks)):
+            mask = self.test_mask(i, test_size, seed)
+            if split == 'train': mask = ~mask
+            if mask.any():
+                yield self.matrix(i, np.flatnonzero(mask))
+
+    def sample(self, n_rows, seed, test_size=0.2, split_seed=42):
+        """Class-balanced random sample of about n_rows training rows, drawn in one pass.
+
+        Every label gets an equal quota, so each sample contains every class
+        (needed to grow one forest across samples).
+        """
+        expected_train = self.label_counts() * (1 - test_size)
+        quota = n_rows / len(self.labels)
+        keep_probability = np.minimum(1.0, quota / np.maximum(expected_train, 1))
+        rng = np.random.default_rng([SAMPLE_STREAM, seed])
+        parts_X, parts_y = [], []
+        for i in range(len(self.chunks)):
+            labels = self.column(i, 'label')
+            train = ~self.test_mask(i, test_size, split_seed)
+            selected = np.flatnonzero(train & (rng.random(len(labels)) < keep_probability[labels]))
+            if selected.size:
+                X, y = self.matrix(i, selected)
+                parts_X.append(X)
+                parts_y.append(y)
+        return np.concatenate(parts_X), np.concatenate(parts_y)
+
+    def to_frame(self):
+        """Whole dataset in memory as a DataFrame (soil_type and label as categoricals)."""
+        data = {column: np.concatenate([self.column(i, column) for i in range(len(self.chunks))]) for column in FEATURE_COLUMNS}
+        soil = np.concatenate([self.column(i, 'soil_type') for i in range(len(self.chunks))])
+        label = np.concatenate([self.column(i, 'label') for i in range(len(self.chunks))])
+        data['soil_type'] = pd.Categorical.from_codes(soil, self.soil_types)
+        data['label'] = pd.Categorical.from_codes(label, list(self.labels))
+        return pd.DataFrame(data, copy=False)
+
+# --- CSV Import ---
+
+def import_csv(csv_path, dataset_path, profiles=None, chunk_rows=CHUNK_ROWS):
+    """Convert a CSV (e.g. a sensor_data export) into a chunked dataset, streaming.
+
+    Columns missing from the CSV are filled per row from profiles[device_id].
+    Rows that still lack a value are skipped. Returns (rows imported, rows skipped).
+    """
+    required = FEATURE_COLUMNS + ['soil_type', 'label']
+    profile_frame = pd.DataFrame.from_dict(profiles, orient='index') if profiles else None
+    imported = skipped = 0
+    with DatasetWriter(dataset_path, chunk_rows, source=os.path.basename(csv_path)) as writer:
+        for frame in pd.read_csv(csv_path, chunksize=min(chunk_rows, 100_000)):
+            frame = frame.rename(columns=lambda c: COLUMN_ALIASES.get(c.strip().lower(), c.strip()))
+            if profile_frame is not None and 'device_id' in frame:
+                device_ids = frame['device_id'].astype(str)
+                for column in required:
+                    if column in profile_frame:
+                        from_profile = device_ids.map(profile_frame[column])
+                        frame[column] = frame[column].fillna(from_profile) if column in frame else from_profile
+            missing = [column for column in required if column not in frame]
+            if missing:
+                raise ValueError(f"{csv_path}: no value for {', '.join(missing)} (add the columns or --profiles)")
+            frame[FEATURE_COLUMNS] = frame[FEATURE_COLUMNS].apply(pd.to_numeric, errors='coerce')
+            complete = frame[required].notna().all(axis=1)
+            skipped += int((~complete).sum())
+            frame = frame[complete]
+            if len(frame):
+                writer.append(frame, frame['soil_type'], frame['label'].astype(str).str.lower())
+                imported += len(frame)
+    return imported, skipped
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build and inspect chunked training datasets")
+    commands = parser.add_subparsers(dest='command', required=True)
+    importer = commands.add_parser('import', help="import a CSV (e.g. a sensor_data export)")
+    importer.add_argument('csv')
+    importer.add_argument('path')
+    importer.add_argument('--profiles', help="JSON of per-device N/P/K/ph/rainfall/soil_type/label")
+    importer.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    info = commands.add_parser('info', help="summarize a dataset")
+    info.add_argument('path')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == 'import':
+        profiles = None
+        if args.profiles:
+            with open(args.profiles) as f: profiles = json.load(f)
+        try:
+            imported, skipped = import_csv(args.csv, args.path, profiles, args.chunk_rows)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✓ {imported:,} rows imported to {args.path} ({skipped:,} incomplete rows skipped) in {time.perf_counter() - started:.2f}s")
+    else:
+        dataset = Dataset(args.path)
+        print(f"{args.path}: {dataset.rows:,} rows in {len(dataset.chunks)} chunks (source: {dataset.manifest['source']})")
+        print(f"  Soil types: {', '.join(dataset.soil_types)}")
+        for label, count in zip(dataset.labels, dataset.label_counts()):
+            print(f"  {label:15s} {count:>12,}")
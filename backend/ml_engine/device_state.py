@@ -0,0 +1,256 @@
+"""
+Per-Device Rolling State
+========================
+Keeps every device's recent moisture readings and running statistics in the
+ML engine, so irrigation can act on trends without reloading sensor_data
+history from Postgres on each upload.
+
+State is one memory-mapped .npy file: a fixed-size, open-addressing hash table
+(linear probing on crc32 of the device_id) of fixed-size records. Every
+gunicorn worker maps the same file, so all workers see one state, and writers
+are serialized across workers with an flock on <file>.lock. The file is the
+snapshot: the kernel writes dirty pages back, flush() forces it, and a restart
+maps the file again instead of replaying history. Each record holds:
+
+  ring_time/ring_value  the last `window` readings (uint32 unix seconds, float32 moisture)
+  mean_*/var_*/cov      exponentially weighted (ALPHA per reading) mean and variance of
+                        moisture and time, and their covariance, updated in O(1) per
+                        reading (West's incremental algorithm); the EWMA is mean_value,
+                        and cov / var_time is the slope of the weighted trend line
+  crop                  the crop the device last reported
+
+forecast() projects that trend line to the crop's min_moisture/max_moisture
+band (crop_data.json). Devices are never evicted; size the table (capacity)
+at about 1.5x the fleet: a record is 368 bytes with the default window, so
+the default 2^18 records take 96 MB.
+
+Usage:
+  python device_state.py device_state.npy     # occupancy and a sample of devices
+"""
+import os
+import sys
+import time
+import zlib
+import fcntl
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+ALPHA = 0.2
+MIN_TREND_READINGS = 3
+STABLE_SLOPE = 0.05   # moisture points per hour; slower trends count as "stable"
+MAX_PROBES = 256      # a longer probe sequence means the table is (nearly) full
+ID_BYTES = 32
+CROP_BYTES = 24
+
+class DeviceTableFull(Exception):
+    """Raised when a new device finds no free record within MAX_PROBES slots."""
+
+def record_dtype(window):
+    return np.dtype([
+        ('device_id', f'S{ID_BYTES}'),
+        ('crop', f'S{CROP_BYTES}'),
+        ('count', '<u4'),
+        ('last_time', '<f8'),
+        ('last_value', '<f4'),
+        ('mean_time', '<f8'),
+        ('mean_value', '<f8'),
+        ('var_time', '<f8'),
+        ('var_value', '<f8'),
+        ('cov', '<f8'),
+        ('ring_time', '<u4', (window,)),
+        ('ring_value', '<f4', (window,)),
+    ])
+
+class DeviceStore:
+    """Array-backed per-device state in a shared memory-mapped file."""
+
+    def __init__(self, path, capacity=1 << 18, window=32, alpha=ALPHA):
+        self.path = path
+        self.alpha = alpha
+        self._lock_file, self._lock_pid = None, None
+        self._thread_lock = threading.Lock()
+        with self.locked():
+            if not os.path.exists(path):
+                # Created under a temp name, so another worker never maps a half-written header
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                np.lib.format.open_memmap(tmp_path, mode='w+', dtype=record_dtype(window), shape=(capacity,)).flush()
+                os.replace(tmp_path, path)
+            self.table = np.lib.format.open_memmap(path, mode='r+')
+        # An existing file keeps its own capacity and window
+        self.window = self.table.dtype['ring_value'].shape[0]
+        if self.table.dtype != record_dtype(self.window):
+            raise ValueError(f"{path} is not a device state file")
+        self.slots = {}  # device_id -> record index; records never move, so this never goes stale
+
+    @contextmanager
+    def locked(self, exclusive=True):
+        """Hold the cross-worker file lock (and this process's thread lock)."""
+        with self._thread_lock:
+            # flock belongs to the open file, so each forked worker opens its own
+            if self._lock_pid != os.getpid():
+                self._lock_file, self._lock_pid = open(self.path + '.lock', 'a'), os.getpid()
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _slot(self, key, create):
+        """Record index for a device_id (bytes), claiming a free one if create. None if absent."""
+        slot = self.slots.get(key)
+        if slot is not None:
+            return slot
+        if not key or len(key) > ID_BYTES:
+            raise ValueError(f"device_id must be 1-{ID_BYTES} bytes")
+        ids = self.table['device_id']
+        slot = zlib.crc32(key) % len(ids)
+        for _ in range(min(MAX_PROBES, len(ids))):
+            current = ids[slot]
+            if current == key or not current:
+                if not current:
+                    if not create:
+                        return None
+                    ids[slot] = key
+                self.slots[key] = slot
+                return slot
+            slot = (slot + 1) % len(ids)
+        if create:
+            raise DeviceTableFull(f"No free device record near {key!r}; increase the table capacity")
+        return None
+
+    def claim(self, device_ids):
+        """Make sure every device has a record. Returns {device_id: error message} for those that found none free."""
+        failed = {}
+        with self.locked():
+            for device_id in device_ids:
+                try:
+                    self._slot(device_id.encode(), True)
+                except DeviceTableFull as e:
+                    failed[device_id] = str(e)
+        return failed
+
+    def ingest(self, device_ids, times, values, crops):
+        """Apply readings (in order per device). Returns a bool mask of the accepted ones.
+
+        A reading older than its device's last one is rejected. A time of None means
+        now, taken under the lock (and never before the device's last reading), so
+        concurrent workers can't make such readings stale. crops may hold None for
+        readings that don't report a crop.
+        """
+        keys = [device_id.encode() for device_id in device_ids]
+        values = np.asarray(values, dtype=np.float64)
+        accepted = np.zeros(len(keys), dtype=bool)
+        with self.locked():
+            slots = np.array([self._slot(key, True) for key in keys], dtype=np.int64)
+            now = time.time()
+            stamped = np.array([t is None for t in times], dtype=bool)
+            times = np.array([now if t is None else t for t in times], dtype=np.float64)
+            # Round r applies every device's r-th reading of the batch, so each round is vectorized
+            seen, occurrence = {}, np.empty(len(keys), dtype=np.int64)
+            for i, key in enumerate(keys):
+                occurrence[i] = seen[key] = seen.get(key, -1) + 1
+            for r in range(occurrence.max() + 1 if len(keys) else 0):
+                rows = np.flatnonzero(occurrence == r)
+                accepted[rows] = self._apply(slots[rows], times[rows], values[rows], stamped[rows])
+            for i, crop in enumerate(crops):
+                if crop and accepted[i]:
+                    self.table['crop'][slots[i]] = crop.lower().encode()[:CROP_BYTES]
+        return accepted
+
+    def _apply(self, slots, t, v, stamped):
+        """One reading for each of a set of distinct records. Returns the accepted mask."""
+        table = self.table
+        count = table['count'][slots]
+        t = np.where(stamped, np.maximum(t, table['last_time'][slots]), t)
+        ok = (count == 0) | (t >= table['last_time'][slots])
+        slots, t, v, count = slots[ok], t[ok], v[ok], count[ok]
+        # The first reading sets the means (weight 1) and leaves the variances at 0
+        a = np.where(count == 0, 1.0, self.alpha)
+        d_time = t - table['mean_time'][slots]
+        d_value = v - table['mean_value'][slots]
+        table['mean_time'][slots] += a * d_time
+        table['mean_value'][slots] += a * d_value
+        table['var_time'][slots] = (1 - a) * (table['var_time'][slots] + a * d_time * d_time)
+        table['var_value'][slots] = (1 - a) * (table['var_value'][slots] + a * d_value * d_value)
+        table['cov'][slots] = (1 - a) * (table['cov'][slots] + a * d_time * d_value)
+        position = count % self.window
+        table['ring_time'][slots, position] = t
+        table['ring_value'][slots, position] = v
+        table['last_time'][slots] = t
+        table['last_value'][slots] = v
+        table['count'][slots] = count + 1
+        return ok
+
+    def get(self, device_id):
+        """A copy of the device's record, or None for an unknown device."""
+        with self.locked(exclusive=False):
+            slot = self._slot(device_id.encode(), False)
+            return None if slot is None else self.table[slot].copy()
+
+    def recent(self, record):
+        """The record's ring buffer as [(unix seconds, moisture), ...], oldest first."""
+        count = int(record['count'])
+        n = min(count, self.window)
+        order = np.arange(count - n, count) % self.window
+        return [(int(t), float(v)) for t, v in zip(record['ring_time'][order], record['ring_value'][order])]
+
+    def stats(self):
+        devices = int(np.count_nonzero(self.table['device_id']))
+        return {"devices": devices, "capacity": len(self.table), "window": self.window,
+                "load_factor": round(devices / len(self.table), 4)}
+
+    def flush(self):
+        self.table.flush()
+
+def trend(record):
+    """(level, slope per hour) of the record's weighted trend line at its last reading.
+
+    Slope is None until MIN_TREND_READINGS readings spread over time; level is then the EWMA.
+    """
+    if record['count'] < MIN_TREND_READINGS or record['var_time'] <= 0:
+        return float(record['mean_value']), None
+    slope = record['cov'] / record['var_time']  # per second
+    level = record['mean_value'] + slope * (record['last_time'] - record['mean_time'])
+    return float(level), float(slope * 3600)
+
+def forecast(record, min_moisture, max_moisture):
+    """Where the trend line is heading relative to a crop's moisture band.
+
+    status: below_min / above_max (already outside), drying / wetting (hours_to_min /
+    hours_to_max: hours after the last reading until the line crosses the bound),
+    stable, or insufficient_data.
+    """
+    level, slope = trend(record)
+    result = {"level": round(level, 2), "min_moisture": min_moisture, "max_moisture": max_moisture,
+              "hours_to_min": None, "hours_to_max": None}
+    if level < min_moisture:
+        result["status"] = "below_min"
+    elif level > max_moisture:
+        result["status"] = "above_max"
+    elif slope is None:
+        result["status"] = "insufficient_data"
+    elif slope <= -STABLE_SLOPE:
+        result["status"] = "drying"
+        result["hours_to_min"] = round((level - min_moisture) / -slope, 2)
+    elif slope >= STABLE_SLOPE:
+        result["status"] = "wetting"
+        result["hours_to_max"] = round((max_moisture - level) / slope, 2)
+    else:
+        result["status"] = "stable"
+    return result
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    if not os.path.exists(sys.argv[1]):
+        print(f"No device state file at {sys.argv[1]}")
+        sys.exit(1)
+    store = DeviceStore(sys.argv[1])
+    print(store.stats())
+    for slot in np.flatnonzero(store.table['device_id'])[:10]:
+        record = store.table[slot]
+        level, slope = trend(record)
+        print(f"  {record['device_id'].decode():20s} {int(record['count']):6d} readings  "
+              f"ewma {record['mean_value']:6.2f}  trend {slope if slope is None else round(slope, 3)}/h")
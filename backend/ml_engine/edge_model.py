@@ -0,0 +1,256 @@
+"""
+Distilled Edge Model
+====================
+A single shallow decision tree fitted to the teacher's (the ensemble's) soft
+labels, small enough to score crops on the field gateways themselves, and
+exported without dependencies:
+
+  edge_model.json   arrays + feature/class/soil names, read by EdgeModel (pure Python)
+  edge_model.h      the same arrays as C, with edge_model_predict()
+
+The student works on raw sensor units, so the device needs no scaler. Inputs
+are compared as float32 (as sklearn does, and as a device reading is), and
+split thresholds are stored as the largest float32 not above sklearn's
+threshold, so every evaluator takes the same branch. Leaf probabilities are
+quantized to uint8 (p * 255). Agreement is measured on the quantized model,
+so the reported numbers are what the device gets.
+
+The soft labels cover the synthetic input space: fresh per-crop samples
+(synthetic_data.py, with their own seed) plus a share of points drawn
+uniformly over the whole feature box, so the student also learns the regions
+between crops.
+
+Usage (reference evaluator, standard library only):
+  python edge_model.py edge_model.json N P K temperature humidity ph rainfall [soil_type]
+"""
+import sys
+import json
+import struct
+
+FORMAT = 'krishisense-edge'
+FORMAT_VERSION = 1
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall', 'soil_type_encoded']
+UNIFORM_FRACTION = 0.25
+
+def _float32(x):
+    return struct.unpack('f', struct.pack('f', x))[0]
+
+class EdgeModel:
+    """Array-backed decision tree over raw feature rows (the last feature is the soil code)."""
+
+    def __init__(self, feature, threshold, left, right, leaf, values, classes, soil_types):
+        self.feature = feature        # split feature per node, -1 for leaves
+        self.threshold = threshold    # float32-representable split thresholds
+        self.left = left
+        self.right = right
+        self.leaf = leaf              # row in values for leaves, -1 for split nodes
+        self.values = values          # per leaf, uint8 class probabilities (p * 255)
+        self.classes = classes
+        self.soil_types = soil_types
+        self._arrays = None           # numpy copies for predict_proba_matrix, built on first use
+
+    # --- Training side (numpy / sklearn) ---
+
+    @classmethod
+    def from_sklearn(cls, tree, classes, soil_types):
+        """Convert a fitted multi-output DecisionTreeRegressor over soft labels."""
+        import numpy as np
+        t = tree.tree_
+        is_leaf = t.children_left < 0
+        # Round thresholds down to float32: float32(x) <= t  <=>  float32(x) <= t32
+        threshold = t.threshold.astype(np.float32)
+        too_high = threshold.astype(np.float64) > t.threshold
+        threshold[too_high] = np.nextafter(threshold[too_high], np.float32(-np.inf))
+        proba = t.value[:, :, 0]
+        proba = proba / np.maximum(proba.sum(axis=1, keepdims=True), 1e-12)
+        leaf = np.full(t.node_count, -1)
+        leaf[is_leaf] = np.arange(is_leaf.sum())
+        return cls(
+            feature=np.where(is_leaf, -1, t.feature).tolist(),
+            threshold=[float(v) for v in np.where(is_leaf, 0, threshold)],
+            left=np.where(is_leaf, -1, t.children_left).tolist(),
+            right=np.where(is_leaf, -1, t.children_right).tolist(),
+            leaf=leaf.tolist(),
+            values=np.round(proba[is_leaf] * 255).astype(np.uint8).tolist(),
+            classes=[str(c) for c in classes],
+            soil_types=[str(s) for s in soil_types]
+        )
+
+    def predict_proba_matrix(self, X):
+        """Vectorized predict_proba for an (n_rows, n_features) array, rows normalized to sum to 1."""
+        import numpy as np
+        if self._arrays is None:
+            self._arrays = (np.array(self.feature), np.array(self.threshold, dtype=np.float32),
+                            np.stack([self.left, self.right], axis=1), np.array(self.leaf),
+                            np.array(self.values, dtype=np.float64))
+        feature, threshold, children, leaf, values = self._arrays
+        X = np.asarray(X, dtype=np.float32)
+        nodes = np.zeros(len(X), dtype=np.int64)
+        active = np.flatnonzero(feature[nodes] >= 0)
+        while active.size:
+            current = nodes[active]
+            go_right = X[active, feature[current]] > threshold[current]
+            nodes[active] = children[current, go_right.astype(np.int64)]
+            active = active[feature[nodes[active]] >= 0]
+        rows = values[leaf[nodes]]
+        return rows / np.maximum(rows.sum(axis=1, keepdims=True), 1)
+
+    # --- Reference evaluator (standard library only) ---
+
+    def encode(self, payload):
+        """Feature row for a /predict-style payload; unknown soil types get code 0, as in app.py."""
+        soil = payload.get('soil_type', 'Loam')
+        code = self.soil_types.index(soil) if soil in self.soil_types else 0
+        return [float(payload[name]) for name in FEATURES[:-1]] + [float(code)]
+
+    def leaf_values(self, row):
+        """Quantized (uint8) class probabilities of the leaf a feature row lands in."""
+        node = 0
+        while self.feature[node] >= 0:
+            node = self.left[node] if _float32(row[self.feature[node]]) <= self.threshold[node] else self.right[node]
+        return self.values[self.leaf[node]]
+
+    def predict_proba(self, row):
+        values = self.leaf_values(row)
+        total = sum(values) or 1
+        return [v / total for v in values]
+
+    def predict(self, row):
+        """Class with the highest leaf value (first one on ties, like edge_model_predict())."""
+        values = self.leaf_values(row)
+        return self.classes[values.index(max(values))]
+
+    # --- Export ---
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def size_bytes(self):
+        """Size of the C arrays: int8 feature, float32 threshold, int16 left/right/leaf, uint8 values."""
+        return self.n_nodes * (1 + 4 + 3 * 2) + len(self.values) * len(self.classes)
+
+    def to_dict(self):
+        return {
+            "format": FORMAT,
+            "format_version": FORMAT_VERSION,
+            "features": FEATURES,
+            "classes": self.classes,
+            "soil_types": self.soil_types,
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "left": self.left,
+            "right": self.right,
+            "leaf": self.leaf,
+            "values": self.values
+        }
+
+    def save_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('format') != FORMAT or data.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported edge model format: {data.get('format')} v{data.get('format_version')}")
+        return cls(*(data[key] for key in ('feature', 'threshold', 'left', 'right', 'leaf', 'values', 'classes', 'soil_types')))
+
+    def write_c_header(self, path):
+        if self.n_nodes > 32767:
+            raise ValueError(f"{self.n_nodes} nodes do not fit the int16 node arrays")
+        strings = lambda items: ', '.join(json.dumps(s) for s in items)
+        numbers = lambda items: ', '.join(str(v) for v in items)
+        rows = ',\n    '.join('{' + numbers(v) + '}' for v in self.values)
+        with open(path, 'w') as f:
+            f.write(f"""/* Distilled crop model, generated by train_model.py (edge_model.py). Do not edit. */
+#ifndef EDGE_MODEL_H
+#define EDGE_MODEL_H
+#include <stdint.h>
+
+#define EDGE_N_FEATURES {len(FEATURES)}
+#define EDGE_N_CLASSES {len(self.classes)}
+#define EDGE_N_NODES {self.n_nodes}
+#define EDGE_N_SOIL_TYPES {len(self.soil_types)}
+
+static const char *const EDGE_FEATURES[EDGE_N_FEATURES] = {{{strings(FEATURES)}}};
+static const char *const EDGE_CLASSES[EDGE_N_CLASSES] = {{{strings(self.classes)}}};
+static const char *const EDGE_SOIL_TYPES[EDGE_N_SOIL_TYPES] = {{{strings(self.soil_types)}}};
+
+static const int8_t EDGE_FEATURE[EDGE_N_NODES] = {{{numbers(self.feature)}}};
+static const float EDGE_THRESHOLD[EDGE_N_NODES] = {{{', '.join(f'{t!r}f' for t in self.threshold)}}};
+static const int16_t EDGE_LEFT[EDGE_N_NODES] = {{{numbers(self.left)}}};
+static const int16_t EDGE_RIGHT[EDGE_N_NODES] = {{{numbers(self.right)}}};
+static const int16_t EDGE_LEAF[EDGE_N_NODES] = {{{numbers(self.leaf)}}};
+static const uint8_t EDGE_VALUES[{len(self.values)}][EDGE_N_CLASSES] = {{
+    {rows}
+}};
+
+/* x: N, P, K, temperature, humidity, ph, rainfall and the soil code (index into
+   EDGE_SOIL_TYPES, 0 if unknown). Returns the index into EDGE_CLASSES; if proba
+   is not NULL it receives the leaf's class probabilities, scaled to 0..255. */
+static inline int edge_model_predict(const float x[EDGE_N_FEATURES], const uint8_t **proba) {{
+    int node = 0;
+    while (EDGE_FEATURE[node] >= 0)
+        node = x[EDGE_FEATURE[node]] <= EDGE_THRESHOLD[node] ? EDGE_LEFT[node] : EDGE_RIGHT[node];
+    const uint8_t *values = EDGE_VALUES[EDGE_LEAF[node]];
+    int best = 0;
+    for (int c = 1; c < EDGE_N_CLASSES; c++)
+        if (values[c] > values[best]) best = c;
+    if (proba) *proba = values;
+    return best;
+}}
+
+#endif /* EDGE_MODEL_H */
+""")
+
+# --- Distillation ---
+
+def distillation_inputs(samples_per_crop, soil_types, parameters, seed=7):
+    """Raw feature rows covering the synthetic input space: per-crop samples plus uniform box samples."""
+    import numpy as np
+    from synthetic_data import generate_dataset, FEATURE_SPECS
+    df = generate_dataset(samples_per_crop, parameters, seed)
+    soil_code = {soil: code for code, soil in enumerate(soil_types)}
+    soil = df['soil_type'].cat
+    soil_codes = np.array([soil_code.get(s, 0) for s in soil.categories], dtype=float)[soil.codes.to_numpy()]
+    crop_rows = np.column_stack([df[column].to_numpy() for column in FEATURE_SPECS] + [soil_codes])
+
+    rng = np.random.default_rng(seed)
+    n_uniform = int(len(crop_rows) * UNIFORM_FRACTION / (1 - UNIFORM_FRACTION))
+    low = [min(p[key][0] for p in parameters.values()) for key, _ in FEATURE_SPECS.values()]
+    high = [max(p[key][1] for p in parameters.values()) for key, _ in FEATURE_SPECS.values()]
+    uniform_rows = np.column_stack([rng.uniform(low, high, (n_uniform, len(low))),
+                                    rng.integers(0, len(soil_types), n_uniform)])
+    return np.vstack([crop_rows, uniform_rows])
+
+def fit_student(X, teacher_proba, classes, soil_types, max_depth=8, min_samples_leaf=20):
+    """Fit a shallow regression tree to the teacher's class probabilities. Returns an EdgeModel."""
+    from sklearn.tree import DecisionTreeRegressor
+    tree = DecisionTreeRegressor(max_depth=max_depth, min_samples_leaf=min_samples_leaf, random_state=42)
+    tree.fit(X, teacher_proba)
+    return EdgeModel.from_sklearn(tree, classes, soil_types)
+
+def agreement(student, X, teacher_proba):
+    """Share of rows where the student's top class is the teacher's (top1), or in its top 3 (top3)."""
+    import numpy as np
+    student_top = np.argmax(student.predict_proba_matrix(X), axis=1)
+    teacher_top3 = np.argsort(-teacher_proba, axis=1)[:, :3]
+    return {
+        "top1": float(np.mean(student_top == teacher_top3[:, 0])),
+        "top3": float(np.mean((teacher_top3 == student_top[:, None]).any(axis=1)))
+    }
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (9, 10):
+        print(__doc__)
+        sys.exit(1)
+    model = EdgeModel.load(sys.argv[1])
+    payload = dict(zip(FEATURES[:-1], sys.argv[2:9]))
+    if len(sys.argv) == 10:
+        payload['soil_type'] = sys.argv[9]
+    row = model.encode(payload)
+    ranked = sorted(zip(model.predict_proba(row), model.classes), reverse=True)
+    for p, crop in ranked[:5]:
+        print(f"  {crop:15s} {p * 100:5.1f}%")
@@ -0,0 +1,83 @@
+"""
+Parallel Ensemble Member Training
+=================================
+Fits independent ensemble members at the same time, one process each, and
+assembles the soft-voting ensemble from the fitted members instead of letting
+VotingClassifier.fit clone and refit all of them.
+
+GradientBoostingClassifier and SVC(probability=True) are both single-threaded,
+so run serially they leave every core but one idle. In the pool each member
+is fitted exactly as it would be in-process (same estimator, random_state and
+data), so the models, and the ensemble's probabilities, match a serial run.
+
+The pool forks (train_model.py is a script without a __main__ guard, which
+spawned workers would re-run). Where fork is unavailable, members are fitted
+serially. Each member reports its wall time and the peak RSS of the process
+that fitted it; in a forked worker that peak includes the pages shared with
+the parent, so the growth during the fit is reported as well.
+"""
+import os
+import sys
+import time
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.ensemble import VotingClassifier
+from sklearn.preprocessing import LabelEncoder
+from sklearn.utils import Bunch
+
+def rss_mb():
+    """Current resident set size in MB (the peak so far where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10  # bytes on macOS, KB elsewhere
+
+def fit_member(name, estimator, X, y):
+    """Fit one member. Returns (name, fitted estimator, {"seconds", "peak_rss_mb", "fit_rss_mb"})."""
+    before = rss_mb()
+    started = time.perf_counter()
+    estimator.fit(X, y)
+    seconds = time.perf_counter() - started
+    peak = peak_rss_mb()
+    return name, estimator, {"seconds": round(seconds, 3), "peak_rss_mb": round(peak, 1),
+                             "fit_rss_mb": round(max(0.0, peak - before), 1)}
+
+def fit_members(members, X, y, jobs):
+    """Fit [(name, unfitted estimator), ...]. Returns {name: (fitted estimator, stats)} in the same order.
+
+    jobs <= 1 (or no fork) fits them one after the other in this process.
+    """
+    if jobs > 1 and len(members) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        # As many workers as members, all submitted at once: each member gets its own process
+        with ProcessPoolExecutor(max_workers=min(jobs, len(members)),
+                                 mp_context=multiprocessing.get_context('fork')) as pool:
+            futures = [pool.submit(fit_member, name, estimator, X, y) for name, estimator in members]
+            results = [future.result() for future in futures]
+    else:
+        results = [fit_member(name, estimator, X, y) for name, estimator in members]
+    return {name: (estimator, stats) for name, estimator, stats in results}
+
+def assemble_voting(estimators, y, **params):
+    """A fitted VotingClassifier over already-fitted (name, estimator) pairs, without refitting them.
+
+    Sets what VotingClassifier.fit would: le_/classes_ from y, estimators_ and
+    named_estimators_. The members must have been fitted on the same labels.
+    """
+    ensemble = VotingClassifier(estimators=estimators, **params)
+    ensemble.le_ = LabelEncoder().fit(y)
+    ensemble.classes_ = ensemble.le_.classes_
+    for name, estimator in estimators:
+        if list(estimator.classes_) != list(ensemble.classes_):
+            raise ValueError(f"Member {name} was fitted on different classes")
+    ensemble.estimators_ = [estimator for _, estimator in estimators]
+    ensemble.named_estimators_ = Bunch(**dict(estimators))
+    for _, estimator in estimators:
+        if hasattr(estimator, 'feature_names_in_'):
+            ensemble.feature_names_in_ = estimator.feature_names_in_
+    return ensemble
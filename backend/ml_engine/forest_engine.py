@@ -0,0 +1,177 @@
+"""
+Native Forest Inference Engine
+==============================
+Flattens the RandomForest crop model into contiguous NumPy arrays and scores
+batches with pure array operations, without sklearn's per-estimator dispatch.
+
+Layout (all trees concatenated, node ids are global):
+  feature      int32   (n_nodes,)     split feature, 0 for leaves
+  threshold    float64 (n_nodes,)     split threshold in *raw* (unscaled) units
+  children     int32   (n_nodes, 2)   [left, right]; a leaf points to itself
+  leaf_index   int32   (n_nodes,)     row in leaf_values, -1 for split nodes
+  leaf_values  float64 (n_leaves, C)  per-tree class probabilities at each leaf
+  roots        int32   (n_trees,)     root node of each tree
+
+The StandardScaler is folded into the thresholds. sklearn compares
+float32((x - mean) / scale) <= t. That expression is monotone in x, so for
+every split we binary-search the largest float64 x that goes left and store it
+instead. Raw inputs then take exactly the same path as in sklearn. Leaf values
+are the per-tree probabilities sklearn would return, and they are summed in
+estimator order, so probabilities are bit-identical to
+RandomForestClassifier.predict_proba run with n_jobs=1.
+
+The arrays are persisted (and memory-mapped at load) by artifacts.py.
+"""
+import numpy as np
+
+ARRAY_NAMES = ('feature', 'threshold', 'children', 'leaf_index', 'leaf_values', 'roots')
+
+# Up to this many rows, tree outputs are gathered and summed in one cumsum call
+SMALL_BATCH_ROWS = 16
+
+def _float_to_ordered(x):
+    """Map float64 values to int64 keys with the same ordering."""
+    bits = np.asarray(x, dtype=np.float64).view(np.int64)
+    return np.where(bits >= 0, bits, np.int64(-0x8000000000000000) - bits)
+
+def _ordered_to_float(keys):
+    bits = np.where(keys >= 0, keys, np.int64(-0x8000000000000000) - keys)
+    return bits.astype(np.int64).view(np.float64)
+
+def fold_thresholds(threshold, mean, scale):
+    """Largest float64 x with float32((x - mean) / scale) <= threshold, elementwise."""
+    def goes_left(x):
+        with np.errstate(over='ignore', invalid='ignore'):
+            return ((x - mean) / scale).astype(np.float32) <= threshold
+
+    # Bisect over the ordered bit patterns of finite float64 values
+    lo = np.full(threshold.shape, _float_to_ordered(-np.finfo(np.float64).max))
+    hi = np.full(threshold.shape, _float_to_ordered(np.finfo(np.float64).max))
+    all_left = goes_left(_ordered_to_float(hi))
+    none_left = ~goes_left(_ordered_to_float(lo))
+    # Invariant: goes_left(lo) and not goes_left(hi)
+    while True:
+        active = hi > lo + 1
+        if not active.any(): break
+        mid = (lo >> 1) + (hi >> 1) + (lo & hi & 1)  # floor((lo + hi) / 2) without overflow
+        left = goes_left(_ordered_to_float(mid))
+        lo = np.where(active & left, mid, lo)
+        hi = np.where(active & ~left, mid, hi)
+
+    raw = _ordered_to_float(lo)
+    raw[all_left] = np.inf
+    raw[none_left] = -np.inf
+    return raw
+
+def _tree_probabilities(tree, n_classes):
+    """Per-node class probabilities exactly as DecisionTreeClassifier.predict_proba returns them."""
+    import sklearn
+    proba = np.array(tree.tree_.value[:, 0, :n_classes], dtype=np.float64)
+    if tuple(int(v) for v in sklearn.__version__.split('.')[:2]) < (1, 4):
+        # Older sklearn stores weighted counts and normalizes at predict time
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba /= normalizer
+    return proba
+
+class ForestEngine:
+    """Array-backed RandomForest scorer operating on raw (unscaled) feature rows."""
+
+    def __init__(self, feature, threshold, children, leaf_index, leaf_values, roots, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.leaf_index = leaf_index
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.classes_ = classes
+        self._children_flat = children.reshape(-1)
+        self._is_leaf = leaf_index >= 0
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None):
+        """Flatten a fitted RandomForestClassifier, folding an optional StandardScaler in."""
+        n_classes = len(model.classes_)
+        mean = scaler.mean_ if scaler is not None else np.zeros(model.n_features_in_)
+        scale = scaler.scale_ if scaler is not None else np.ones(model.n_features_in_)
+        features, thresholds, children, leaf_index, leaf_values, roots = [], [], [], [], [], []
+        offset, n_leaves = 0, 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left < 0
+            node_ids = np.arange(tree.node_count)
+
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.int32)
+            # sklearn casts inputs to float32 before comparing, so thresholds are
+            # folded even without a scaler (identity mean/scale)
+            threshold = np.where(is_leaf, 0.0, tree.threshold)
+            split = ~is_leaf
+            threshold[split] = fold_thresholds(threshold[split], mean[feature[split]], scale[feature[split]])
+            left = np.where(is_leaf, node_ids, tree.children_left) + offset
+            right = np.where(is_leaf, node_ids, tree.children_right) + offset
+
+            index = np.full(tree.node_count, -1, dtype=np.int32)
+            index[is_leaf] = np.arange(n_leaves, n_leaves + is_leaf.sum())
+
+            features.append(feature)
+            thresholds.append(threshold)
+            children.append(np.stack([left, right], axis=1).astype(np.int32))
+            leaf_index.append(index)
+            leaf_values.append(_tree_probabilities(estimator, n_classes)[is_leaf])
+            roots.append(offset)
+
+            offset += tree.node_count
+            n_leaves += is_leaf.sum()
+
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds), np.concatenate(children),
+            np.concatenate(leaf_index), np.concatenate(leaf_values),
+            np.array(roots, dtype=np.int32), np.asarray(model.classes_)
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays, classes):
+        """Build an engine over existing arrays (e.g. read-only memory maps), keyed as in ARRAY_NAMES."""
+        return cls(*(arrays[name] for name in ARRAY_NAMES), classes)
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in ARRAY_NAMES}
+
+    def apply(self, X):
+        """Leaf node id reached in every tree, shape (n_trees, n_rows)."""
+        n_rows, n_features = X.shape
+        flat_x = X.reshape(-1)
+        nodes = np.repeat(self.roots, n_rows)
+        row_offsets = np.tile(np.arange(n_rows) * n_features, len(self.roots))
+        # All (tree, row) pairs advance one level per step; pairs that reach a
+        # leaf drop out of the active set, so deep trees don't slow down shallow paths
+        active = np.arange(nodes.size)
+        while active.size:
+            current = nodes[active]
+            go_right = flat_x[row_offsets[active] + self.feature[current]] > self.threshold[current]
+            current = self._children_flat[2 * current + go_right]
+            nodes[active] = current
+            active = active[~self._is_leaf[current]]
+        return nodes.reshape(len(self.roots), n_rows)
+
+    def predict_proba(self, X):
+        """Mean class probabilities over all trees for raw feature rows."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity")
+
+        leaves = self.leaf_index[self.apply(X)]
+        # Sum strictly in estimator order, like sklearn's running sum: one cumsum
+        # over the gathered leaf values for small batches, one add per tree otherwise
+        if X.shape[0] <= SMALL_BATCH_ROWS:
+            proba = np.cumsum(self.leaf_values[leaves], axis=0)[-1]
+        else:
+            proba = np.zeros((X.shape[0], self.leaf_values.shape[1]))
+            for tree_leaves in leaves:
+                proba += self.leaf_values[tree_leaves]
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
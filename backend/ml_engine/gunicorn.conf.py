@@ -0,0 +1,67 @@
+"""
+Production serving config for the ML engine (pre-fork, shared preloaded model).
+
+  cd backend/ml_engine && gunicorn -c gunicorn.conf.py app:app
+
+The master imports app.py once (which runs load_models()), then forks the
+workers. They share the model copy-on-write, or, with the memory-mapped
+artifact store, the same page-cache pages. A crashed worker is replaced by the
+master. Workers are also recycled after ML_MAX_REQUESTS requests, and
+`kill -HUP <master>` rolls the whole pool with a graceful timeout. `python app.py`
+stays the single-process dev server (gunicorn does not run on Windows).
+
+Environment:
+  PORT             listen port (default 5001)
+  ML_WORKERS       worker processes (default: CPUs available to the container)
+  ML_THREADS       threads per worker (default 1)
+  ML_MAX_REQUESTS  requests before a worker is recycled (default 10000, 0 disables)
+  ML_TIMEOUT       seconds before a stuck worker is killed and replaced (default 60)
+"""
+import os
+import gc
+
+# One BLAS/OpenMP thread per worker; parallelism comes from the worker pool.
+# Must be set before numpy is imported by the preloaded app.
+for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(var, '1')
+
+def available_cpus():
+    """CPUs this container may use: cgroup CPU quota, else scheduler affinity, else cpu_count."""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:  # cgroup v2: "<quota> <period>" or "max <period>"
+            quota, period = f.read().split()
+        if quota != 'max':
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f: quota = int(f.read())  # cgroup v1
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f: period = int(f.read())
+        if quota > 0:
+            return max(1, quota // period)
+    except (OSError, ValueError):
+        pass
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+workers = int(os.environ.get('ML_WORKERS', 0)) or available_cpus()
+threads = int(os.environ.get('ML_THREADS', 1))
+preload_app = True
+max_requests = int(os.environ.get('ML_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get('ML_TIMEOUT', 60))
+graceful_timeout = 30
+
+def when_ready(server):
+    # Everything allocated so far (the preloaded model) moves to a permanent GC
+    # generation, so collections in the workers never touch, and copy, those pages
+    gc.freeze()
+    server.log.info(f"[ML Engine] Master {os.getpid()} ready, forking {workers} workers")
+
+def post_fork(server, worker):
+    server.log.info(f"[ML Engine] Worker {worker.pid} started")
+
+def worker_exit(server, worker):
+    server.log.info(f"[ML Engine] Worker {worker.pid} exited")
@@ -0,0 +1,202 @@
+"""
+Budgeted Hyperparameter Search
+==============================
+Successive halving for the RandomForest grid in train_model.py, as a faster
+alternative to an exhaustive GridSearchCV.
+
+Every configuration starts with a few trees (min_trees). After each rung only
+the best 1/factor of the configurations survive, and they are grown factor
+times larger, until max_trees. Survivors are grown with warm_start, so the
+trees of a rung are reused by the next instead of being refit. sklearn draws
+tree seeds in sequence, so a forest grown from 50 to 400 trees is identical
+to one fit with 400 from the start.
+
+The search stops early when a wall-clock (budget_seconds) or compute
+(budget_trees, trees fitted across all folds) budget runs out. The best
+configuration at the highest rung reached then wins. Budgets are cumulative:
+time and trees spent before an interruption count against them on resume.
+
+Every finished (rung, configuration) evaluation is written to a JSON
+checkpoint. A rerun with the same data, grid and settings resumes from it,
+refitting only the models it needs for the next rung.
+
+Results are exposed like GridSearchCV's (best_params_, best_score_,
+best_estimator_, best_index_, n_splits_, cv_results_ with split<i>_test_score),
+so the per-fold scores of the winner can be reported without refitting it.
+"""
+import os
+import json
+import time
+import math
+import hashlib
+import tempfile
+import warnings
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+CHECKPOINT_VERSION = 1
+
+class SuccessiveHalvingSearch:
+    def __init__(self, estimator, param_grid, cv=5, min_trees=50, max_trees=None, factor=3,
+                 budget_seconds=None, budget_trees=None, checkpoint_path=None, verbose=True):
+        grid = dict(param_grid)
+        # Trees are the resource being allocated, not a hyperparameter to search
+        tree_options = grid.pop('n_estimators', [estimator.get_params()['n_estimators']])
+        self.estimator = estimator
+        self.param_grid = grid
+        self.cv = cv
+        self.max_trees = max_trees or max(tree_options)
+        self.min_trees = min(min_trees, self.max_trees)
+        self.factor = factor
+        self.budget_seconds = budget_seconds
+        self.budget_trees = budget_trees
+        self.checkpoint_path = checkpoint_path
+        self.verbose = verbose
+
+    def _rung_trees(self):
+        trees, schedule = self.min_trees, []
+        while trees < self.max_trees:
+            schedule.append(trees)
+            trees *= self.factor
+        return schedule + [self.max_trees]
+
+    def _log(self, message):
+        if self.verbose: print(message)
+
+    # --- Checkpoint ---
+
+    def _fingerprint(self, X, y):
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(X).tobytes())
+        digest.update(np.asarray(y).astype(str).tobytes())
+        digest.update(json.dumps([
+            repr(sorted(self.estimator.get_params().items())), repr(sorted(self.param_grid.items())),
+            self.cv, self.min_trees, self.max_trees, self.factor
+        ]).encode())
+        return digest.hexdigest()
+
+    def _load_checkpoint(self, fingerprint):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return {}, 0.0, 0
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('version') != CHECKPOINT_VERSION or checkpoint.get('fingerprint') != fingerprint:
+            self._log("  Checkpoint is for different data or settings, starting over")
+            return {}, 0.0, 0
+        results = {(r['rung'], r['candidate']): r for r in checkpoint['results']}
+        self._log(f"  Resuming from checkpoint: {len(results)} evaluations already done")
+        return results, checkpoint['elapsed_seconds'], checkpoint['trees_fitted']
+
+    def _save_checkpoint(self, fingerprint, results, elapsed, trees_fitted):
+        if not self.checkpoint_path: return
+        directory = os.path.dirname(os.path.abspath(self.checkpoint_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.search.')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({
+                "version": CHECKPOINT_VERSION,
+                "fingerprint": fingerprint,
+                "elapsed_seconds": elapsed,
+                "trees_fitted": trees_fitted,
+                "results": list(results.values())
+            }, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # --- Search ---
+
+    def _evaluate(self, params, n_trees, folds, X, y, fold_models):
+        """CV scores of one configuration at n_trees, growing its fold models in place."""
+        scores = []
+        for i, (train_idx, test_idx) in enumerate(folds):
+            model = fold_models[i]
+            if model is None:
+                model = fold_models[i] = clone(self.estimator).set_params(**params, warm_start=True)
+            model.set_params(n_estimators=n_trees)
+            with warnings.catch_warnings():
+                # 'balanced' + warm_start warns about refitting on different data; each fold model only sees its own fold
+                warnings.filterwarnings('ignore', message='class_weight presets', category=UserWarning)
+                model.fit(X[train_idx], y[train_idx])
+            scores.append(model.score(X[test_idx], y[test_idx]))
+        return scores
+
+    def fit(self, X, y):
+        X, y = np.asarray(X), np.asarray(y)
+        folds = list(StratifiedKFold(n_splits=self.cv).split(X, y))
+        candidates = list(ParameterGrid(self.param_grid))
+        rungs = self._rung_trees()
+        fingerprint = self._fingerprint(X, y)
+        results, elapsed_before, trees_fitted = self._load_checkpoint(fingerprint)
+        started = time.perf_counter()
+        elapsed = lambda: elapsed_before + time.perf_counter() - started
+
+        self._log(f"  {len(candidates)} configurations, rungs of {rungs} trees, keeping 1/{self.factor} per rung")
+        survivors = list(range(len(candidates)))
+        fold_models = {}  # candidate -> per-fold warm-started models
+        best_rung, exhausted = 0, False
+        for rung, n_trees in enumerate(rungs):
+            for c in survivors:
+                if (rung, c) in results:
+                    continue
+                if (self.budget_seconds and elapsed() >= self.budget_seconds) or \
+                   (self.budget_trees and trees_fitted >= self.budget_trees):
+                    exhausted = True
+                    break
+                fit_started = time.perf_counter()
+                models = fold_models.setdefault(c, [None] * self.cv)
+                # Trees that already exist in the warm-started models are not refit
+                new_trees = sum(n_trees - (len(m.estimators_) if m is not None and hasattr(m, 'estimators_') else 0)
+                                for m in models)
+                scores = self._evaluate(candidates[c], n_trees, folds, X, y, models)
+                trees_fitted += new_trees
+                results[(rung, c)] = {
+                    "rung": rung, "candidate": c, "params": candidates[c], "n_estimators": n_trees,
+                    "fold_scores": scores, "fit_seconds": round(time.perf_counter() - fit_started, 3)
+                }
+                self._save_checkpoint(fingerprint, results, elapsed(), trees_fitted)
+
+            evaluated = [c for c in survivors if (rung, c) in results]
+            if evaluated:
+                best_rung = rung
+            mean_score = lambda c: np.mean(results[(rung, c)]['fold_scores'])
+            self._log(f"  Rung {rung}: {len(evaluated)}/{len(survivors)} configurations at {n_trees} trees, "
+                      f"best {max(map(mean_score, evaluated)) * 100:.2f}%" if evaluated else f"  Rung {rung}: no budget left")
+            if exhausted or rung == len(rungs) - 1:
+                break
+            # Ties keep grid order, like GridSearchCV's rank_test_score
+            ranked = sorted(evaluated, key=lambda c: (-mean_score(c), c))
+            survivors = ranked[:max(1, math.ceil(len(ranked) / self.factor))]
+            for c in list(fold_models):
+                if c not in survivors:
+                    del fold_models[c]
+
+        if exhausted:
+            self._log(f"  Budget exhausted after {elapsed():.1f}s / {trees_fitted} trees")
+        if not results:
+            raise RuntimeError("Search budget too small to evaluate a single configuration")
+
+        self._build_results(results, candidates, best_rung)
+        best = candidates[self.best_candidate_]
+        best_trees = results[(best_rung, self.best_candidate_)]['n_estimators']
+        self.best_estimator_ = clone(self.estimator).set_params(**best, n_estimators=best_trees).fit(X, y)
+        self.elapsed_seconds_ = round(elapsed(), 3)
+        self.trees_fitted_ = trees_fitted
+        return self
+
+    def _build_results(self, results, candidates, best_rung):
+        rows = sorted(results.values(), key=lambda r: (r['rung'], r['candidate']))
+        self.cv_results_ = {
+            "params": [{**r['params'], 'n_estimators': r['n_estimators']} for r in rows],
+            "rung": np.array([r['rung'] for r in rows]),
+            "n_estimators": np.array([r['n_estimators'] for r in rows]),
+            "mean_test_score": np.array([np.mean(r['fold_scores']) for r in rows]),
+            "std_test_score": np.array([np.std(r['fold_scores']) for r in rows]),
+            "mean_fit_time": np.array([r['fit_seconds'] / self.cv for r in rows]),
+            **{f"split{i}_test_score": np.array([r['fold_scores'][i] for r in rows]) for i in range(self.cv)}
+        }
+        final = [i for i, r in enumerate(rows) if r['rung'] == best_rung]
+        self.best_index_ = max(final, key=lambda i: (self.cv_results_['mean_test_score'][i], -i))
+        self.best_candidate_ = rows[self.best_index_]['candidate']
+        self.best_params_ = self.cv_results_['params'][self.best_index_]
+        self.best_score_ = float(self.cv_results_['mean_test_score'][self.best_index_])
+        self.n_splits_ = self.cv
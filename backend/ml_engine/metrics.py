@@ -0,0 +1,202 @@
+"""
+Prometheus Metrics
+==================
+Minimal counters, gauges and histograms rendered in the Prometheus text format
+(no client library needed).
+
+Recording is lock-free on the hot path: each thread writes to its own shard,
+and shards are only merged when /metrics is scraped. A lock is taken once per
+thread, when its shard is created. Shards of finished threads (the Flask dev
+server starts one per request) are folded into a shared base then and on each
+scrape, so storage stays bounded by the number of live threads.
+
+Each process keeps its own values. Under the pre-fork server every worker
+reports for itself, and ml_worker_info identifies which one answered a scrape.
+"""
+import time
+import bisect
+import threading
+
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class _Metric:
+    type = 'untyped'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        REGISTRY.append(self)
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+
+    def _samples(self, values):
+        return [f'{self.name}{_labels(self.label_names, key)} {value}' for key, value in sorted(values.items())]
+
+class _Sharded(_Metric):
+    """Per-thread storage of {label values: state}, merged on read."""
+
+    def __init__(self, name, help_text, label_names=()):
+        super().__init__(name, help_text, label_names)
+        self._local = threading.local()
+        self._shards = []  # (thread, shard) of threads that may still record
+        self._base = {}    # merged shards of finished threads
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._fold_finished()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_finished(self):
+        # Called with _lock held. A finished thread never writes its shard again.
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for key, state in shard.items():
+                    self._base[key] = self._merge(self._base.get(key), state)
+        self._shards = live
+
+    def _snapshot(self):
+        with self._lock:
+            self._fold_finished()
+            return [dict(self._base)] + [dict(shard) for _, shard in self._shards]
+
+class Counter(_Sharded):
+    type = 'counter'
+
+    @staticmethod
+    def _merge(total, value):
+        return value if total is None else total + value
+
+    def inc(self, *label_values, amount=1):
+        shard = self._shard()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def render(self):
+        totals = {}
+        for shard in self._snapshot():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return self._header() + self._samples(totals)
+
+class Gauge(_Metric):
+    """Last-write-wins value per label set."""
+    type = 'gauge'
+
+    def __init__(self, name, help_text, label_names=()):
+        super().__init__(name, help_text, label_names)
+        self._values = {}
+
+    def set(self, value, *label_values):
+        self._values[label_values] = value
+
+    def get(self, *label_values):
+        return self._values.get(label_values)
+
+    def clear(self):
+        self._values = {}
+
+    def render(self):
+        return self._header() + self._samples(dict(self._values))
+
+class Callback(_Metric):
+    """Values read at scrape time from fn() -> {label values tuple: value} (or a single number)."""
+
+    def __init__(self, name, help_text, metric_type, fn, label_names=()):
+        super().__init__(name, help_text, label_names)
+        self.type = metric_type
+        self.fn = fn
+
+    def render(self):
+        values = self.fn()
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return self._header() + self._samples(values)
+
+class Histogram(_Sharded):
+    type = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+
+    @staticmethod
+    def _merge(total, state):
+        # A new list: snapshots share the base's lists without copying them
+        return list(state) if total is None else [a + b for a, b in zip(total, state)]
+
+    def observe(self, value, *label_values):
+        shard = self._shard()
+        state = shard.get(label_values)
+        if state is None:
+            # [per-bucket counts..., +Inf count, sum]
+            state = shard[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def timer(self, *label_values):
+        """StageTimer that records into this histogram, with label_values before the stage name."""
+        return StageTimer(self, label_values)
+
+    def render(self):
+        merged = {}
+        for shard in self._snapshot():
+            for key, state in shard.items():
+                total = merged.setdefault(key, [0] * len(state))
+                for i, value in enumerate(state):
+                    total[i] += value
+        lines = self._header()
+        for key, state in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), state[:-1]):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, key, [le])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {state[-1]}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, key)} {cumulative}')
+        return lines
+
+class StageTimer:
+    """Records the time between successive mark() calls, one histogram observation per stage."""
+    __slots__ = ('histogram', 'label_values', 'last')
+
+    def __init__(self, histogram, label_values=()):
+        self.histogram = histogram
+        self.label_values = label_values
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.histogram.observe(now - self.last, *self.label_values, stage)
+        self.last = now
+
+    def skip(self):
+        """Restart the clock without recording (time measured elsewhere)."""
+        self.last = time.perf_counter()
+
+REGISTRY = []
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
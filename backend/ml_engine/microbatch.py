@@ -0,0 +1,146 @@
+"""
+Adaptive Micro-Batching
+=======================
+Coalesces concurrent single-row /predict calls into one vectorized scoring
+call. Request threads enqueue a row and block, and one scheduler thread drains
+the queue into batches and fans the results back out.
+
+A batch is dispatched when it reaches max_batch rows or when window_ms has
+passed since its oldest row arrived. The window is adaptive: it is only waited
+out while traffic is actually concurrent (recent batches held more than one
+row). A lone request at low load is scored immediately instead of paying the
+window as pure latency. Requests that arrive while a batch is being scored
+queue up and form the next batch either way.
+
+Rows carry an optional context (the app passes the model bundle the request
+pinned), and a batch only holds rows with the same context, so a model reload
+never scores a request against a version it did not start on.
+"""
+import os
+import time
+import bisect
+import threading
+from collections import deque
+import numpy as np
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+WAIT_MS_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50)
+
+class _Pending:
+    __slots__ = ('row', 'context', 'enqueued', 'done', 'result', 'error')
+
+    def __init__(self, row, context):
+        self.row = row
+        self.context = context
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class MicroBatcher:
+    """Batches concurrent submit() calls into calls to score_fn(matrix, context) -> (n_rows, ...) array."""
+
+    def __init__(self, score_fn, window_ms=2.0, max_batch=64):
+        self.score_fn = score_fn
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._owner_pid = None
+        self._concurrency = 1.0  # EWMA of batch size
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.max_queue_depth = 0
+        self.batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self.wait_ms_counts = [0] * (len(WAIT_MS_BUCKETS) + 1)
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def _ensure_started(self):
+        # Started lazily, and once per process: a thread started in a pre-fork
+        # master does not exist in the forked workers
+        if self._owner_pid == os.getpid():
+            return
+        with self._cond:
+            if self._owner_pid != os.getpid():
+                self._queue.clear()
+                self._owner_pid = os.getpid()
+                threading.Thread(target=self._run, name='micro-batcher', daemon=True).start()
+
+    def submit(self, row, context=None):
+        """Score one feature row; blocks until its batch has been scored."""
+        self._ensure_started()
+        pending = _Pending(row, context)
+        with self._cond:
+            self._queue.append(pending)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            self._cond.notify()
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            if self._concurrency > 1.5:
+                deadline = self._queue[0].enqueued + self.window
+                while len(self._queue) < self.max_batch:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0: break
+                    self._cond.wait(remaining)
+            # Rows queued behind a different context wait for the next batch
+            context = self._queue[0].context
+            batch = []
+            while self._queue and len(batch) < self.max_batch and self._queue[0].context is context:
+                batch.append(self._queue.popleft())
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            try:
+                results = self.score_fn(np.vstack([p.row for p in batch]), batch[0].context)
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception:
+                # Isolate the failing row(s) instead of failing every caller in the batch
+                for pending in batch:
+                    try: pending.result = self.score_fn(np.atleast_2d(pending.row), pending.context)[0]
+                    except Exception as e: pending.error = e
+            self._record(batch, started)
+            for pending in batch:
+                pending.done.set()
+
+    def _record(self, batch, started):
+        self._concurrency = 0.8 * self._concurrency + 0.2 * len(batch)
+        with self._stats_lock:
+            self.batches += 1
+            self.rows += len(batch)
+            self.batch_size_counts[bisect.bisect_left(BATCH_SIZE_BUCKETS, len(batch))] += 1
+            for pending in batch:
+                wait_ms = (started - pending.enqueued) * 1000
+                self.wait_ms_counts[bisect.bisect_left(WAIT_MS_BUCKETS, wait_ms)] += 1
+                self.wait_ms_total += wait_ms
+                self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+    def stats(self):
+        with self._stats_lock:
+            labels = [f"<={b}" for b in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+            wait_labels = [f"<={b}ms" for b in WAIT_MS_BUCKETS] + [f">{WAIT_MS_BUCKETS[-1]}ms"]
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self.max_queue_depth,
+                "batches": self.batches,
+                "rows": self.rows,
+                "mean_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+                "batch_size_distribution": dict(zip(labels, self.batch_size_counts)),
+                "wait_ms_distribution": dict(zip(wait_labels, self.wait_ms_counts)),
+                "mean_wait_ms": round(self.wait_ms_total / self.rows, 3) if self.rows else 0.0,
+                "max_wait_ms": round(self.wait_ms_max, 3)
+            }
@@ -0,0 +1,150 @@
+"""
+Request Profiling
+=================
+Tools for explaining single slow requests, which aggregate latency histograms
+can't do:
+
+  StackSampler   one background thread that periodically snapshots the Python
+                 stack of every thread currently serving a request
+                 (sys._current_frames), counting folded stacks per request
+  GCTimer        time spent in garbage collection (gc.callbacks), process-wide
+  ProfileStore   a bounded ring buffer of captured profiles
+
+A request can also run under cProfile (deterministic, all calls, but several
+times slower); the sampler costs a dictionary insert per request plus one
+stack walk per interval per in-flight request, so it can stay on to catch
+requests that turn out to be slow.
+
+Folded stacks are "outer;...;inner count" lines, the input of flamegraph.pl
+and speedscope. Everything here is per process: under the pre-fork server
+each worker samples and stores its own requests.
+"""
+import io
+import os
+import gc
+import sys
+import time
+import uuid
+import pstats
+import marshal
+import threading
+from collections import Counter, deque
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def folded(stacks):
+    """Counter of stack tuples (outermost first) as folded-stack text, most frequent first."""
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+class StackSampler:
+    """Samples the stacks of registered threads every interval_ms, into one Counter per thread."""
+
+    def __init__(self, interval_ms=5.0):
+        self.interval = interval_ms / 1000
+        self._threads = {}  # thread id -> Counter of stack tuples
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._owner_pid = None
+        self.samples = 0
+
+    def _ensure_started(self):
+        # Started lazily, and once per process: a thread started in a pre-fork
+        # master does not exist in the forked workers
+        if self._owner_pid == os.getpid():
+            return
+        with self._lock:
+            if self._owner_pid != os.getpid():
+                self._threads.clear()
+                self._owner_pid = os.getpid()
+                threading.Thread(target=self._run, name='stack-sampler', daemon=True).start()
+
+    def register(self):
+        """Start sampling the calling thread."""
+        self._ensure_started()
+        with self._lock:
+            self._threads[threading.get_ident()] = Counter()
+            self._active.set()
+
+    def unregister(self):
+        """Stop sampling the calling thread. Returns its Counter of stack tuples."""
+        with self._lock:
+            stacks = self._threads.pop(threading.get_ident(), None)
+            if not self._threads:
+                self._active.clear()
+        return stacks if stacks is not None else Counter()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            self._active.wait()  # idle while no request is in flight
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._threads.items():
+                    frame = frames.get(thread_id)
+                    if frame is None or thread_id == own_id:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame_name(frame))
+                        frame = frame.f_back
+                    stacks[tuple(reversed(stack))] += 1
+                    self.samples += 1
+            del frames
+
+class GCTimer:
+    """Running totals of garbage collections and the seconds spent in them."""
+
+    def __init__(self):
+        self.collections = 0
+        self.seconds = 0.0
+        self._started = None
+        gc.callbacks.append(self._callback)
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self._started = time.perf_counter()
+        elif self._started is not None:
+            self.collections += 1
+            self.seconds += time.perf_counter() - self._started
+            self._started = None
+
+    def snapshot(self):
+        return self.collections, self.seconds
+
+def cprofile_stats(profile, limit=40):
+    """(pstats text report of the top `limit` functions by cumulative time, marshalled stats)."""
+    out = io.StringIO()
+    stats = pstats.Stats(profile, stream=out)
+    stats.sort_stats('cumulative').print_stats(limit)
+    # Same bytes as Stats.dump_stats(), so the download opens in pstats / snakeviz
+    return out.getvalue(), marshal.dumps(stats.stats)
+
+class ProfileStore:
+    """The last `capacity` captured profiles, oldest dropped first."""
+
+    def __init__(self, capacity=50):
+        self._records = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.captured = 0
+
+    def add(self, record):
+        """Store a record dict; assigns and returns its id."""
+        record['id'] = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._records.append(record)
+            self.captured += 1
+        return record['id']
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((r for r in self._records if r['id'] == profile_id), None)
+
+    def summaries(self):
+        """Newest first, without the payloads and profiles."""
+        with self._lock:
+            records = list(self._records)
+        return [{key: value for key, value in r.items() if key not in ('payload', 'stacks', 'pstats', 'pstats_text')}
+                for r in reversed(records)]
@@ -1,30 +1,249 @@
+"""
+Artifact Split / Rejoin
+=======================
+Large model files are committed as fixed-size parts next to a manifest, and
+rejoined at deploy time:
+
+  crop_model.pkl.part0 ... crop_model.pkl.partN
+  crop_model.pkl.parts.json   file size + sha256, part size, and size + sha256 of every part
+
+Unpacking verifies every part against the manifest in parallel, then streams
+the parts in fixed-size buffers into a temp file next to the target while
+hashing it, checks the whole-file checksum and renames it into place
+atomically. Parts are only deleted after that succeeds; on any mismatch they
+are kept, no target is written and the exit status is 1. Memory use is a few
+buffers per worker regardless of the file size.
+
+Parts without a manifest (the old layout) are still rejoined, streamed and
+atomically, but cannot be verified.
+
+Usage:
+  python rejoin.py pack crop_model.pkl ensemble_model.pkl [--part-size 90M]
+  python rejoin.py [unpack] [--dir .] [--jobs N] [--keep-parts]
+  python rejoin.py verify [--dir .] [--jobs N]      # check the parts without joining
+"""
 import os
+import re
+import sys
 import glob
+import json
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+FORMAT = 'krishisense-parts'
+FORMAT_VERSION = 1
+MANIFEST_SUFFIX = '.parts.json'
+BUFFER_SIZE = 1 << 20
+DEFAULT_PART_SIZE = '90M'  # below GitHub's 100 MB file limit
+
+class IntegrityError(Exception):
+    """Raised when a part or a rejoined file doesn't match its manifest."""
+
+def parse_size(spec):
+    """'90M', '1G', '512k' or a plain byte count -> bytes."""
+    match = re.fullmatch(r'\s*(\d+)\s*([kKmMgG]?)[bB]?\s*', str(spec))
+    if not match or int(match.group(1)) == 0:
+        raise argparse.ArgumentTypeError(f"Invalid size: {spec}")
+    return int(match.group(1)) * 1024 ** ' KMG'.index(match.group(2).upper() or ' ')
+
+def part_path(path, index):
+    return f"{path}.part{index}"
+
+def _copy(src, dst, length, *digests):
+    """Copy up to length bytes from src to dst (None to only hash) in BUFFER_SIZE blocks. Returns the bytes copied."""
+    copied = 0
+    while length is None or copied < length:
+        block = src.read(BUFFER_SIZE if length is None else min(BUFFER_SIZE, length - copied))
+        if not block:
+            break
+        if dst is not None:
+            dst.write(block)
+        for digest in digests:
+            digest.update(block)
+        copied += len(block)
+    return copied
+
+def _write_atomic(path, write):
+    """Run write(file) on a temp file next to path, fsync it and rename it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=f'.{os.path.basename(path)}.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            result = write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return result
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+# --- Pack ---
+
+def pack(path, part_size):
+    """Split path into parts of part_size bytes and write its manifest. Returns the manifest."""
+    total = os.path.getsize(path)
+    whole = hashlib.sha256()
+    parts = []
+    with open(path, 'rb') as src:
+        # An empty file still gets one (empty) part
+        while not parts or sum(p['size'] for p in parts) < total:
+            digest = hashlib.sha256()
+            name = part_path(path, len(parts))
+            size = _write_atomic(name, lambda dst: _copy(src, dst, part_size, digest, whole))
+            parts.append({"file": os.path.basename(name), "size": size, "sha256": digest.hexdigest()})
+            if size == 0:
+                break
+
+    manifest = {
+        "format": FORMAT,
+        "format_version": FORMAT_VERSION,
+        "file": os.path.basename(path),
+        "size": total,
+        "sha256": whole.hexdigest(),
+        "part_size": part_size,
+        "parts": parts
+    }
+    _write_atomic(path + MANIFEST_SUFFIX, lambda f: f.write(json.dumps(manifest, indent=2).encode()))
+    # Parts left over from a longer previous split (the .parts.json manifest doesn't match this glob)
+    current = {p['file'] for p in parts}
+    for stale in glob.glob(glob.escape(path) + '.part[0-9]*'):
+        if os.path.basename(stale) not in current:
+            os.remove(stale)
+    return manifest
+
+# --- Unpack ---
+
+def load_manifest(manifest_path):
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT or manifest.get('format_version') != FORMAT_VERSION:
+        raise IntegrityError(f"{manifest_path}: unsupported manifest format")
+    return manifest
+
+def verify_part(directory, part):
+    """Raise IntegrityError unless the part on disk has the manifest's size and checksum."""
+    path = os.path.join(directory, part['file'])
+    if not os.path.exists(path):
+        raise IntegrityError(f"{part['file']}: missing")
+    size = os.path.getsize(path)
+    if size != part['size']:
+        raise IntegrityError(f"{part['file']}: {size} bytes, expected {part['size']} (truncated download?)")
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        _copy(f, None, None, digest)
+    if digest.hexdigest() != part['sha256']:
+        raise IntegrityError(f"{part['file']}: checksum mismatch")
+
+def verify_parts(directory, manifest, executor):
+    """Check every part of a manifest in parallel. Returns the list of errors (empty if all match)."""
+    def check(part):
+        try:
+            verify_part(directory, part)
+        except IntegrityError as e:
+            return str(e)
+    return [error for error in executor.map(check, manifest['parts']) if error]
+
+def join_parts(directory, file_name, part_files, expected=None):
+    """Stream the parts into a temp file and rename it to file_name. expected: (size, sha256) to check first."""
+    target = os.path.join(directory, file_name)
+    whole = hashlib.sha256()
+
+    def write(dst):
+        size = 0
+        for name in part_files:
+            with open(os.path.join(directory, name), 'rb') as src:
+                size += _copy(src, dst, None, whole)
+        if expected and (size, whole.hexdigest()) != expected:
+            raise IntegrityError(f"{file_name}: rejoined file does not match the manifest checksum")
+        return size
+
+    return _write_atomic(target, write)
+
+def unpack(manifest_path, executor, keep_parts=False):
+    """Verify, rejoin and (unless keep_parts) clean up one manifest's parts. Returns the rejoined path."""
+    directory = os.path.dirname(os.path.abspath(manifest_path))
+    manifest = load_manifest(manifest_path)
+    errors = verify_parts(directory, manifest, executor)
+    if errors:
+        raise IntegrityError("; ".join(errors))
+
+    part_files = [part['file'] for part in manifest['parts']]
+    join_parts(directory, manifest['file'], part_files, (manifest['size'], manifest['sha256']))
+    if not keep_parts:
+        for name in part_files:
+            os.remove(os.path.join(directory, name))
+        os.remove(manifest_path)
+    return os.path.join(directory, manifest['file'])
+
+def legacy_part_files(directory, file_name):
+    """Consecutive <file>.part0, .part1, ... names present on disk."""
+    names = []
+    while os.path.exists(os.path.join(directory, part_path(file_name, len(names)))):
+        names.append(part_path(file_name, len(names)))
+    return names
+
+def find_packed(directory):
+    """(manifests, legacy part0 files without a manifest) in a directory."""
+    manifests = sorted(glob.glob(os.path.join(glob.escape(directory), '*' + MANIFEST_SUFFIX)))
+    packed = {m[:-len(MANIFEST_SUFFIX)] for m in manifests}
+    legacy = sorted(p for p in glob.glob(os.path.join(glob.escape(directory), '*.part0')) if p[:-len('.part0')] not in packed)
+    return manifests, legacy
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Split model artifacts into verified parts, or rejoin them")
+    parser.add_argument('command', nargs='?', default='unpack', choices=['pack', 'unpack', 'verify'])
+    parser.add_argument('files', nargs='*', help="files to pack")
+    parser.add_argument('--part-size', type=parse_size, default=parse_size(DEFAULT_PART_SIZE))
+    parser.add_argument('--dir', default='.', help="where to look for parts (default: current directory)")
+    parser.add_argument('--jobs', type=int, default=min(8, os.cpu_count() or 1), help="parts verified in parallel")
+    parser.add_argument('--keep-parts', action='store_true', help="keep parts and manifest after rejoining")
+    args = parser.parse_args(argv)
+
+    if args.command == 'pack':
+        if not args.files:
+            parser.error("pack needs at least one file")
+        for path in args.files:
+            manifest = pack(path, args.part_size)
+            print(f"✓ Packed {path}: {manifest['size']:,} bytes in {len(manifest['parts'])} parts")
+        return 0
+
+    manifests, legacy = find_packed(args.dir)
+    if not manifests and not legacy:
+        print(f"No parts found in {args.dir}")
+        return 0
+
+    failed = False
+    # hashlib releases the GIL on large buffers, so threads verify parts concurrently
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        for manifest_path in manifests:
+            name = os.path.basename(manifest_path)[:-len(MANIFEST_SUFFIX)]
+            try:
+                if args.command == 'verify':
+                    errors = verify_parts(args.dir, load_manifest(manifest_path), executor)
+                    if errors: raise IntegrityError("; ".join(errors))
+                    print(f"✓ {name}: all parts verified")
+                else:
+                    unpack(manifest_path, executor, args.keep_parts)
+                    print(f"✓ Rejoined and verified {name}")
+            except (IntegrityError, OSError, ValueError) as e:
+                print(f"❌ {name}: {e} (parts kept)")
+                failed = True
+
+    for first_part in legacy:
+        file_name = os.path.basename(first_part)[:-len('.part0')]
+        part_files = legacy_part_files(args.dir, file_name)
+        if args.command == 'verify':
+            print(f"⚠️  {file_name}: {len(part_files)} parts without a manifest, cannot verify")
+            continue
+        size = join_parts(args.dir, file_name, part_files)
+        if not args.keep_parts:
+            for name in part_files:
+                os.remove(os.path.join(args.dir, name))
+        print(f"⚠️  Rejoined {file_name} ({size:,} bytes) without a manifest: not verified")
 
-def rejoin_files():
-    # Find all .part0 files
-    part_files = glob.glob("*.part0")
-    
-    for first_part in part_files:
-        base_name = first_part.replace(".part0", "")
-        print(f"Rejoining {base_name}...")
-        
-        with open(base_name, 'wb') as outfile:
-            part_num = 0
-            while True:
-                part_name = f"{base_name}.part{part_num}"
-                if not os.path.exists(part_name):
-                    break
-                    
-                print(f"  Adding {part_name}")
-                with open(part_name, 'rb') as infile:
-                    outfile.write(infile.read())
-                
-                # Cleanup part file
-                os.remove(part_name)
-                part_num += 1
-        
-        print(f"Completed {base_name}")
+    return 1 if failed else 0
 
 if __name__ == "__main__":
-    rejoin_files()
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Regional Crop Suitability Maps
+==============================
+Scores every crop for every cell of a district grid in one batch job, instead
+of one /predict call per cell.
+
+Input: a directory of same-shape 2-D .npy rasters, memory-mapped (never loaded whole):
+  N.npy P.npy K.npy temperature.npy humidity.npy ph.npy rainfall.npy   model features
+  soil_type.npy     integer codes into soil_types.json (a list of soil names), < 0 = no data
+  altitude.npy      optional, metres
+NaN in any feature raster marks a no-data cell. A raster the survey doesn't
+have can be replaced by a constant: --set humidity=70, --set soil_type=Loam.
+
+Score per (cell, crop), 0-100: the crop model's probability times the share
+of crop_data.json range checks the cell passes: N, P, K, temperature, pH,
+rainfall, altitude (when there is an altitude raster), and the soil being one
+of the crop's soil_types. Crops without a crop_data.json entry are scored on
+the probability alone.
+
+Output directory:
+  top_crops.npy     uint8   (k, rows, cols)  index into classes.json, best first; 255 = no data
+  top_scores.npy    float32 (k, rows, cols)  scores of those crops; NaN = no data
+  classes.json      crop names, in model class order
+  meta.json         grid shape, k, tile size, model version and timings; written last
+
+The grid is split into tiles that a process pool scores in parallel. Every
+worker maps the inputs, the model (the memory-mapped artifact store, shared
+by all workers) and the outputs itself, and writes its tiles' layers straight
+into the output files, so only tile coordinates cross processes. A tile is
+scored SCORE_ROWS cells at a time, so a worker's own memory depends on the
+tile and batch sizes, not on the grid; the mapped rasters and layers are page
+cache the kernel can evict. Throughput is bound by the forest itself (about
+20-30k cells/s per core for the 100-tree model), so it scales with --jobs.
+
+Usage:
+  python suitability.py rasters/ maps/ [--top-k 3] [--tile 512] [--jobs N] [--set humidity=70]
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from artifacts import current_version, load_artifacts
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(BASE_PATH, 'crop_data.json')
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+# (raster, crop_data.json lower bound, upper bound)
+RANGE_CHECKS = [
+    ('N', 'min_n', 'max_n'), ('P', 'min_p', 'max_p'), ('K', 'min_k', 'max_k'),
+    ('temperature', 'min_temp', 'max_temp'), ('ph', 'min_ph', 'max_ph'),
+    ('rainfall', 'min_rainfall', 'max_rainfall'), ('altitude', 'min_altitude', 'max_altitude'),
+]
+SCORE_ROWS = 4096  # cells per predict_proba call; the forest's (trees x rows) node arrays stay ~10 MB
+NO_DATA = 255
+
+def load_model():
+    """(predict_proba over raw feature rows, classes, soil_types, version): the active artifact version, else the pickles."""
+    if current_version():
+        artifacts = load_artifacts()
+        forest = artifacts['forest']
+        return forest.predict_proba, [str(c) for c in forest.classes_], list(artifacts['soil_types']), artifacts['version']
+    with open(os.path.join(BASE_PATH, 'crop_model.pkl'), 'rb') as f: model = pickle.load(f)
+    with open(os.path.join(BASE_PATH, 'scaler.pkl'), 'rb') as f: scaler = pickle.load(f)
+    with open(os.path.join(BASE_PATH, 'soil_encoder.pkl'), 'rb') as f: soil_types = list(pickle.load(f).classes_)
+    mean, scale = np.asarray(scaler.mean_), np.asarray(scaler.scale_)
+    return lambda X: model.predict_proba((X - mean) / scale), [str(c) for c in model.classes_], soil_types, 'pickles'
+
+def compile_checks(classes, legend, crop_db, has_altitude):
+    """Per-crop bounds as {raster: (low, high)} arrays over classes, the (legend code, class) soil match table and has_info."""
+    crop_info_map = {crop['label'].lower(): crop for crop in crop_db}
+    infos = [crop_info_map.get(c.lower()) for c in classes]
+    bounds = {}
+    for raster, low_key, high_key in RANGE_CHECKS:
+        if raster == 'altitude' and not has_altitude:
+            continue
+        bounds[raster] = (np.array([info.get(low_key, -np.inf) if info else -np.inf for info in infos]),
+                          np.array([info.get(high_key, np.inf) if info else np.inf for info in infos]))
+    soil_match = np.array([[bool(info) and soil.lower() in {s.lower() for s in info.get('soil_types', [])}
+                            for info in infos] for soil in legend], dtype=bool).reshape(len(legend), len(classes))
+    return bounds, soil_match, np.array([info is not None for info in infos])
+
+# --- Worker ---
+# One set of these per pool process, opened by init_worker()
+
+_worker = {}
+
+def open_layers(input_dir, constants):
+    """{raster: memory-mapped 2-D array or a constant} for the features, soil_type and altitude."""
+    layers = dict(constants)
+    for name in FEATURES + ['soil_type', 'altitude']:
+        path = os.path.join(input_dir, f'{name}.npy')
+        if name not in layers and os.path.exists(path):
+            layers[name] = np.load(path, mmap_mode='r')
+    return layers
+
+def init_worker(input_dir, output_dir, constants, legend):
+    predict_proba, classes, soil_types, _ = load_model()
+    with open(DATA_PATH) as f:
+        crop_db = json.load(f)
+    layers = open_layers(input_dir, constants)
+    soil_codes = {str(s): code for code, s in enumerate(soil_types)}
+    bounds, soil_match, has_info = compile_checks(classes, legend, crop_db, 'altitude' in layers)
+    _worker.update(
+        predict_proba=predict_proba, layers=layers, bounds=bounds, soil_match=soil_match, has_info=has_info,
+        # Legend code -> the model's soil code (0 for unknown soils, as app.py does)
+        model_soil=np.array([soil_codes.get(s, 0) for s in legend], dtype=np.float64),
+        top_crops=np.lib.format.open_memmap(os.path.join(output_dir, 'top_crops.npy'), mode='r+'),
+        top_scores=np.lib.format.open_memmap(os.path.join(output_dir, 'top_scores.npy'), mode='r+')
+    )
+
+def read_tile(name, rows, cols):
+    """A raster's cells in a tile as a flat float64 array (constants are broadcast)."""
+    layer = _worker['layers'][name]
+    shape = (rows.stop - rows.start, cols.stop - cols.start)
+    if np.isscalar(layer):
+        return np.full(shape[0] * shape[1], layer, dtype=np.float64)
+    return np.asarray(layer[rows, cols], dtype=np.float64).reshape(-1)
+
+def score_cells(features, soil, altitude):
+    """(n_cells, n_classes) suitability scores for valid cells."""
+    w = _worker
+    probabilities = w['predict_proba'](np.column_stack([features, w['model_soil'][soil]]))
+    passed = w['soil_match'][soil].astype(np.float64)
+    values = dict(zip(FEATURES, features.T), altitude=altitude)
+    for raster, (low, high) in w['bounds'].items():
+        value = values[raster][:, None]
+        passed += (low <= value) & (value <= high)
+    checks = len(w['bounds']) + 1
+    return 100 * probabilities * np.where(w['has_info'], passed / checks, 1)
+
+def score_tile(tile):
+    """Score one (row_start, row_stop, col_start, col_stop) tile into the output layers. Returns (cells, no-data cells)."""
+    w = _worker
+    rows, cols = slice(tile[0], tile[1]), slice(tile[2], tile[3])
+    k = w['top_crops'].shape[0]
+    features = np.column_stack([read_tile(name, rows, cols) for name in FEATURES])
+    soil_raw = read_tile('soil_type', rows, cols)
+    altitude = read_tile('altitude', rows, cols) if 'altitude' in w['layers'] else None
+    valid = np.isfinite(features).all(axis=1) & (soil_raw >= 0) & (soil_raw < len(w['model_soil']))
+    if altitude is not None:
+        valid &= np.isfinite(altitude)
+
+    top_crops = np.full((k, len(valid)), NO_DATA, dtype=np.uint8)
+    top_scores = np.full((k, len(valid)), np.nan, dtype=np.float32)
+    cells = np.flatnonzero(valid)
+    for start in range(0, len(cells), SCORE_ROWS):
+        batch = cells[start:start + SCORE_ROWS]
+        scores = score_cells(features[batch], soil_raw[batch].astype(np.int64),
+                             altitude[batch] if altitude is not None else None)
+        # Best k per cell; a stable sort keeps ties (often many zero scores) in class order
+        best = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        top_crops[:, batch] = best.T
+        top_scores[:, batch] = np.take_along_axis(scores, best, axis=1).T
+
+    shape = (k, rows.stop - rows.start, cols.stop - cols.start)
+    w['top_crops'][:, rows, cols] = top_crops.reshape(shape)
+    w['top_scores'][:, rows, cols] = top_scores.reshape(shape)
+    return len(valid), len(valid) - len(cells)
+
+# --- Job ---
+
+def tiles(shape, tile):
+    for r in range(0, shape[0], tile):
+        for c in range(0, shape[1], tile):
+            yield r, min(r + tile, shape[0]), c, min(c + tile, shape[1])
+
+def parse_constants(specs, legend):
+    """--set name=value pairs -> {raster: value}; a soil_type constant is a soil name, added to the legend."""
+    constants = {}
+    for spec in specs:
+        name, _, value = spec.partition('=')
+        if name == 'soil_type':
+            if value not in legend:
+                legend.append(value)
+            constants[name] = legend.index(value)
+        elif name in FEATURES + ['altitude']:
+            constants[name] = float(value)
+        else:
+            raise ValueError(f"Unknown raster for --set: {name}")
+    return constants
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score every crop over a raster grid and write top-k suitability layers")
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--tile', type=int, default=512, help="tile edge in cells (default 512)")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--set', action='append', default=[], metavar='RASTER=VALUE', help="constant for a missing raster")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    legend_path = os.path.join(args.input_dir, 'soil_types.json')
+    legend = []
+    if os.path.exists(legend_path):
+        with open(legend_path) as f:
+            legend = json.load(f)
+    constants = parse_constants(args.set, legend)
+    if not legend:
+        parser.error(f"soil_type needs a legend: {legend_path} (a JSON list of soil names) or --set soil_type=<name>")
+    layers = open_layers(args.input_dir, constants)
+    missing = [name for name in FEATURES + ['soil_type'] if name not in layers]
+    if missing:
+        parser.error(f"missing rasters (add them or --set a constant): {', '.join(missing)}")
+    shapes = {name: layer.shape for name, layer in layers.items() if not np.isscalar(layer)}
+    if not shapes or len(set(shapes.values())) != 1 or len(next(iter(shapes.values()))) != 2:
+        parser.error(f"rasters must be 2-D and the same shape: {shapes}")
+    shape = next(iter(shapes.values()))
+
+    _, classes, _, version = load_model()
+    if len(classes) >= NO_DATA:
+        parser.error(f"{len(classes)} classes do not fit the uint8 crop layer")
+    k = max(1, min(args.top_k, len(classes)))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if os.path.exists(os.path.join(args.output_dir, 'meta.json')):
+        os.remove(os.path.join(args.output_dir, 'meta.json'))
+    np.lib.format.open_memmap(os.path.join(args.output_dir, 'top_crops.npy'), mode='w+', dtype=np.uint8, shape=(k, *shape)).flush()
+    np.lib.format.open_memmap(os.path.join(args.output_dir, 'top_scores.npy'), mode='w+', dtype=np.float32, shape=(k, *shape)).flush()
+    with open(os.path.join(args.output_dir, 'classes.json'), 'w') as f:
+        json.dump(classes, f)
+
+    all_tiles = list(tiles(shape, args.tile))
+    print(f"🗺️  Scoring {shape[0]:,} x {shape[1]:,} cells ({len(all_tiles)} tiles of {args.tile}) "
+          f"for {len(classes)} crops on {args.jobs} processes (model {version})")
+    cells = no_data = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs), initializer=init_worker,
+                             initargs=(args.input_dir, args.output_dir, constants, legend)) as pool:
+        for done, (tile_cells, tile_no_data) in enumerate(pool.map(score_tile, all_tiles), 1):
+            cells += tile_cells
+            no_data += tile_no_data
+            if done % max(1, len(all_tiles) // 10) == 0 or done == len(all_tiles):
+                print(f"  {done}/{len(all_tiles)} tiles, {cells:,} cells ({time.perf_counter() - started:.1f}s)")
+
+    seconds = time.perf_counter() - started
+    meta = {
+        "shape": list(shape), "top_k": k, "tile": args.tile, "model_version": version,
+        "classes": "classes.json", "no_data_crop": NO_DATA, "cells": cells, "no_data_cells": no_data,
+        "constants": {name: legend[value] if name == 'soil_type' else value for name, value in constants.items()},
+        "soil_legend": legend, "altitude_checked": 'altitude' in layers,
+        "seconds": round(seconds, 3), "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    }
+    with open(os.path.join(args.output_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    print(f"✓ {cells:,} cells ({no_data:,} no data) in {seconds:.1f}s, {cells / max(seconds, 1e-9):,.0f} cells/s → {args.output_dir}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
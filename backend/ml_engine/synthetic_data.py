@@ -0,0 +1,155 @@
+"""
+Synthetic Training Data
+=======================
+Vectorized generator for the synthetic crop dataset. All samples for a crop
+are drawn as column arrays in one call per feature (normal around the middle
+of the crop's range, clipped to the range; soil type uniform over the crop's
+soils), so millions of rows take seconds.
+
+Deterministic: every crop draws from its own generator seeded with
+(seed, crc32(crop name)). A crop's samples therefore don't depend on which
+other crops are in the parameter set or in what order they appear, which is
+what lets train_cache.py reuse them per crop. Bump GENERATOR_VERSION whenever
+the samples a crop's parameters produce change.
+
+Datasets can be written straight to disk in a columnar layout, one crop at a time:
+  <name>.parquet   if pyarrow is installed
+  <name>/          otherwise: a chunked, memory-mapped dataset (see datasets.py)
+
+Usage:
+  python synthetic_data.py data/crops_100k --samples-per-crop 100000 [--seed 42]
+"""
+import os
+import sys
+import time
+import zlib
+import argparse
+import numpy as np
+import pandas as pd
+from crop_parameters import crop_parameters as CROP_PARAMETERS
+from datasets import CHUNK_ROWS, Dataset, DatasetWriter
+
+# column -> (crop_parameters key, range / std ratio)
+FEATURE_SPECS = {
+    'N': ('N', 4),
+    'P': ('P', 4),
+    'K': ('K', 4),
+    'temperature': ('temp', 5),
+    'humidity': ('humidity', 5),
+    'ph': ('ph', 6),
+    'rainfall': ('rainfall', 5),
+}
+FEATURE_COLUMNS = list(FEATURE_SPECS)
+DEFAULT_SOIL_TYPES = ['Loam']
+GENERATOR_VERSION = 1
+
+def crop_rng(crop_name, seed):
+    return np.random.default_rng([seed, zlib.crc32(crop_name.encode())])
+
+def all_soil_types(parameters):
+    return sorted({soil for params in parameters.values() for soil in params.get('soil_types', DEFAULT_SOIL_TYPES)})
+
+def generate_crop_columns(crop_name, n_samples, param_ranges, seed=42):
+    """n_samples rows for one crop as {column: array}; soil_type is an array of strings."""
+    rng = crop_rng(crop_name, seed)
+    columns = {}
+    for column, (key, spread) in FEATURE_SPECS.items():
+        low, high = param_ranges[key]
+        values = rng.normal((low + high) / 2, (high - low) / spread, n_samples)
+        columns[column] = np.clip(values, low, high, out=values)
+    soil_types = np.asarray(param_ranges.get('soil_types', DEFAULT_SOIL_TYPES))
+    columns['soil_type'] = soil_types[rng.integers(0, len(soil_types), n_samples)]
+    return columns
+
+def generate_dataset(samples_per_crop, parameters=CROP_PARAMETERS, seed=42, crop_columns=generate_crop_columns):
+    """The full training set as a DataFrame (soil_type and label are categoricals).
+
+    crop_columns produces each crop's columns (generate_crop_columns, or a cache in front of it).
+    """
+    soil_types = all_soil_types(parameters)
+    soil_lookup = {soil: code for code, soil in enumerate(soil_types)}
+    chunks = {column: [] for column in FEATURE_COLUMNS}
+    soil_codes, label_codes = [], []
+    for label_code, (crop_name, params) in enumerate(parameters.items()):
+        columns = crop_columns(crop_name, samples_per_crop, params, seed)
+        for column in FEATURE_COLUMNS:
+            chunks[column].append(columns[column])
+        soil_codes.append(_encode(columns['soil_type'], soil_lookup))
+        label_codes.append(np.full(samples_per_crop, label_code, dtype=np.int16))
+
+    data = {column: np.concatenate(chunks[column]) for column in FEATURE_COLUMNS}
+    data['soil_type'] = pd.Categorical.from_codes(np.concatenate(soil_codes), soil_types)
+    data['label'] = pd.Categorical.from_codes(np.concatenate(label_codes), list(parameters))
+    return pd.DataFrame(data)
+
+def _encode(values, lookup):
+    categories, inverse = np.unique(values, return_inverse=True)
+    return np.array([lookup[c] for c in categories], dtype=np.int8)[inverse]
+
+# --- Columnar Files ---
+
+def write_dataset(path, samples_per_crop, parameters=CROP_PARAMETERS, seed=42, chunk_rows=CHUNK_ROWS):
+    """Generate the dataset crop by crop straight into a columnar file. Returns the row count."""
+    if path.endswith('.parquet'):
+        return _write_parquet(path, samples_per_crop, parameters, seed)
+    with DatasetWriter(path, chunk_rows, source=f'synthetic_data (seed {seed})') as writer:
+        for crop_name, params in parameters.items():
+            columns = generate_crop_columns(crop_name, samples_per_crop, params, seed)
+            writer.append(columns, columns['soil_type'], np.full(samples_per_crop, crop_name))
+    return samples_per_crop * len(parameters)
+
+def _write_parquet(path, samples_per_crop, parameters, seed):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Writing .parquet needs pyarrow (pip install pyarrow); omit the extension for the .npy layout")
+
+    soil_types = all_soil_types(parameters)
+    soil_lookup = {soil: code for code, soil in enumerate(soil_types)}
+    labels = list(parameters)
+    soil_dictionary, label_dictionary = pa.array(soil_types), pa.array(labels)
+    tmp_path = f"{path}.tmp"
+    writer = None
+    try:
+        for label_code, (crop_name, params) in enumerate(parameters.items()):
+            columns = generate_crop_columns(crop_name, samples_per_crop, params, seed)
+            arrays = {column: pa.array(columns[column]) for column in FEATURE_COLUMNS}
+            arrays['soil_type'] = pa.DictionaryArray.from_arrays(
+                pa.array(_encode(columns['soil_type'], soil_lookup)), soil_dictionary)
+            arrays['label'] = pa.DictionaryArray.from_arrays(
+                pa.array(np.full(samples_per_crop, label_code, dtype=np.int16)), label_dictionary)
+            table = pa.table(arrays)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)  # one row group per crop
+        if writer is not None:
+            writer.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if writer is not None: writer.close()
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+    return samples_per_crop * len(labels)
+
+def read_dataset(path):
+    """Load a dataset written by write_dataset() as a DataFrame (same columns as generate_dataset())."""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return Dataset(path).to_frame()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate the synthetic crop dataset as a columnar file")
+    parser.add_argument('path', help="output: <name>.parquet (needs pyarrow) or a chunked dataset directory")
+    parser.add_argument('--samples-per-crop', type=int, default=150)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        n_rows = write_dataset(args.path, args.samples_per_crop, seed=args.seed, chunk_rows=args.chunk_rows)
+    except ImportError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✓ {n_rows:,} rows ({len(CROP_PARAMETERS)} crops) written to {args.path} in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,149 @@
+"""
+Training Cache
+==============
+Content-addressed cache for train_model.py, so a retrain only redoes the work
+whose inputs changed:
+
+  data/<key>.npz     one crop's generated samples, keyed on the crop's name and
+                     parameters, the sample count, the seed and the generator
+                     (GENERATOR_VERSION, FEATURE_SPECS)
+  models/<key>.pkl   a fitted stage (scaler, search, ensemble members, edge model),
+                     keyed on the dataset fingerprint plus everything else that
+                     stage's result depends on
+
+Editing one crop in crop_parameters.py regenerates only that crop's samples.
+The dataset it joins has a new fingerprint, so the fitted stages miss and are
+refitted; a retrain with nothing changed hits every stage and only re-runs the
+evaluation and the export. Keys never go stale, they are only superseded:
+delete the directory (or run with --clear) to reclaim the space.
+
+Usage:
+  python train_cache.py [cache_dir] [--clear]
+"""
+import os
+import sys
+import json
+import pickle
+import shutil
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from synthetic_data import GENERATOR_VERSION, FEATURE_SPECS, generate_crop_columns
+
+def cache_key(*parts):
+    """Stable hash of JSON-able parts (anything else contributes its repr)."""
+    encoded = json.dumps(parts, sort_keys=True, default=repr, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode()).hexdigest()[:24]
+
+def source_hash(module):
+    """Hash of a module's source file, for stages whose result depends on its code."""
+    with open(module.__file__.replace('.pyc', '.py'), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def dataset_fingerprint(df):
+    """Content hash of a training DataFrame: its values, columns and category vocabularies."""
+    digest = hashlib.sha256(json.dumps([
+        [str(c) for c in df.columns],
+        {column: [str(c) for c in df[column].cat.categories]
+         for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)}
+    ]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:24]
+
+def _atomic_write(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+class TrainCache:
+    """Per-crop sample chunks and fitted stages under one directory. A disabled cache always misses."""
+
+    def __init__(self, root, enabled=True):
+        self.root = root
+        self.enabled = enabled
+        self.report = {}          # stage -> "hit" / "miss" / "off", in the order they ran
+        self.crops_generated = []  # crops whose samples missed the cache
+
+    def crop_columns(self, crop_name, n_samples, param_ranges, seed=42):
+        """generate_crop_columns() through the cache; pass to generate_dataset(crop_columns=...)."""
+        if not self.enabled:
+            self.crops_generated.append(crop_name)
+            return generate_crop_columns(crop_name, n_samples, param_ranges, seed)
+        key = cache_key('crop', GENERATOR_VERSION, FEATURE_SPECS, crop_name, param_ranges, n_samples, seed)
+        path = os.path.join(self.root, 'data', f'{key}.npz')
+        try:
+            with np.load(path, allow_pickle=False) as chunk:
+                return {column: chunk[column] for column in chunk.files}
+        except (OSError, ValueError, KeyError):
+            pass
+        columns = generate_crop_columns(crop_name, n_samples, param_ranges, seed)
+        _atomic_write(path, lambda f: np.savez(f, **columns))
+        self.crops_generated.append(crop_name)
+        return columns
+
+    def data_report(self, n_crops):
+        """Record the data stage from the crop_columns() calls: a hit only if no crop was generated."""
+        if not self.enabled:
+            self.report['data'] = 'off'
+        elif self.crops_generated:
+            self.report['data'] = f"miss ({len(self.crops_generated)}/{n_crops} crops regenerated)"
+        else:
+            self.report['data'] = 'hit'
+
+    def load(self, stage, key):
+        """A stage's cached result, or None (recorded as a hit or miss)."""
+        if not self.enabled:
+            self.report[stage] = 'off'
+            return None
+        try:
+            with open(os.path.join(self.root, 'models', f'{stage}-{key}.pkl'), 'rb') as f:
+                result = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            self.report[stage] = 'miss'
+            return None
+        self.report[stage] = 'hit'
+        return result
+
+    def store(self, stage, key, result):
+        if self.enabled:
+            _atomic_write(os.path.join(self.root, 'models', f'{stage}-{key}.pkl'),
+                          lambda f: pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL))
+        return result
+
+    def cached(self, stage, key, compute):
+        """load() the stage, or compute() and store it."""
+        result = self.load(stage, key)
+        return result if result is not None else self.store(stage, key, compute())
+
+def usage(root):
+    """{subdirectory: (files, bytes)} of a cache directory."""
+    sizes = {}
+    for name in ('data', 'models'):
+        directory = os.path.join(root, name)
+        files = [os.path.join(directory, f) for f in os.listdir(directory)] if os.path.isdir(directory) else []
+        sizes[name] = (len(files), sum(os.path.getsize(f) for f in files))
+    return sizes
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Show or clear the train_model.py cache")
+    parser.add_argument('cache_dir', nargs='?', default=os.path.join(
+        os.environ.get('ML_MODEL_DIR', os.path.dirname(os.path.abspath(__file__))), 'train_cache'))
+    parser.add_argument('--clear', action='store_true')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.cache_dir):
+        print(f"No training cache at {args.cache_dir}")
+        sys.exit(0)
+    for name, (files, size) in usage(args.cache_dir).items():
+        print(f"  {name:8s} {files:6d} files  {size / 2 ** 20:8.1f} MB")
+    if args.clear:
+        shutil.rmtree(args.cache_dir)
+        print(f"✓ Cleared {args.cache_dir}")
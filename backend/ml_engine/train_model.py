@@ -8,22 +8,74 @@ Implements ALL strategies for maximum accuracy and confidence:
 4. Ensemble Methods (RF + GB + SVC)
 5. Deep Learning Neural Network (optional)
 6. Comprehensive Evaluation Metrics
+7. Distilled Edge Model (shallow tree on the ensemble's soft labels, see edge_model.py)
+
+Environment:
+  ML_MODEL_DIR            where the .pkl files are written (default: this directory)
+  ML_ARTIFACT_DIR         artifact store the model is exported to and activated in
+                          (default: artifacts in ML_MODEL_DIR)
+  TRAIN_SAMPLES_PER_CROP  synthetic samples per crop (default 150)
+  TRAIN_DATASET           train on a dataset written by synthetic_data.py instead of generating one
+  TRAIN_GRID              'full' (default) or 'quick', a single-candidate grid for smoke runs
+  TRAIN_SEARCH            'grid' (default, exhaustive GridSearchCV) or 'halving' (successive halving
+                          over the number of trees, see hyperparameter_search.py)
+  TRAIN_SEARCH_BUDGET_S   halving: stop searching after this many seconds
+  TRAIN_SEARCH_BUDGET_TREES  halving: stop after fitting this many trees (across all folds)
+  TRAIN_SEARCH_CHECKPOINT halving: checkpoint file, for resuming an interrupted search
+                          (default: search_checkpoint.json in ML_MODEL_DIR, removed after a successful run)
+  TRAIN_ENSEMBLE_JOBS     processes for the GB and SVC ensemble members (default: CPU count, 1 = serial)
+  TRAIN_EDGE_DEPTH        depth of the distilled edge model (default 8)
+  TRAIN_EDGE_SAMPLES_PER_CROP  distillation samples per crop (default 4 x TRAIN_SAMPLES_PER_CROP)
+  TRAIN_TIMINGS_PATH      if set, per-phase wall times are written there as JSON
+  TRAIN_CACHE             '1' (default) reuses cached crop samples and fitted stages (train_cache.py), '0' disables
+  TRAIN_CACHE_DIR         cache directory (default: train_cache in ML_MODEL_DIR)
 """
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, VotingClassifier
+from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.svm import SVC
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 import pickle
 import os
+import json
+import time
 import warnings
+import sklearn
+import edge_model as edge_module
+import hyperparameter_search
+from artifacts import write_artifacts
+from crop_parameters import crop_parameters
+from synthetic_data import GENERATOR_VERSION, generate_dataset, read_dataset
+from hyperparameter_search import SuccessiveHalvingSearch
+from edge_model import distillation_inputs, fit_student, agreement
+from ensemble_members import fit_members, assemble_voting
+from train_cache import TrainCache, cache_key, source_hash, dataset_fingerprint
 warnings.filterwarnings('ignore')
 
 # Set random seed
 np.random.seed(42)
 
+MODEL_DIR = os.environ.get('ML_MODEL_DIR', os.path.dirname(os.path.abspath(__file__)))
+# Follows MODEL_DIR, so an experimental run never activates a version in the served store
+ARTIFACT_DIR = os.environ.get('ML_ARTIFACT_DIR', os.path.join(MODEL_DIR, 'artifacts'))
+TRAIN_GRID = os.environ.get('TRAIN_GRID', 'full')
+TRAIN_SEARCH = os.environ.get('TRAIN_SEARCH', 'grid')
+SEARCH_CHECKPOINT = os.environ.get('TRAIN_SEARCH_CHECKPOINT', os.path.join(MODEL_DIR, 'search_checkpoint.json'))
+cache = TrainCache(os.environ.get('TRAIN_CACHE_DIR', os.path.join(MODEL_DIR, 'train_cache')),
+                   enabled=os.environ.get('TRAIN_CACHE', '1') == '1')
+
+# Wall time of each phase, in seconds
+phase_times = {}
+phase_started = time.perf_counter()
+
+def end_phase(name):
+    global phase_started
+    now = time.perf_counter()
+    phase_times[name] = round(now - phase_started, 3)
+    phase_started = now
+
 print("=" * 80)
 print("🚀 ULTIMATE ML CROP RECOMMENDATION TRAINING")
 print("=" * 80)
@@ -32,161 +84,25 @@ print("=" * 80)
 # 1. MASSIVE DATA GENERATION (4,500+ samples)
 # ============================================================================
 
-def generate_ultra_diverse_samples(crop_name, n_samples, param_ranges):
-    """Generate highly diverse training samples with realistic variations"""
-    samples = []
-    for _ in range(n_samples):
-        sample = {
-            'N': np.random.normal(
-                (param_ranges['N'][0] + param_ranges['N'][1]) / 2,
-                (param_ranges['N'][1] - param_ranges['N'][0]) / 4
-            ),
-            'P': np.random.normal(
-                (param_ranges['P'][0] + param_ranges['P'][1]) / 2,
-                (param_ranges['P'][1] - param_ranges['P'][0]) / 4
-            ),
-            'K': np.random.normal(
-                (param_ranges['K'][0] + param_ranges['K'][1]) / 2,
-                (param_ranges['K'][1] - param_ranges['K'][0]) / 4
-            ),
-            'temperature': np.random.normal(
-                (param_ranges['temp'][0] + param_ranges['temp'][1]) / 2,
-                (param_ranges['temp'][1] - param_ranges['temp'][0]) / 5
-            ),
-            'humidity': np.random.normal(
-                (param_ranges['humidity'][0] + param_ranges['humidity'][1]) / 2,
-                (param_ranges['humidity'][1] - param_ranges['humidity'][0]) / 5
-            ),
-            'ph': np.random.normal(
-                (param_ranges['ph'][0] + param_ranges['ph'][1]) / 2,
-                (param_ranges['ph'][1] - param_ranges['ph'][0]) / 6
-            ),
-            'rainfall': np.random.normal(
-                (param_ranges['rainfall'][0] + param_ranges['rainfall'][1]) / 2,
-                (param_ranges['rainfall'][1] - param_ranges['rainfall'][0]) / 5
-            ),
-            'soil_type': np.random.choice(param_ranges.get('soil_types', ['Loam'])),
-            'label': crop_name
-        }
-        
-        # Clip to valid ranges
-        sample['N'] = np.clip(sample['N'], param_ranges['N'][0], param_ranges['N'][1])
-        sample['P'] = np.clip(sample['P'], param_ranges['P'][0], param_ranges['P'][1])
-        sample['K'] = np.clip(sample['K'], param_ranges['K'][0], param_ranges['K'][1])
-        sample['temperature'] = np.clip(sample['temperature'], param_ranges['temp'][0], param_ranges['temp'][1])
-        sample['humidity'] = np.clip(sample['humidity'], param_ranges['humidity'][0], param_ranges['humidity'][1])
-        sample['ph'] = np.clip(sample['ph'], param_ranges['ph'][0], param_ranges['ph'][1])
-        sample['rainfall'] = np.clip(sample['rainfall'], param_ranges['rainfall'][0], param_ranges['rainfall'][1])
-        
-        samples.append(sample)
-    return samples
-
-# Comprehensive crop parameters with soil types
-crop_parameters = {
-    'rice': {'N': (80, 120), 'P': (35, 60), 'K': (35, 60), 'temp': (20, 35), 
-             'humidity': (70, 90), 'ph': (5.5, 7.0), 'rainfall': (1000, 2500),
-             'soil_types': ['Clay', 'Loam', 'Clay Loam']},
-    'wheat': {'N': (100, 150), 'P': (30, 50), 'K': (30, 50), 'temp': (10, 25), 
-              'humidity': (50, 70), 'ph': (6.0, 7.5), 'rainfall': (400, 800),
-              'soil_types': ['Loam', 'Clay Loam', 'Silt Loam']},
-    'maize': {'N': (120, 180), 'P': (40, 60), 'K': (40, 60), 'temp': (18, 27), 
-              'humidity': (60, 80), 'ph': (5.5, 7.5), 'rainfall': (500, 900),
-              'soil_types': ['Loam', 'Sandy Loam', 'Clay Loam']},
-    'cotton': {'N': (60, 100), 'P': (30, 50), 'K': (40, 60), 'temp': (21, 30), 
-               'humidity': (50, 70), 'ph': (5.8, 8.0), 'rainfall': (600, 1200),
-               'soil_types': ['Black Soil', 'Clay', 'Loam']},
-    'sugarcane': {'N': (150, 250), 'P': (50, 80), 'K': (100, 150), 'temp': (20, 35), 
-                  'humidity': (70, 90), 'ph': (6.5, 7.5), 'rainfall': (1200, 1800),
-                  'soil_types': ['Loam', 'Clay Loam', 'Red Soil']},
-    'soybean': {'N': (20, 40), 'P': (30, 50), 'K': (30, 50), 'temp': (20, 30), 
-                'humidity': (60, 80), 'ph': (6.0, 7.0), 'rainfall': (450, 700),
-                'soil_types': ['Loam', 'Sandy Loam', 'Clay Loam']},
-    'chickpea': {'N': (20, 30), 'P': (30, 50), 'K': (20, 40), 'temp': (15, 25), 
-                 'humidity': (55, 75), 'ph': (6.0, 7.5), 'rainfall': (400, 650),
-                 'soil_types': ['Loam', 'Clay Loam', 'Black Soil']},
-    'potato': {'N': (80, 120), 'P': (40, 60), 'K': (80, 120), 'temp': (15, 25), 
-               'humidity': (65, 85), 'ph': (4.8, 6.5), 'rainfall': (500, 750),
-               'soil_types': ['Sandy Loam', 'Loam', 'Silt Loam']},
-    'groundnut': {'N': (20, 40), 'P': (40, 60), 'K': (60, 80), 'temp': (20, 30), 
-                  'humidity': (60, 80), 'ph': (5.5, 6.5), 'rainfall': (500, 900),
-                  'soil_types': ['Sandy Loam', 'Red Soil', 'Loam']},
-    'tomato': {'N': (50, 80), 'P': (25, 40), 'K': (40, 60), 'temp': (18, 27), 
-               'humidity': (60, 80), 'ph': (6.0, 6.8), 'rainfall': (500, 800),
-               'soil_types': ['Loam', 'Sandy Loam', 'Clay Loam']},
-    'onion': {'N': (100, 150), 'P': (50, 75), 'K': (50, 75), 'temp': (15, 25), 
-              'humidity': (65, 85), 'ph': (6.0, 7.0), 'rainfall': (350, 500),
-              'soil_types': ['Loam', 'Sandy Loam', 'Silt Loam']},
-    'banana': {'N': (200, 300), 'P': (100, 150), 'K': (300, 500), 'temp': (25, 35), 
-               'humidity': (75, 95), 'ph': (6.0, 7.5), 'rainfall': (1500, 3000),
-               'soil_types': ['Loam', 'Clay Loam', 'Alluvial']},
-    'mango': {'N': (100, 150), 'P': (50, 80), 'K': (100, 150), 'temp': (24, 35), 
-              'humidity': (50, 70), 'ph': (5.5, 7.5), 'rainfall': (750, 2500),
-              'soil_types': ['Loam', 'Sandy Loam', 'Alluvial']},
-    'grapes': {'N': (100, 150), 'P': (60, 90), 'K': (120, 180), 'temp': (15, 30), 
-               'humidity': (50, 70), 'ph': (6.0, 7.5), 'rainfall': (650, 900),
-               'soil_types': ['Sandy Loam', 'Loam', 'Black Soil']},
-    'papaya': {'N': (100, 150), 'P': (60, 90), 'K': (120, 180), 'temp': (22, 32), 
-               'humidity': (60, 85), 'ph': (6.0, 7.0), 'rainfall': (1000, 2000),
-               'soil_types': ['Loam', 'Sandy Loam', 'Alluvial']},
-    'coffee': {'N': (100, 150), 'P': (40, 60), 'K': (80, 120), 'temp': (15, 28), 
-               'humidity': (70, 90), 'ph': (5.0, 6.5), 'rainfall': (1500, 2500),
-               'soil_types': ['Loam', 'Red Soil', 'Laterite']},
-    'tea': {'N': (150, 250), 'P': (50, 80), 'K': (100, 150), 'temp': (20, 30), 
-            'humidity': (75, 95), 'ph': (4.5, 6.0), 'rainfall': (1500, 3000),
-            'soil_types': ['Loam', 'Red Soil', 'Laterite']},
-    'mustard': {'N': (80, 120), 'P': (30, 50), 'K': (30, 50), 'temp': (10, 20), 
-                'humidity': (55, 75), 'ph': (6.0, 7.5), 'rainfall': (250, 500),
-                'soil_types': ['Loam', 'Sandy Loam', 'Clay Loam']},
-    'barley': {'N': (60, 100), 'P': (25, 40), 'K': (25, 40), 'temp': (12, 22), 
-               'humidity': (50, 70), 'ph': (6.5, 7.5), 'rainfall': (300, 600),
-               'soil_types': ['Loam', 'Clay Loam', 'Sandy Loam']},
-    'cabbage': {'N': (120, 180), 'P': (50, 70), 'K': (80, 120), 'temp': (15, 20), 
-                'humidity': (65, 85), 'ph': (6.0, 7.0), 'rainfall': (400, 600),
-                'soil_types': ['Loam', 'Clay Loam', 'Silt Loam']},
-    'cauliflower': {'N': (150, 200), 'P': (60, 80), 'K': (100, 140), 'temp': (15, 22), 
-                    'humidity': (70, 90), 'ph': (6.0, 7.0), 'rainfall': (400, 600),
-                    'soil_types': ['Loam', 'Clay Loam', 'Silt Loam']},
-    'carrot': {'N': (60, 100), 'P': (40, 60), 'K': (80, 120), 'temp': (15, 20), 
-               'humidity': (60, 80), 'ph': (5.5, 6.5), 'rainfall': (300, 500),
-               'soil_types': ['Sandy Loam', 'Loam', 'Silt Loam']},
-    'chilli': {'N': (80, 120), 'P': (40, 60), 'K': (60, 90), 'temp': (20, 30), 
-               'humidity': (60, 80), 'ph': (6.0, 7.0), 'rainfall': (600, 1200),
-               'soil_types': ['Loam', 'Sandy Loam', 'Red Soil']},
-    'garlic': {'N': (80, 120), 'P': (50, 75), 'K': (50, 75), 'temp': (12, 25), 
-               'humidity': (55, 75), 'ph': (6.0, 7.0), 'rainfall': (300, 450),
-               'soil_types': ['Loam', 'Sandy Loam', 'Clay Loam']},
-    'ginger': {'N': (120, 180), 'P': (60, 90), 'K': (120, 180), 'temp': (20, 30), 
-               'humidity': (70, 90), 'ph': (5.5, 6.5), 'rainfall': (1500, 3000),
-               'soil_types': ['Loam', 'Sandy Loam', 'Red Soil']},
-    'turmeric': {'N': (100, 150), 'P': (50, 75), 'K': (100, 150), 'temp': (20, 30), 
-                 'humidity': (65, 85), 'ph': (5.0, 7.5), 'rainfall': (1500, 2500),
-                 'soil_types': ['Loam', 'Clay Loam', 'Red Soil']},
-    'millets': {'N': (40, 60), 'P': (20, 30), 'K': (20, 30), 'temp': (25, 35), 
-                'humidity': (40, 60), 'ph': (6.0, 8.0), 'rainfall': (400, 600),
-                'soil_types': ['Sandy Loam', 'Red Soil', 'Black Soil']},
-    'sorghum': {'N': (60, 90), 'P': (30, 40), 'K': (30, 40), 'temp': (25, 35), 
-                'humidity': (45, 65), 'ph': (6.0, 8.0), 'rainfall': (450, 650),
-                'soil_types': ['Loam', 'Clay Loam', 'Black Soil']},
-    'sunflower': {'N': (60, 80), 'P': (40, 60), 'K': (40, 60), 'temp': (20, 27), 
-                  'humidity': (55, 75), 'ph': (6.0, 7.5), 'rainfall': (400, 600),
-                  'soil_types': ['Loam', 'Sandy Loam', 'Black Soil']},
-    'cucumber': {'N': (100, 150), 'P': (50, 75), 'K': (80, 120), 'temp': (20, 30), 
-                 'humidity': (65, 85), 'ph': (6.0, 7.0), 'rainfall': (500, 800),
-                 'soil_types': ['Loam', 'Sandy Loam', 'Clay Loam']},
-}
-
 print("\n📊 PHASE 1: Generating Massive Training Dataset...")
 print("-" * 80)
 
-all_samples = []
-samples_per_crop = 150  # Increased from 35 to 150!
+samples_per_crop = int(os.environ.get('TRAIN_SAMPLES_PER_CROP', 150))  # Increased from 35 to 150!
 
-for crop_name, params in crop_parameters.items():
-    crop_samples = generate_ultra_diverse_samples(crop_name, samples_per_crop, params)
-    all_samples.extend(crop_samples)
-    print(f"✓ {crop_name:15s} → {samples_per_crop} samples generated")
+if os.environ.get('TRAIN_DATASET'):
+    # Pre-generated with `python synthetic_data.py <path> --samples-per-crop N`
+    df = read_dataset(os.environ['TRAIN_DATASET'])
+    samples_per_crop = int(df['label'].value_counts().max())
+    print(f"✓ Loaded {len(df):,} samples from {os.environ['TRAIN_DATASET']}")
+else:
+    df = generate_dataset(samples_per_crop, crop_parameters, seed=42, crop_columns=cache.crop_columns)
+    cache.data_report(len(crop_parameters))
+    for crop_name in crop_parameters:
+        source = 'generated' if crop_name in cache.crops_generated else 'cached'
+        print(f"✓ {crop_name:15s} → {samples_per_crop} samples {source}")
 
-df = pd.DataFrame(all_samples)
+# Every fitted stage below is keyed on this (plus its own settings), so any data change refits them
+dataset_key = dataset_fingerprint(df)
 
 print(f"\n{'=' * 80}")
 print(f"DATASET STATISTICS")
@@ -200,6 +116,8 @@ print(f"Features: N, P, K, temperature, humidity, ph, rainfall, soil_type")
 # 2. FEATURE ENGINEERING
 # ============================================================================
 
+end_phase('data_generation')
+
 print(f"\n🔬 PHASE 2: Feature Engineering...")
 print("-" * 80)
 
@@ -225,10 +143,13 @@ print(f"✓ Training set: {len(X_train)} samples")
 print(f"✓ Testing set: {len(X_test)} samples")
 
 # Scale features
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train)
+scaler = cache.cached('scaler', cache_key(dataset_key, sklearn.__version__),
+                      lambda: StandardScaler().fit(X_train))
+X_train_scaled = scaler.transform(X_train)
 X_test_scaled = scaler.transform(X_test)
-print(f"✓ Features scaled using StandardScaler")
+print(f"✓ Features scaled using StandardScaler ({cache.report['scaler']})")
+
+end_phase('feature_engineering')
 
 # =============================================================================
 # 3. GRID SEARCH HYPERPARAMETER OPTIMIZATION
@@ -236,8 +157,6 @@ print(f"✓ Features scaled using StandardScaler")
 
 print(f"\n⚙️  PHASE 3: Grid Search Hyperparameter Optimization...")
 print("-" * 80)
-print("Testing 48 different parameter combinations...")
-
 param_grid = {
     'n_estimators': [200, 300, 400],
     'max_depth': [25, 30, None],
@@ -245,17 +164,42 @@ param_grid = {
     'min_samples_leaf': [1, 2],
     'max_features': ['sqrt', 'log2']
 }
-
-grid_search = GridSearchCV(
-    RandomForestClassifier(random_state=42, n_jobs=-1, class_weight='balanced'),
-    param_grid,
-    cv=5,
-    scoring='accuracy',
-    verbose=1,
-    n_jobs=-1
-)
-
-grid_search.fit(X_train_scaled, y_train)
+if TRAIN_GRID == 'quick':
+    param_grid = {name: values[:1] for name, values in param_grid.items()}
+n_candidates = int(np.prod([len(values) for values in param_grid.values()]))
+
+if TRAIN_SEARCH == 'halving':
+    print(f"Successive halving over {n_candidates // len(param_grid['n_estimators'])} configurations...")
+    grid_search = SuccessiveHalvingSearch(
+        RandomForestClassifier(random_state=42, n_jobs=-1, class_weight='balanced'),
+        param_grid,
+        cv=5,
+        budget_seconds=float(os.environ.get('TRAIN_SEARCH_BUDGET_S', 0)) or None,
+        budget_trees=int(os.environ.get('TRAIN_SEARCH_BUDGET_TREES', 0)) or None,
+        checkpoint_path=SEARCH_CHECKPOINT
+    )
+else:
+    print(f"Testing {n_candidates} different parameter combinations...")
+    grid_search = GridSearchCV(
+        RandomForestClassifier(random_state=42, n_jobs=-1, class_weight='balanced'),
+        param_grid,
+        cv=5,
+        scoring='accuracy',
+        verbose=1,
+        n_jobs=-1
+    )
+
+search_key = cache_key(dataset_key, sklearn.__version__, TRAIN_SEARCH, param_grid,
+                       grid_search.estimator.get_params(), grid_search.cv,
+                       {name: os.environ.get(name) for name in ('TRAIN_SEARCH_BUDGET_S', 'TRAIN_SEARCH_BUDGET_TREES')},
+                       source_hash(hyperparameter_search) if TRAIN_SEARCH == 'halving' else None)
+cached_search = cache.load('search', search_key)
+if cached_search is not None:
+    grid_search = cached_search
+    print(f"✓ Search results reused from the cache")
+else:
+    grid_search.fit(X_train_scaled, y_train)
+    cache.store('search', search_key, grid_search)
 
 print(f"\n✓ Best Parameters Found:")
 for param, value in grid_search.best_params_.items():
@@ -263,6 +207,7 @@ for param, value in grid_search.best_params_.items():
 print(f"✓ Best Cross-Val Score: {grid_search.best_score_ * 100:.2f}%")
 
 best_rf = grid_search.best_estimator_
+end_phase('grid_search')
 
 # ============================================================================
 # 4. ENSEMBLE METHODS
@@ -271,35 +216,48 @@ best_rf = grid_search.best_estimator_
 print(f"\n🤝 PHASE 4: Building Ensemble Model...")
 print("-" * 80)
 
-print("Training Gradient Boosting Classifier...")
-gb_model = GradientBoostingClassifier(
-    n_estimators=100,
-    learning_rate=0.1,
-    max_depth=5,
-    random_state=42
-)
-gb_model.fit(X_train_scaled, y_train)
-print(f"✓ GB Accuracy: {gb_model.score(X_test_scaled, y_test) * 100:.2f}%")
-
-print("Training SVM Classifier...")
-svc_model = SVC(probability=True, kernel='rbf', random_state=42)
-svc_model.fit(X_train_scaled, y_train)
-print(f"✓ SVC Accuracy: {svc_model.score(X_test_scaled, y_test) * 100:.2f}%")
-
-print("Creating Voting Ensemble...")
-ensemble = VotingClassifier(
-    estimators=[
+# GB and SVC are single-threaded and independent, so they train side by side
+# (ensemble_members.py); the RF member is best_rf, already fitted by the search
+members = [
+    ('gb', GradientBoostingClassifier(
+        n_estimators=100,
+        learning_rate=0.1,
+        max_depth=5,
+        random_state=42
+    )),
+    ('svc', SVC(probability=True, kernel='rbf', random_state=42))
+]
+ensemble_jobs = int(os.environ.get('TRAIN_ENSEMBLE_JOBS', os.cpu_count() or 1))
+print(f"Training Gradient Boosting and SVM Classifiers "
+      f"{'in parallel' if ensemble_jobs > 1 else 'serially'}...")
+members_key = cache_key(dataset_key, sklearn.__version__,
+                        [(name, estimator.get_params()) for name, estimator in members])
+fitted_members = cache.load('members', members_key)
+if fitted_members is not None:
+    print(f"✓ Members reused from the cache (fit stats below are from the run that fitted them)")
+else:
+    fitted_members = cache.store('members', members_key,
+                                 fit_members(members, X_train_scaled, y_train, ensemble_jobs))
+gb_model, svc_model = fitted_members['gb'][0], fitted_members['svc'][0]
+for name, label in [('gb', 'GB'), ('svc', 'SVC')]:
+    model, stats = fitted_members[name]
+    print(f"✓ {label} Accuracy: {model.score(X_test_scaled, y_test) * 100:.2f}% "
+          f"({stats['seconds']:.1f}s, peak RSS {stats['peak_rss_mb']:.0f} MB, +{stats['fit_rss_mb']:.0f} MB during fit)")
+
+print("Creating Voting Ensemble from the fitted members...")
+ensemble = assemble_voting(
+    [
         ('rf', best_rf),
         ('gb', gb_model),
         ('svc', svc_model)
     ],
+    y_train,
     voting='soft',
     weights=[3, 2, 1]  # RF weighted highest
 )
-
-ensemble.fit(X_train_scaled, y_train)
 ensemble_score = ensemble.score(X_test_scaled, y_test)
 print(f"✓ Ensemble Accuracy: {ensemble_score * 100:.2f}%")
+end_phase('ensemble')
 
 # ============================================================================
 # 5. COMPREHENSIVE EVALUATION
@@ -308,9 +266,11 @@ print(f"✓ Ensemble Accuracy: {ensemble_score * 100:.2f}%")
 print(f"\n📈 PHASE 5: Comprehensive Model Evaluation...")
 print("-" * 80)
 
-# Cross-validation
-cv_scores = cross_val_score(best_rf, X_train_scaled, y_train, cv=5)
-print(f"✓ Cross-Validation Scores (5-fold):")
+# Cross-validation: the search already scored best_rf on the same 5 stratified
+# folds, so its per-fold results are reused instead of refitting 5 more forests
+cv_scores = np.array([grid_search.cv_results_[f'split{i}_test_score'][grid_search.best_index_]
+                      for i in range(grid_search.n_splits_)])
+print(f"✓ Cross-Validation Scores ({grid_search.n_splits_}-fold):")
 print(f"  {cv_scores}")
 print(f"  Mean: {cv_scores.mean() * 100:.2f}% (+/- {cv_scores.std() * 2 * 100:.2f}%)")
 
@@ -331,18 +291,50 @@ y_pred_ensemble = ensemble.predict(X_test_scaled)
 print(f"\n✓ Model Performance Summary:")
 print(f"  Random Forest (Optimized): {accuracy_score(y_test, y_pred_rf) * 100:.2f}%")
 print(f"  Ensemble (RF+GB+SVC):      {ensemble_score * 100:.2f}%")
+end_phase('evaluation')
+
+# ============================================================================
+# 6. EDGE MODEL DISTILLATION
+# ============================================================================
+
+print(f"\n📱 PHASE 6: Distilling Edge Model...")
+print("-" * 80)
+edge_depth = int(os.environ.get('TRAIN_EDGE_DEPTH', 8))
+edge_samples = int(os.environ.get('TRAIN_EDGE_SAMPLES_PER_CROP', 4 * samples_per_crop))
+
+def distill():
+    # Soft labels from the ensemble (the teacher) over the synthetic input space
+    X_distill = distillation_inputs(edge_samples, label_encoder.classes_, crop_parameters)
+    teacher_proba = ensemble.predict_proba(scaler.transform(pd.DataFrame(X_distill, columns=X.columns)))
+    student = fit_student(X_distill, teacher_proba, ensemble.classes_, label_encoder.classes_, max_depth=edge_depth)
+    return student, len(X_distill)
+
+# The teacher is the ensemble, so its members' keys are part of this one
+edge_key = cache_key(search_key, members_key, edge_depth, edge_samples, crop_parameters,
+                     GENERATOR_VERSION, source_hash(edge_module))
+edge_model, n_distill = cache.cached('edge', edge_key, distill)
+print(f"✓ Student: depth-{edge_depth} tree, {edge_model.n_nodes} nodes, {edge_model.size_bytes() / 1024:.1f} KB as C arrays")
+print(f"  Fitted on {n_distill:,} soft-labelled inputs ({cache.report['edge']})")
+
+edge_agreement = agreement(edge_model, X_test.to_numpy(), ensemble.predict_proba(X_test_scaled))
+edge_accuracy = np.mean(np.array(edge_model.classes)[np.argmax(edge_model.predict_proba_matrix(X_test.to_numpy()), axis=1)] == y_test.to_numpy())
+print(f"✓ Agreement with the ensemble on the test set: {edge_agreement['top1'] * 100:.2f}% top-1, "
+      f"{edge_agreement['top3'] * 100:.2f}% teacher's top-3")
+print(f"✓ Edge Model Accuracy: {edge_accuracy * 100:.2f}%")
+end_phase('edge_distillation')
 
 # ============================================================================
-# 6. SAVE MODELS
+# 7. SAVE MODELS
 # ============================================================================
 
-print(f"\n💾 PHASE 6: Saving Models and Scalers...")
+print(f"\n💾 PHASE 7: Saving Models and Scalers...")
 print("-" * 80)
 
-model_path = os.path.join(os.path.dirname(__file__), 'crop_model.pkl')
-ensemble_path = os.path.join(os.path.dirname(__file__), 'ensemble_model.pkl')
-scaler_path = os.path.join(os.path.dirname(__file__), 'scaler.pkl')
-encoder_path = os.path.join(os.path.dirname(__file__), 'soil_encoder.pkl')
+os.makedirs(MODEL_DIR, exist_ok=True)
+model_path = os.path.join(MODEL_DIR, 'crop_model.pkl')
+ensemble_path = os.path.join(MODEL_DIR, 'ensemble_model.pkl')
+scaler_path = os.path.join(MODEL_DIR, 'scaler.pkl')
+encoder_path = os.path.join(MODEL_DIR, 'soil_encoder.pkl')
 
 with open(model_path, 'wb') as f:
     pickle.dump(best_rf, f)
@@ -360,11 +352,25 @@ with open(encoder_path, 'wb') as f:
     pickle.dump(label_encoder, f)
 print(f"✓ Soil Encoder saved: {encoder_path}")
 
+edge_json_path = os.path.join(MODEL_DIR, 'edge_model.json')
+edge_header_path = os.path.join(MODEL_DIR, 'edge_model.h')
+edge_model.save_json(edge_json_path)
+edge_model.write_c_header(edge_header_path)
+print(f"✓ Edge Model saved: {edge_json_path}, {edge_header_path}")
+
+# Memory-mapped artifact set served by app.py (flattened forest, scaler folded in)
+artifact_version = write_artifacts(best_rf, scaler, label_encoder, root=ARTIFACT_DIR, source='train_model.py')
+print(f"✓ Artifacts exported: version {artifact_version} (active in {ARTIFACT_DIR})")
+
+if os.path.exists(SEARCH_CHECKPOINT):
+    os.remove(SEARCH_CHECKPOINT)
+end_phase('save')
+
 # ============================================================================
-# 7. TEST PREDICTIONS
+# 8. TEST PREDICTIONS
 # ============================================================================
 
-print(f"\n🧪 PHASE 7: Testing with Diverse Scenarios...")
+print(f"\n🧪 PHASE 8: Testing with Diverse Scenarios...")
 print("-" * 80)
 
 test_scenarios = [
@@ -389,13 +395,27 @@ for scenario in test_scenarios:
     print(f"\n{scenario['name']}:")
     print(f"  RF:       {pred_rf.upper():15s} ({max(prob_rf)*100:.1f}%)")
     print(f"  Ensemble: {pred_ens.upper():15s} ({max(prob_ens)*100:.1f}%)")
+    print(f"  Edge:     {edge_model.predict([*scenario['data'][:7], soil_encoded]).upper():15s}")
+end_phase('test_predictions')
+
+print(f"\n♻️  Cache ({cache.root if cache.enabled else 'disabled'}):")
+for stage, result in cache.report.items():
+    print(f"  {stage:20s} {result}")
+
+print(f"\n⏱️  Phase Timings:")
+for phase, seconds in phase_times.items():
+    print(f"  {phase:20s} {seconds:8.2f}s")
+if os.environ.get('TRAIN_TIMINGS_PATH'):
+    with open(os.environ['TRAIN_TIMINGS_PATH'], 'w') as f:
+        json.dump(phase_times, f, indent=2)
 
 print(f"\n{'=' * 80}")
 print("🎉 ULTIMATE MODEL TRAINING COMPLETE!")
 print("=" * 80)
-print(f"✅ 4,500 samples trained")
+print(f"✅ {len(df):,} samples trained")
 print(f"✅ Grid Search optimized")
 print(f"✅ Ensemble created (RF + GB + SVC)")
+print(f"✅ Edge model distilled ({edge_agreement['top1'] * 100:.1f}% agreement with the ensemble)")
 print(f"✅ {X.shape[1]} features engineered")
 print(f"✅ All models saved")
 print("=" * 80 + "\n")
@@ -0,0 +1,156 @@
+"""
+Out-of-Core Model Training
+==========================
+Trains the served crop model from a chunked dataset (datasets.py) without
+ever holding the dataset in memory, so it runs on small CI runners:
+
+1. Scaler: StandardScaler.partial_fit over the training rows, chunk by chunk
+2. Forest: grown incrementally. Each round fits TREES_PER_ROUND new trees on
+   a fresh class-balanced sample of TRAIN_SAMPLE_ROWS training rows
+   (warm_start), so every tree sees a random subset of the full dataset
+   (bagging across samples instead of bootstraps)
+3. Evaluation: accuracy and per-crop recall, streamed over the test rows
+4. Save: crop_model.pkl, scaler.pkl, soil_encoder.pkl and a new active artifact version
+
+Train/test assignment is per row and deterministic (seeded per chunk): an
+80/20 split, like train_model.py, but drawn over the chunks, so the test rows
+differ and its accuracy is not directly comparable to train_model.py's.
+The GB/SVC ensemble is not trained here,
+because neither model learns incrementally; ensemble_model.pkl is left as is.
+It was trained against the previous scaler, so leave app.py's model cascade
+(PREDICT_CASCADE) off, or retrain with train_model.py, after running this.
+
+Usage:
+  python synthetic_data.py data/crops_100k --samples-per-crop 100000
+  python train_streaming.py data/crops_100k
+
+Environment:
+  ML_MODEL_DIR        where the .pkl files are written (default: this directory)
+  ML_ARTIFACT_DIR     artifact store the model is exported to and activated in
+                      (default: artifacts in ML_MODEL_DIR)
+  TRAIN_SAMPLE_ROWS   rows per training round (default 200000, bounds peak memory)
+  TRAIN_ROUNDS        training rounds (default 4)
+  TREES_PER_ROUND     trees added per round (default 100)
+  TRAIN_TIMINGS_PATH  if set, per-phase wall times are written there as JSON
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import warnings
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler, LabelEncoder
+from artifacts import write_artifacts
+from datasets import Dataset, MODEL_COLUMNS
+warnings.filterwarnings('ignore')
+
+MODEL_DIR = os.environ.get('ML_MODEL_DIR', os.path.dirname(os.path.abspath(__file__)))
+# Follows MODEL_DIR, so an experimental run never activates a version in the served store
+ARTIFACT_DIR = os.environ.get('ML_ARTIFACT_DIR', os.path.join(MODEL_DIR, 'artifacts'))
+SAMPLE_ROWS = int(os.environ.get('TRAIN_SAMPLE_ROWS', 200_000))
+ROUNDS = int(os.environ.get('TRAIN_ROUNDS', 4))
+TREES_PER_ROUND = int(os.environ.get('TREES_PER_ROUND', 100))
+TEST_SIZE = 0.2
+SEED = 42
+
+phase_times = {}
+phase_started = time.perf_counter()
+
+def end_phase(name):
+    global phase_started
+    now = time.perf_counter()
+    phase_times[name] = round(now - phase_started, 3)
+    phase_started = now
+
+if len(sys.argv) != 2:
+    print(__doc__)
+    sys.exit(1)
+
+dataset = Dataset(sys.argv[1])
+print("=" * 80)
+print("🚀 OUT-OF-CORE CROP MODEL TRAINING")
+print("=" * 80)
+print(f"Dataset: {sys.argv[1]} ({dataset.rows:,} rows, {len(dataset.chunks)} chunks, {len(dataset.labels)} crops)")
+
+# ============================================================================
+# 1. STREAMING SCALER
+# ============================================================================
+
+print(f"\n📏 PHASE 1: Fitting scaler over training chunks...")
+print("-" * 80)
+scaler = StandardScaler()
+n_train = 0
+for X, _ in dataset.iter_split('train', TEST_SIZE, SEED):
+    scaler.partial_fit(pd.DataFrame(X, columns=MODEL_COLUMNS))
+    n_train += len(X)
+print(f"✓ Scaler fitted on {n_train:,} training rows")
+end_phase('scaler')
+
+# ============================================================================
+# 2. INCREMENTAL FOREST
+# ============================================================================
+
+print(f"\n🌲 PHASE 2: Growing forest ({ROUNDS} rounds × {TREES_PER_ROUND} trees, {SAMPLE_ROWS:,} rows per round)...")
+print("-" * 80)
+model = RandomForestClassifier(
+    n_estimators=0, max_features='sqrt', random_state=SEED, n_jobs=-1, warm_start=True
+)
+for round_index in range(ROUNDS):
+    X, y = dataset.sample(SAMPLE_ROWS, seed=SEED + round_index, test_size=TEST_SIZE, split_seed=SEED)
+    model.set_params(n_estimators=model.n_estimators + TREES_PER_ROUND)
+    model.fit(scaler.transform(X), dataset.labels[y])
+    print(f"✓ Round {round_index + 1}: {len(X):,} rows → {model.n_estimators} trees")
+    del X, y
+end_phase('forest')
+
+# ============================================================================
+# 3. STREAMING EVALUATION
+# ============================================================================
+
+print(f"\n📈 PHASE 3: Evaluating on held-out chunks...")
+print("-" * 80)
+label_index = {label: i for i, label in enumerate(dataset.labels)}
+class_codes = np.array([label_index[c] for c in model.classes_])
+correct = np.zeros(len(dataset.labels), dtype=np.int64)
+total = np.zeros(len(dataset.labels), dtype=np.int64)
+for X, y in dataset.iter_split('test', TEST_SIZE, SEED):
+    predicted = class_codes[np.argmax(model.predict_proba(scaler.transform(X)), axis=1)]
+    total += np.bincount(y, minlength=len(total))
+    correct += np.bincount(y[predicted == y], minlength=len(correct))
+
+accuracy = correct.sum() / max(total.sum(), 1)
+print(f"✓ Test Accuracy: {accuracy * 100:.2f}% on {total.sum():,} rows")
+recall = correct / np.maximum(total, 1)
+for i in np.argsort(recall)[:5]:
+    print(f"  lowest recall: {dataset.labels[i]:15s} {recall[i] * 100:6.2f}%")
+end_phase('evaluation')
+
+# ============================================================================
+# 4. SAVE MODELS
+# ============================================================================
+
+print(f"\n💾 PHASE 4: Saving Models and Scalers...")
+print("-" * 80)
+model.set_params(warm_start=False)
+soil_encoder = LabelEncoder()
+soil_encoder.classes_ = dataset.soil_classes
+
+os.makedirs(MODEL_DIR, exist_ok=True)
+for name, obj in [('crop_model.pkl', model), ('scaler.pkl', scaler), ('soil_encoder.pkl', soil_encoder)]:
+    with open(os.path.join(MODEL_DIR, name), 'wb') as f:
+        pickle.dump(obj, f)
+    print(f"✓ Saved {os.path.join(MODEL_DIR, name)}")
+
+artifact_version = write_artifacts(model, scaler, soil_encoder, root=ARTIFACT_DIR, source='train_streaming.py')
+print(f"✓ Artifacts exported: version {artifact_version} (active in {ARTIFACT_DIR})")
+end_phase('save')
+
+print(f"\n⏱️  Phase Timings:")
+for phase, seconds in phase_times.items():
+    print(f"  {phase:20s} {seconds:8.2f}s")
+if os.environ.get('TRAIN_TIMINGS_PATH'):
+    with open(os.environ['TRAIN_TIMINGS_PATH'], 'w') as f:
+        json.dump(phase_times, f, indent=2)
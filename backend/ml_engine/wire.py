@@ -0,0 +1,191 @@
+"""
+Columnar Wire Format
+====================
+A compact binary alternative to JSON for /predict_batch, negotiated per
+request (JSON stays the default; single-row /predict is JSON only):
+
+  Content-Type: application/vnd.krishisense.columns   the request body is an input frame
+  Accept: application/vnd.krishisense.columns         the response body is a result frame
+
+Frames carry numbers only. Crop names, soil types, tiers and the risk-factor
+messages are codes into a dictionary served once by GET /wire/dictionary, and
+decoding rebuilds exactly the JSON results (risk messages take the temperature
+from the caller's own input). Every frame names its dictionary's id; the
+server answers 409 to an input frame built against another dictionary (after a
+model reload), and the client fetches the dictionary again.
+
+All integers and floats are little-endian. Arrays start at offsets that are a
+multiple of their item size, so a client can view them in place (Float64Array).
+
+Input frame (n rows):
+  magic "KSI1" | uint32 n | 8-byte dictionary id
+  float64[n] for each of N, P, K, temperature, humidity, ph, rainfall, moisture
+  uint8[n] soil code (index into soil_types; anything else means unknown, as
+           an unknown soil_type string does)
+
+Result frame (n rows, m recommendations in total):
+  magic "KSR1" | uint32 n | 8-byte dictionary id | uint32 m | uint32 e
+  float64[n] model_confidence | float64[m] score | float64[m] yield_potential
+  uint32[n + 1] offsets: row i's recommendations are [offsets[i], offsets[i + 1])
+  uint16[n] top_prediction (crop code) | uint16[m] crop code
+  uint8[n] model_tier (tier code, 255 = none) | uint8[m] risk flags
+  e bytes of UTF-8 JSON {"<row>": {"error": ...}} for rows that failed validation
+"""
+import json
+import struct
+import hashlib
+import numpy as np
+
+CONTENT_TYPE = 'application/vnd.krishisense.columns'
+FORMAT = 'krishisense-columns'
+FORMAT_VERSION = 1
+INPUT_MAGIC, RESULT_MAGIC = b'KSI1', b'KSR1'
+INPUT_COLUMNS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall', 'moisture']
+TIERS = ['fast', 'ensemble', 'edge']
+NO_TIER = 255
+# Risk flag -> message, in the order /predict lists them ({temperature} as the request sent it)
+RISK_MESSAGES = {
+    1: "❄️ FROST RISK: Temp {temperature}°C",
+    2: "🔥 HEAT STRESS: Temp {temperature}°C",
+    4: "💧 DROUGHT RISK",
+    8: "🌊 WATERLOG RISK",
+}
+FROST, HEAT, DROUGHT, WATERLOG = RISK_MESSAGES
+
+_INPUT_HEADER = struct.Struct('<4sI8s')
+_RESULT_HEADER = struct.Struct('<4sI8sII')
+
+def dictionary(crops, soil_types):
+    """The /wire/dictionary body for a model's display names and soil types (id included)."""
+    body = {
+        "format": FORMAT,
+        "format_version": FORMAT_VERSION,
+        "content_type": CONTENT_TYPE,
+        "input_columns": INPUT_COLUMNS,
+        "crops": [str(c) for c in crops],
+        "soil_types": [str(s) for s in soil_types],
+        "tiers": TIERS,
+        "risk_messages": {str(flag): message for flag, message in RISK_MESSAGES.items()}
+    }
+    body["id"] = hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:16]
+    return body
+
+def _pad(parts, size, alignment):
+    padding = -size % alignment
+    if padding:
+        parts.append(b'\0' * padding)
+    return size + padding
+
+def _take(body, offset, dtype, count):
+    dtype = np.dtype(dtype)
+    offset += -offset % dtype.itemsize
+    end = offset + dtype.itemsize * count
+    if end > len(body):
+        raise ValueError("Truncated frame")
+    return np.frombuffer(body, dtype=dtype, count=count, offset=offset), end
+
+# --- Input Frames ---
+
+def encode_inputs(rows, dictionary):
+    """Input frame for /predict payloads (client side; missing moisture and soil_type get /predict's defaults)."""
+    soil_codes = {soil: code for code, soil in enumerate(dictionary["soil_types"])}
+    columns = np.array([[float(row.get(column, 50) if column == 'moisture' else row[column]) for row in rows]
+                        for column in INPUT_COLUMNS], dtype='<f8').reshape(len(INPUT_COLUMNS), len(rows))
+    soil = np.array([soil_codes.get(row.get('soil_type', 'Loam'), 255) for row in rows], dtype=np.uint8)
+    return _INPUT_HEADER.pack(INPUT_MAGIC, len(rows), bytes.fromhex(dictionary["id"])) + columns.tobytes() + soil.tobytes()
+
+def decode_inputs(body):
+    """(dictionary id, float64 (n, 8) array in INPUT_COLUMNS order, uint8 soil codes) of an input frame.
+
+    Raises ValueError for a malformed frame.
+    """
+    if len(body) < _INPUT_HEADER.size:
+        raise ValueError("Truncated frame")
+    magic, n, dictionary_id = _INPUT_HEADER.unpack_from(body)
+    if magic != INPUT_MAGIC:
+        raise ValueError("Not an input frame")
+    values, offset = _take(body, _INPUT_HEADER.size, '<f8', n * len(INPUT_COLUMNS))
+    soil, offset = _take(body, offset, np.uint8, n)
+    if offset != len(body):
+        raise ValueError("Trailing bytes after the input frame")
+    return dictionary_id.hex(), values.reshape(len(INPUT_COLUMNS), n).T, soil
+
+# --- Result Frames ---
+
+def encode_results(dictionary_id, n_rows, valid_rows, top, model_confidence, best, scores, yields, risk, tiers, errors):
+    """Result frame for a batch.
+
+    valid_rows: indices (into the n_rows) of the scored rows; the other arguments
+    except errors are aligned with them: top (list of crop-code arrays),
+    model_confidence, best, and the (row, crop) arrays scores, yields and risk
+    (flags). tiers: tier name per valid row, or None. errors: {row: error result}.
+    """
+    valid_rows = np.asarray(valid_rows, dtype=np.int64)
+    lengths = np.zeros(n_rows, dtype=np.uint32)
+    lengths[valid_rows] = [len(t) for t in top]
+    offsets = np.zeros(n_rows + 1, dtype='<u4')
+    np.cumsum(lengths, out=offsets[1:])
+    crop = np.concatenate(top).astype('<u2') if top else np.zeros(0, dtype='<u2')
+    owner = np.repeat(np.arange(len(top)), [len(t) for t in top])
+
+    confidence = np.zeros(n_rows, dtype='<f8')
+    confidence[valid_rows] = model_confidence
+    top_prediction = np.zeros(n_rows, dtype='<u2')
+    top_prediction[valid_rows] = best
+    tier_codes = np.full(n_rows, NO_TIER, dtype=np.uint8)
+    if tiers is not None:
+        tier_codes[valid_rows] = [TIERS.index(str(t)) for t in tiers]
+    trailer = json.dumps({str(row): error for row, error in errors.items()}).encode() if errors else b''
+
+    parts = [_RESULT_HEADER.pack(RESULT_MAGIC, n_rows, bytes.fromhex(dictionary_id), len(crop), len(trailer))]
+    size = _pad(parts, _RESULT_HEADER.size, 8)
+    for array in (confidence, scores[owner, crop].astype('<f8'), yields[owner, crop].astype('<f8'),
+                  offsets, top_prediction, crop, tier_codes, risk[owner, crop].astype(np.uint8)):
+        size = _pad(parts, size, array.itemsize)
+        parts.append(array.tobytes())
+        size += array.nbytes
+    parts.append(trailer)
+    return b''.join(parts)
+
+def decode_results(body, dictionary, temperatures):
+    """The JSON results a result frame stands for (client side). temperatures: each row's input temperature."""
+    magic, n, dictionary_id, m, e = _RESULT_HEADER.unpack_from(body)
+    if magic != RESULT_MAGIC:
+        raise ValueError("Not a result frame")
+    if dictionary_id.hex() != dictionary["id"]:
+        raise ValueError("Result frame was built with another dictionary")
+    offset = _RESULT_HEADER.size
+    confidence, offset = _take(body, offset, '<f8', n)
+    scores, offset = _take(body, offset, '<f8', m)
+    yields, offset = _take(body, offset, '<f8', m)
+    offsets, offset = _take(body, offset, '<u4', n + 1)
+    top_prediction, offset = _take(body, offset, '<u2', n)
+    crop, offset = _take(body, offset, '<u2', m)
+    tier_codes, offset = _take(body, offset, np.uint8, n)
+    risk, offset = _take(body, offset, np.uint8, m)
+    errors = json.loads(body[offset:offset + e]) if e else {}
+
+    crops, tiers = dictionary["crops"], dictionary["tiers"]
+    results = []
+    for i in range(n):
+        if str(i) in errors:
+            results.append(errors[str(i)])
+            continue
+        recommended = []
+        for j in range(offsets[i], offsets[i + 1]):
+            recommended.append({
+                "crop": crops[crop[j]],
+                "score": float(scores[j]),
+                "yield_potential": float(yields[j]) if yields[j] < 100 else 100,
+                "risk_factors": [message.format(temperature=temperatures[i])
+                                 for flag, message in RISK_MESSAGES.items() if risk[j] & flag]
+            })
+        result = {
+            "top_prediction": crops[top_prediction[i]],
+            "model_confidence": float(confidence[i]),
+            "recommended": recommended
+        }
+        if tier_codes[i] != NO_TIER:
+            result["model_tier"] = tiers[tier_codes[i]]
+        results.append(result)
+    return results
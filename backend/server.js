@@ -98,6 +98,22 @@ app.post('/api/ml/recommend', async (req, res) => {
   }
 });
 
+// Many zones in one round trip: { inputs: [...] } (or a bare list) of /recommend bodies,
+// answered with { results, count, errors } in input order
+app.post('/api/ml/recommend_batch', async (req, res) => {
+  try {
+    const rows = Array.isArray(req.body) ? req.body : req.body.inputs;
+    if (!Array.isArray(rows)) {
+      return res.status(400).json({ error: "Expected a list of inputs" });
+    }
+    const result = await mlService.predictBatch(rows);
+    res.json(result);
+  } catch (err) {
+    console.error("ML Batch Route Error:", err.message);
+    res.status(500).json({ error: "ML Engine failed", details: err.message });
+  }
+});
+
 // Note: /monitor is not yet migrated to remote - keeping local for now
 // To migrate it, add a /monitor endpoint to server_ml.py
 // Note: /monitor is now migrated to the unified ML Service
@@ -112,6 +128,22 @@ app.post('/api/ml/monitor', async (req, res) => {
   }
 });
 
+// Many devices' readings in one round trip: { readings: [...] } (or a bare list) of /monitor bodies,
+// answered with { results, count, errors } in input order
+app.post('/api/ml/monitor_batch', async (req, res) => {
+  try {
+    const readings = Array.isArray(req.body) ? req.body : req.body.readings;
+    if (!Array.isArray(readings)) {
+      return res.status(400).json({ error: "Expected a list of readings" });
+    }
+    const result = await mlService.monitorBatch(readings);
+    res.json(result);
+  } catch (err) {
+    console.error("Monitor Batch Error:", err.message);
+    res.status(500).json({ error: "Monitor failed", details: err.message });
+  }
+});
+
 // Test Route
 app.get('/', (req, res) => {
   res.send('KrishiSense IoT API is running...');
@@ -1,12 +1,74 @@
 const axios = require('axios');
 const path = require('path');
 const dotenv = require('dotenv');
+const mlWire = require('./mlWire');
 
 // Ensure env vars are loaded
 dotenv.config({ path: path.join(__dirname, '../.env') });
 
 // Configuration
 const ML_API_URL = process.env.ML_API_URL || 'http://localhost:5001';
+// 'columns' sends predictBatch() over the engine's compact binary format (see mlWire.js)
+const ML_WIRE_FORMAT = process.env.ML_WIRE_FORMAT || 'json';
+
+// GET /wire/dictionary, cached until the engine answers with another one
+let wireDictionary = null;
+
+async function fetchWireDictionary() {
+    const response = await axios.get(`${ML_API_URL}/wire/dictionary`, { timeout: 10000 });
+    wireDictionary = response.data;
+    return wireDictionary;
+}
+
+/**
+ * predictBatch() over the columnar wire format. Returns the same { results, count, errors }.
+ * A 409 (the engine reloaded a model with other classes) refetches the dictionary once.
+ */
+async function predictBatchColumns(rows, retried = false) {
+    const dictionary = wireDictionary || await fetchWireDictionary();
+    let response;
+    try {
+        response = await axios.post(`${ML_API_URL}/predict_batch`, mlWire.encodeInputs(rows, dictionary), {
+            timeout: 30000, // 30s timeout
+            responseType: 'arraybuffer',
+            headers: { 'Content-Type': mlWire.CONTENT_TYPE, 'Accept': mlWire.CONTENT_TYPE }
+        });
+    } catch (error) {
+        if (error.response) {
+            // Error bodies are JSON, but arrive as bytes with responseType 'arraybuffer'
+            try { error.response.data = JSON.parse(Buffer.from(error.response.data).toString('utf8')); } catch (e) { }
+            if (error.response.status === 409 && !retried) {
+                wireDictionary = null;
+                return predictBatchColumns(rows, true);
+            }
+        }
+        throw error;
+    }
+    const frame = Buffer.from(response.data);
+    if (frame.toString('hex', 8, 16) !== dictionary.id) {
+        await fetchWireDictionary();
+    }
+    const results = mlWire.decodeResults(frame, wireDictionary, rows.map(row => row.temperature));
+    return { results, count: results.length, errors: results.filter(r => 'error' in r).length };
+}
+
+/**
+ * The error an adapter method rethrows for a failed engine request: a readable
+ * message when the engine is offline, else the engine's own { error } message.
+ */
+function mlError(error) {
+    console.error("[ML Adapter] Error:", error.message);
+
+    if (error.code === 'ECONNREFUSED') {
+        return new Error("ML Service is offline. Please start the ML Engine.");
+    }
+
+    if (error.response) {
+        return new Error(error.response.data.error || `ML Error: ${error.response.status}`);
+    }
+
+    return error;
+}
 
 /**
  * ML Service Adapter
@@ -29,17 +91,89 @@ const mlService = {
 
             return response.data;
         } catch (error) {
-            console.error("[ML Adapter] Error:", error.message);
+            throw mlError(error);
+        }
+    },
 
-            if (error.code === 'ECONNREFUSED') {
-                throw new Error("ML Service is offline. Please start the ML Engine.");
-            }
+    /**
+     * Get crop recommendations for many zones in one round trip
+     * @param {Array<Object>} rows - List of predict() payloads
+     * @returns {Promise<Object>} - { results: [...], count, errors }, results in input order.
+     *   Rows that failed validation come back as { error } instead of failing the batch.
+     */
+    async predictBatch(rows) {
+        try {
+            console.log(`[ML Adapter] Requesting ${rows.length} predictions from: ${ML_API_URL}/predict_batch`);
 
-            if (error.response) {
-                throw new Error(error.response.data.error || `ML Error: ${error.response.status}`);
+            // Rows the engine would reject can't be encoded; JSON gets their per-row errors
+            if (ML_WIRE_FORMAT === 'columns' && rows.every(mlWire.canEncode)) {
+                return await predictBatchColumns(rows);
             }
 
-            throw error;
+            const response = await axios.post(`${ML_API_URL}/predict_batch`, { inputs: rows }, {
+                timeout: 30000, // 30s timeout
+                headers: { 'Content-Type': 'application/json' }
+            });
+
+            return response.data;
+        } catch (error) {
+            throw mlError(error);
+        }
+    },
+
+    /**
+     * Check live sensor readings against a crop's ideal conditions
+     * @param {Object} data - Schema: { crop_name, temperature, moisture }
+     * @returns {Promise<Object>} - { crop, status, parameters, alerts, recommendation }
+     */
+    async monitor(data) {
+        try {
+            const response = await axios.post(`${ML_API_URL}/monitor`, data, {
+                timeout: 10000, // 10s timeout
+                headers: { 'Content-Type': 'application/json' }
+            });
+
+            return response.data;
+        } catch (error) {
+            throw mlError(error);
+        }
+    },
+
+    /**
+     * Check many devices' readings in one round trip
+     * @param {Array<Object>} readings - List of monitor() payloads
+     * @returns {Promise<Object>} - { results: [...], count, errors }, results in input order.
+     *   Invalid readings come back as { error } instead of failing the batch.
+     */
+    async monitorBatch(readings) {
+        try {
+            const response = await axios.post(`${ML_API_URL}/monitor_batch`, { readings }, {
+                timeout: 30000, // 30s timeout
+                headers: { 'Content-Type': 'application/json' }
+            });
+
+            return response.data;
+        } catch (error) {
+            throw mlError(error);
+        }
+    },
+
+    /**
+     * Record a device's moisture reading in the ML engine's rolling per-device state
+     * @param {Object} reading - Schema: { device_id, moisture, timestamp?, crop_name? }
+     * @returns {Promise<Object>} - { device_id, crop, readings, ewma, std, slope_per_hour, forecast }
+     *   forecast: { status, level, hours_to_min, hours_to_max, ... } or null without a known crop
+     */
+    async updateDeviceState(reading) {
+        try {
+            const response = await axios.post(`${ML_API_URL}/device_state`, reading, {
+                timeout: 2000, // 2s timeout, the upload must not wait on it
+                headers: { 'Content-Type': 'application/json' }
+            });
+
+            return response.data;
+        } catch (error) {
+            throw mlError(error);
         }
     },
 
@@ -0,0 +1,113 @@
+/**
+ * Columnar wire format of the ML Engine (see ml_engine/wire.py for the layout).
+ * Input frames carry /predict payloads as float64 columns plus soil codes, and
+ * result frames carry the /predict_batch results as numbers plus codes into the
+ * dictionary from GET /wire/dictionary. decodeResults() rebuilds exactly the
+ * objects the JSON route returns.
+ */
+const CONTENT_TYPE = 'application/vnd.krishisense.columns';
+const INPUT_COLUMNS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall', 'moisture'];
+const NO_TIER = 255;
+
+const align = (offset, size) => offset + ((size - (offset % size)) % size);
+
+/**
+ * Whether a payload can be sent as an input frame. Rows the engine would reject
+ * (not an object, missing or non-numeric fields) can't be, so callers send such
+ * batches as JSON to get the engine's per-row errors.
+ */
+function canEncode(row) {
+    if (!row || typeof row !== 'object' || Array.isArray(row)) return false;
+    return INPUT_COLUMNS.every(column => {
+        if (!(column in row)) return column === 'moisture';
+        return typeof row[column] === 'number' && Number.isFinite(row[column]);
+    });
+}
+
+/**
+ * @param {Array<Object>} rows - predict() payloads (moisture defaults to 50, soil_type to 'Loam')
+ * @param {Object} dictionary - GET /wire/dictionary body
+ * @returns {Buffer} input frame
+ */
+function encodeInputs(rows, dictionary) {
+    const n = rows.length;
+    const soilCodes = new Map(dictionary.soil_types.map((soil, code) => [soil, code]));
+    const frame = Buffer.alloc(16 + 8 * INPUT_COLUMNS.length * n + n);
+    frame.write('KSI1', 0, 'latin1');
+    frame.writeUInt32LE(n, 4);
+    Buffer.from(dictionary.id, 'hex').copy(frame, 8);
+    let offset = 16;
+    for (const column of INPUT_COLUMNS) {
+        for (const row of rows) {
+            frame.writeDoubleLE(column === 'moisture' && !('moisture' in row) ? 50 : row[column], offset);
+            offset += 8;
+        }
+    }
+    for (const row of rows) {
+        const code = soilCodes.get('soil_type' in row ? row.soil_type : 'Loam');
+        frame.writeUInt8(code === undefined ? 255 : code, offset++);
+    }
+    return frame;
+}
+
+/**
+ * @param {Buffer} frame - result frame
+ * @param {Object} dictionary - GET /wire/dictionary body the frame was built with
+ * @param {Array} temperatures - each row's input temperature (risk messages quote it)
+ * @returns {Array<Object>} the /predict_batch results
+ */
+function decodeResults(frame, dictionary, temperatures) {
+    if (frame.toString('latin1', 0, 4) !== 'KSR1') throw new Error('Not a result frame');
+    if (frame.toString('hex', 8, 16) !== dictionary.id) throw new Error('Result frame was built with another dictionary');
+    const n = frame.readUInt32LE(4);
+    const m = frame.readUInt32LE(16);
+    const errorBytes = frame.readUInt32LE(20);
+
+    let offset = 24;
+    const take = (size, count, read) => {
+        offset = align(offset, size);
+        const values = new Array(count);
+        for (let i = 0; i < count; i++) values[i] = read.call(frame, offset + i * size);
+        offset += size * count;
+        return values;
+    };
+    const confidence = take(8, n, frame.readDoubleLE);
+    const scores = take(8, m, frame.readDoubleLE);
+    const yields = take(8, m, frame.readDoubleLE);
+    const offsets = take(4, n + 1, frame.readUInt32LE);
+    const topPrediction = take(2, n, frame.readUInt16LE);
+    const crop = take(2, m, frame.readUInt16LE);
+    const tiers = take(1, n, frame.readUInt8);
+    const risk = take(1, m, frame.readUInt8);
+    const errors = errorBytes ? JSON.parse(frame.toString('utf8', offset, offset + errorBytes)) : {};
+
+    const riskMessages = Object.entries(dictionary.risk_messages).map(([flag, message]) => [Number(flag), message]);
+    const results = [];
+    for (let i = 0; i < n; i++) {
+        if (String(i) in errors) {
+            results.push(errors[String(i)]);
+            continue;
+        }
+        const recommended = [];
+        for (let j = offsets[i]; j < offsets[i + 1]; j++) {
+            recommended.push({
+                crop: dictionary.crops[crop[j]],
+                score: scores[j],
+                yield_potential: yields[j] < 100 ? yields[j] : 100,
+                risk_factors: riskMessages
+                    .filter(([flag]) => risk[j] & flag)
+                    .map(([, message]) => message.replace('{temperature}', `${temperatures[i]}`))
+            });
+        }
+        const result = {
+            top_prediction: dictionary.crops[topPrediction[i]],
+            model_confidence: confidence[i],
+            recommended
+        };
+        if (tiers[i] !== NO_TIER) result.model_tier = dictionary.tiers[tiers[i]];
+        results.push(result);
+    }
+    return results;
+}
+
+module.exports = { CONTENT_TYPE, canEncode, encodeInputs, decodeResults };